@@ -0,0 +1,297 @@
+"""
+Issue analytics rollups.
+
+issue_daily_counts holds issue counts per creation day, reporter district,
+category, status and priority. issue_resolution_stats holds first
+resolutions per resolution day with their summed time to resolution. Both
+tables are updated in the same transaction as the issues and issue updates
+they summarize. Dashboard queries therefore read a few summary rows, however
+many issues exist.
+
+An issue's district is its reporter's profile district when the issue is
+created, stored in issues.district so that later profile edits do not move
+counts between districts. rebuild_issue_rollups() recomputes everything
+from scratch.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .eligibility import normalize
+from .geo.clusters import previous_value
+
+_TRACKED = ("status", "priority", "category")
+
+
+def _day(value) -> date:
+    if value is None:
+        return datetime.utcnow().date()
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _seconds(start: datetime, end: datetime) -> float:
+    # PostgreSQL returns aware timestamps, SQLite naive UTC ones
+    if start.tzinfo is None and end.tzinfo is not None:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+    elif start.tzinfo is not None and end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    return max(0.0, (end - start).total_seconds())
+
+
+def _count(counts: Dict[tuple, int], day, district, category, status, priority, sign: int) -> None:
+    key = (
+        _day(day),
+        district or "",
+        category or "",
+        status or models.IssueStatus.REPORTED,
+        priority or models.IssuePriority.MEDIUM,
+    )
+    counts[key] += sign
+
+
+def _resolve(resolutions: Dict[tuple, list], day, district, category, priority, seconds: float) -> None:
+    key = (_day(day), district or "", category or "", priority or models.IssuePriority.MEDIUM)
+    resolutions[key][0] += 1
+    resolutions[key][1] += seconds
+
+
+def _upsert(dialect_name: str, model, *measures: str):
+    module = postgresql if dialect_name == "postgresql" else sqlite
+    table = model.__table__
+    stmt = module.insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=list(table.primary_key.columns),
+        set_={name: table.c[name] + stmt.excluded[name] for name in measures},
+    )
+
+
+def _apply(connection, counts: Dict[tuple, int], resolutions: Dict[tuple, list]) -> None:
+    rows = [
+        {"day": day, "district": district, "category": category, "status": status,
+         "priority": priority, "count": count}
+        for (day, district, category, status, priority), count in counts.items()
+        if count
+    ]
+    if rows:
+        connection.execute(_upsert(connection.dialect.name, models.IssueDailyCount, "count"), rows)
+    rows = [
+        {"day": day, "district": district, "category": category, "priority": priority,
+         "resolved": resolved, "total_seconds": seconds}
+        for (day, district, category, priority), (resolved, seconds) in resolutions.items()
+    ]
+    if rows:
+        connection.execute(
+            _upsert(connection.dialect.name, models.IssueResolutionStat, "resolved", "total_seconds"), rows
+        )
+
+
+def _districts(connection, user_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    profile = models.FarmerProfile
+    result = connection.execute(select(profile.user_id, profile.district).where(profile.user_id.in_(user_ids)))
+    return {user_id: normalize(district) for user_id, district in result}
+
+
+def add_reporter_districts(connection, issues: List[dict]) -> None:
+    """Set the district of issue dicts about to be bulk-inserted from their reporters' profiles."""
+    districts = _districts(connection, {issue["reported_by"] for issue in issues})
+    for issue in issues:
+        issue["district"] = districts.get(issue["reported_by"])
+
+
+def _first_resolutions(connection, updates: List[models.IssueUpdate], resolutions: Dict[tuple, list]) -> None:
+    """Count the resolved updates that are the first resolution of their issue."""
+    earliest: Dict[str, models.IssueUpdate] = {}
+    for update in updates:
+        earliest.setdefault(update.issue_id, update)
+    resolved = models.IssueUpdate
+    # These updates are already flushed, so a first resolution is the only
+    # resolved update of its issue in this flush
+    counts = dict(connection.execute(
+        select(resolved.issue_id, func.count(resolved.id))
+        .where(resolved.issue_id.in_(earliest), resolved.status == models.IssueStatus.RESOLVED)
+        .group_by(resolved.issue_id)
+    ).all())
+    new_per_issue = defaultdict(int)
+    for update in updates:
+        new_per_issue[update.issue_id] += 1
+    first = [issue_id for issue_id in earliest if counts.get(issue_id, 0) <= new_per_issue[issue_id]]
+    if not first:
+        return
+    issue = models.Issue
+    issues = connection.execute(
+        select(issue.id, issue.created_at, issue.district, issue.category, issue.priority)
+        .where(issue.id.in_(first))
+    ).all()
+    for row in issues:
+        resolved_at = earliest[row.id].created_at or datetime.utcnow()
+        seconds = _seconds(row.created_at, resolved_at) if row.created_at else 0.0
+        _resolve(resolutions, resolved_at, row.district, row.category, row.priority, seconds)
+
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted_issues(session, flush_context, instances):
+    """Load expired columns of issues about to be deleted; after the flush their rows are gone."""
+    for obj in session.deleted:
+        if isinstance(obj, models.Issue) and inspect(obj).expired_attributes:
+            obj.created_at  # loads every expired column
+
+
+@event.listens_for(Session, "before_flush")
+def _set_issue_districts(session, flush_context, instances):
+    """Store the reporter's district on new issues."""
+    issues = [obj for obj in session.new if isinstance(obj, models.Issue) and obj.district is None]
+    if not issues:
+        return
+    districts = _districts(session.connection(), {issue.reported_by for issue in issues})
+    # Profiles created in the same flush are not in the table yet
+    districts.update(
+        (obj.user_id, normalize(obj.district)) for obj in session.new if isinstance(obj, models.FarmerProfile)
+    )
+    for issue in issues:
+        issue.district = districts.get(issue.reported_by)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_issue_rollups(session, flush_context):
+    created = [obj for obj in session.new if isinstance(obj, models.Issue)]
+    changed = [
+        obj for obj in session.dirty
+        if isinstance(obj, models.Issue)
+        and any(inspect(obj).attrs[attr].history.has_changes() for attr in _TRACKED)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, models.Issue)]
+    resolved = [
+        obj for obj in session.new
+        if isinstance(obj, models.IssueUpdate) and obj.status == models.IssueStatus.RESOLVED
+    ]
+    if not (created or changed or deleted or resolved):
+        return
+
+    connection = session.connection()
+    counts: Dict[tuple, int] = defaultdict(int)
+    for issue in created:
+        # created_at comes back from the INSERT where the database supports RETURNING
+        created_at = inspect(issue).dict.get("created_at")
+        _count(counts, created_at, issue.district, issue.category, issue.status, issue.priority, +1)
+    for issue in changed:
+        previous = (previous_value(issue, attr) for attr in ("category", "status", "priority"))
+        _count(counts, issue.created_at, issue.district, *previous, -1)
+        _count(counts, issue.created_at, issue.district, issue.category, issue.status, issue.priority, +1)
+    for issue in deleted:
+        previous = (previous_value(issue, attr) for attr in ("category", "status", "priority"))
+        _count(counts, issue.created_at, issue.district, *previous, -1)
+
+    resolutions: Dict[tuple, list] = defaultdict(lambda: [0, 0.0])
+    if resolved:
+        _first_resolutions(connection, resolved, resolutions)
+    _apply(connection, counts, resolutions)
+
+
+def count_new_issues(connection, issues: List[dict]) -> None:
+    """
+    Count bulk-inserted issues (dicts with district, category, status and
+    priority, see add_reporter_districts()) as created today.
+    """
+    counts: Dict[tuple, int] = defaultdict(int)
+    for issue in issues:
+        _count(counts, issue.get("created_at"), issue.get("district"), issue.get("category"),
+               issue.get("status"), issue.get("priority"), +1)
+    _apply(connection, counts, {})
+
+
+def rebuild_issue_rollups(db: Session, batch_size: int = 5000) -> int:
+    """Recompute both rollup tables from issues and issue updates. Returns the number of issues counted."""
+    issue = models.Issue
+    counts: Dict[tuple, int] = defaultdict(int)
+    counted = 0
+    rows = db.execute(
+        select(issue.created_at, issue.district, issue.category, issue.status, issue.priority)
+        .execution_options(yield_per=batch_size)
+    )
+    for created_at, district, category, status, priority in rows:
+        _count(counts, created_at, district, category, status, priority, +1)
+        counted += 1
+
+    first = (
+        select(models.IssueUpdate.issue_id, func.min(models.IssueUpdate.created_at).label("resolved_at"))
+        .where(models.IssueUpdate.status == models.IssueStatus.RESOLVED)
+        .group_by(models.IssueUpdate.issue_id)
+        .subquery()
+    )
+    resolutions: Dict[tuple, list] = defaultdict(lambda: [0, 0.0])
+    rows = db.execute(
+        select(first.c.resolved_at, issue.created_at, issue.district, issue.category, issue.priority)
+        .join(issue, issue.id == first.c.issue_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for resolved_at, created_at, district, category, priority in rows:
+        seconds = _seconds(created_at, resolved_at) if created_at and resolved_at else 0.0
+        _resolve(resolutions, resolved_at, district, category, priority, seconds)
+
+    db.execute(delete(models.IssueDailyCount))
+    db.execute(delete(models.IssueResolutionStat))
+    _apply(db.connection(), counts, resolutions)
+    db.commit()
+    return counted
+
+
+async def issue_stats(db: AsyncSession, start: Optional[date] = None, end: Optional[date] = None,
+                      district: Optional[str] = None, category: Optional[str] = None) -> dict:
+    """
+    Issue counts by dimension for issues created between start and end
+    (inclusive), and resolution times for issues resolved in that range.
+    """
+    def filters(model) -> list:
+        conditions = []
+        if start:
+            conditions.append(model.day >= start)
+        if end:
+            conditions.append(model.day <= end)
+        if district is not None:
+            conditions.append(model.district == (normalize(district) or ""))
+        if category is not None:
+            conditions.append(model.category == category)
+        return conditions
+
+    daily = models.IssueDailyCount
+
+    async def grouped(column) -> list:
+        result = await db.execute(
+            select(column, func.sum(daily.count)).where(*filters(daily)).group_by(column).order_by(column)
+        )
+        return [(getattr(key, "value", key), int(count)) for key, count in result if count]
+
+    by_status = dict(await grouped(daily.status))
+    resolution = models.IssueResolutionStat
+    result = await db.execute(
+        select(resolution.priority, func.sum(resolution.resolved), func.sum(resolution.total_seconds))
+        .where(*filters(resolution))
+        .group_by(resolution.priority)
+    )
+    by_priority = {
+        priority.value: {"resolved": int(resolved), "mean_hours": seconds / resolved / 3600}
+        for priority, resolved, seconds in result if resolved
+    }
+    resolved = sum(item["resolved"] for item in by_priority.values())
+    total_hours = sum(item["resolved"] * item["mean_hours"] for item in by_priority.values())
+    return {
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_priority": dict(await grouped(daily.priority)),
+        "by_district": dict(await grouped(daily.district)),
+        "by_category": dict(await grouped(daily.category)),
+        "by_day": [{"day": day, "count": count} for day, count in await grouped(daily.day)],
+        "resolution": {
+            "resolved": resolved,
+            "mean_hours": total_hours / resolved if resolved else None,
+            "by_priority": by_priority,
+        },
+    }
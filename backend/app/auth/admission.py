@@ -0,0 +1,148 @@
+"""
+Admission control for the OTP endpoints.
+
+send-otp and verify-otp are unauthenticated, so a flood from one number or
+one gateway could otherwise tie up the SMS queue, the OTP store and the
+database for everyone. Every OTP request passes three cheap checks before
+doing any work:
+
+- a token bucket per client IP, shared by both endpoints. Village gateways
+  put many farmers behind one address, so this limit is generous;
+- a token bucket per phone number and endpoint;
+- a cap on OTP requests in flight in this worker.
+
+A request over a rate limit gets a 429, and one over the concurrency cap gets
+a 503. Both carry Retry-After, and neither waits. A bucket is two numbers, and
+idle buckets are evicted least recently used first, so memory stays bounded
+by ADMISSION_MAX_KEYS. An evicted key just starts again with a full bucket.
+Limits apply per worker process. Setting a limit to 0 disables it.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import math
+import os
+import time
+from dotenv import load_dotenv
+from starlette.requests import Request
+
+load_dotenv()
+
+OTP_SEND_PHONE_BURST = float(os.getenv("OTP_SEND_PHONE_BURST", "3"))
+OTP_SEND_PHONE_PER_MINUTE = float(os.getenv("OTP_SEND_PHONE_PER_MINUTE", "1"))
+OTP_VERIFY_PHONE_BURST = float(os.getenv("OTP_VERIFY_PHONE_BURST", "10"))
+OTP_VERIFY_PHONE_PER_MINUTE = float(os.getenv("OTP_VERIFY_PHONE_PER_MINUTE", "5"))
+OTP_IP_BURST = float(os.getenv("OTP_IP_BURST", "120"))
+OTP_IP_PER_MINUTE = float(os.getenv("OTP_IP_PER_MINUTE", "300"))
+OTP_MAX_CONCURRENT = int(os.getenv("OTP_MAX_CONCURRENT", "100"))
+ADMISSION_MAX_KEYS = int(os.getenv("ADMISSION_MAX_KEYS", "100000"))
+# Take the client address from X-Forwarded-For; only safe behind a proxy that sets it
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by an arbitrary string; bursts up to ``burst``, refills at ``per_minute``."""
+
+    def __init__(self, burst: float, per_minute: float, max_keys: int = ADMISSION_MAX_KEYS,
+                 timer: Callable[[], float] = time.monotonic):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._timer = timer
+        # key -> [tokens, last refill time], least recently used first
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.burst > 0 and self.rate > 0
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key. Returns 0 if one was available, else seconds until one will be."""
+        if not self.enabled:
+            return 0.0
+        now = self._timer()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class OTPAdmission:
+    def __init__(self, max_concurrent: int = OTP_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.ip = TokenBucketLimiter(OTP_IP_BURST, OTP_IP_PER_MINUTE)
+        self.phone: Dict[str, TokenBucketLimiter] = {
+            "send": TokenBucketLimiter(OTP_SEND_PHONE_BURST, OTP_SEND_PHONE_PER_MINUTE),
+            "verify": TokenBucketLimiter(OTP_VERIFY_PHONE_BURST, OTP_VERIFY_PHONE_PER_MINUTE),
+        }
+        self.admitted = 0
+        self.shed = {"concurrency": 0, "ip": 0, "phone_send": 0, "phone_verify": 0}
+
+    def enter(self, endpoint: str, client_ip: Optional[str], phone_number: Optional[str]) -> None:
+        """
+        Admit a request to endpoint ("send" or "verify") or raise AdmissionRejected.
+
+        Every check runs before the request takes a concurrency slot, so
+        rejected requests never crowd out admitted ones. Admitted requests
+        must call leave().
+        """
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            self.shed["concurrency"] += 1
+            raise AdmissionRejected(503, "OTP service is busy, please retry shortly", 1)
+        wait = self.ip.acquire(client_ip or "unknown")
+        if wait:
+            self.shed["ip"] += 1
+            raise AdmissionRejected(429, "Too many requests from this network, please retry later", wait)
+        if phone_number:
+            wait = self.phone[endpoint].acquire(phone_number)
+            if wait:
+                self.shed[f"phone_{endpoint}"] += 1
+                raise AdmissionRejected(429, "Too many requests for this phone number, please retry later", wait)
+        self.in_flight += 1
+        self.admitted += 1
+
+    def leave(self) -> None:
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "in_flight": self.in_flight,
+            "shed": dict(self.shed),
+            "tracked_keys": {"ip": len(self.ip), **{name: len(limiter) for name, limiter in self.phone.items()}},
+        }
+
+
+def client_ip(request: Request) -> Optional[str]:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+otp_admission = OTPAdmission()
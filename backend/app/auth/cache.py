@@ -0,0 +1,81 @@
+from typing import Optional
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .. import models
+from ..cache import TTLCache
+
+load_dotenv()
+
+# Cache sizing. The TTL bounds how long another worker's change can go unseen.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+
+# Decoded JWT claims keyed by the raw token
+token_cache = TTLCache(maxsize=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+# Snapshots of user rows keyed by the token subject (user id)
+user_cache = TTLCache(maxsize=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+SNAPSHOT_FIELDS = (
+    "id", "phone_number", "name", "role", "language", "is_active", "created_at", "updated_at",
+)
+
+def get_cached_claims(token: str) -> Optional[dict]:
+    """Return previously decoded claims for a token, if still cached."""
+    return token_cache.get(token)
+
+def cache_claims(token: str, claims: dict) -> None:
+    """Cache decoded claims, never beyond the token's own expiry."""
+    ttl = None
+    exp = claims.get("exp")
+    if exp is not None:
+        ttl = float(exp) - time.time()
+    token_cache.set(token, claims, ttl=ttl)
+
+def snapshot_user(user: models.User) -> dict:
+    """Plain column values of a user row, safe to share across sessions."""
+    return {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+
+def get_cached_user(user_id: str) -> Optional[models.User]:
+    """
+    Rebuild a detached User from its cached snapshot.
+
+    The result should be attached with ``session.merge(user, load=False)``,
+    which does not query the database.
+    """
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        return None
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+def cache_user(user: models.User) -> None:
+    user_cache.set(user.id, snapshot_user(user))
+
+def invalidate_user(user_id: str) -> None:
+    user_cache.pop(user_id)
+
+def cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+# Invalidation: drop the snapshot as soon as a flush changes or deletes a user,
+# and again after commit so a concurrent request cannot re-cache the old row.
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_user(target.id)
+    Session.object_session(target).info.setdefault("changed_user_ids", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("changed_user_ids", None)
@@ -0,0 +1,216 @@
+"""
+Password hashing and access token signing.
+
+bcrypt is deliberately slow (tens to hundreds of milliseconds per hash), so
+CryptoService runs it on a bounded thread pool instead of the event loop;
+bcrypt releases the GIL while hashing. When CRYPTO_MAX_PENDING hashes are
+already queued, new ones fail fast with CryptoBusyError, which app.main
+turns into a 503.
+
+Tokens are JWTs signed by PyJWT with HMAC (HS256/384/512, SECRET_KEY) or
+EdDSA (Ed25519 keys from JWT_PRIVATE_KEY_FILES), chosen by ALGORITHM.
+Signing and verifying take tens of microseconds, less than a hop to a worker
+thread, so they run inline. Every token names its key in the ``kid``
+header. Keys listed after the first (PREVIOUS_SECRET_KEYS, or further
+JWT_PRIVATE_KEY_FILES) still verify, so keys can be rotated without logging
+everyone out. Verified claims are cached by auth.cache, so a token is
+usually verified once.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+import asyncio
+import hashlib
+import os
+import bcrypt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from dotenv import load_dotenv
+import jwt
+
+load_dotenv()
+
+SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+# Retired HMAC secrets that still verify tokens, comma-separated
+PREVIOUS_SECRET_KEYS = [key for key in os.getenv("PREVIOUS_SECRET_KEYS", "").split(",") if key]
+# PEM files of Ed25519 keys for ALGORITHM=EdDSA; the first (a private key) signs
+JWT_PRIVATE_KEY_FILES = [path for path in os.getenv("JWT_PRIVATE_KEY_FILES", "").split(",") if path]
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", str(min(4, os.cpu_count() or 1))))
+CRYPTO_MAX_PENDING = int(os.getenv("CRYPTO_MAX_PENDING", "64"))
+
+HMAC_ALGORITHMS = ("HS256", "HS384", "HS512")
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class CryptoBusyError(Exception):
+    """Raised when the hashing pool already has CRYPTO_MAX_PENDING jobs queued."""
+
+
+# Passwords
+
+def _password_bytes(password: str) -> bytes:
+    # bcrypt only looks at the first 72 bytes; passlib truncated silently too
+    return password.encode()[:72]
+
+
+def hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+
+def verify_password_sync(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(_password_bytes(password), hashed.encode())
+    except ValueError:  # malformed hash
+        return False
+
+
+class CryptoService:
+    def __init__(self, workers: int = CRYPTO_WORKERS, max_pending: int = CRYPTO_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.counters = {"hashed": 0, "verified": 0, "rejected": 0}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crypto")
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return dict(self.counters, pending=self.pending, workers=self.workers)
+
+    async def _run(self, counter: str, fn, *args):
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise CryptoBusyError("Too many password operations in progress")
+        self.start()
+        self.counters[counter] += 1
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash_password(self, password: str) -> str:
+        return await self._run("hashed", hash_password_sync, password)
+
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        return await self._run("verified", verify_password_sync, password, hashed)
+
+
+crypto_service = CryptoService()
+
+
+# Tokens
+
+class HMACKey:
+    def __init__(self, secret: Union[str, bytes], algorithm: str = "HS256"):
+        self.algorithm = algorithm
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self.signing_key = self.verifying_key = secret
+        self.kid = hashlib.sha256(b"kid:" + secret).hexdigest()[:16]
+        self.can_sign = True
+
+
+class Ed25519Key:
+    algorithm = "EdDSA"
+
+    def __init__(self, private_key: Optional[Ed25519PrivateKey] = None,
+                 public_key: Optional[Ed25519PublicKey] = None):
+        self.signing_key = private_key
+        self.verifying_key = public_key or private_key.public_key()
+        raw = self.verifying_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        self.kid = hashlib.sha256(raw).hexdigest()[:16]
+        self.can_sign = private_key is not None
+
+    @classmethod
+    def from_pem(cls, data: bytes) -> "Ed25519Key":
+        if b"PRIVATE KEY" in data:
+            key = serialization.load_pem_private_key(data, password=None)
+            if not isinstance(key, Ed25519PrivateKey):
+                raise ValueError("JWT_PRIVATE_KEY_FILES must hold Ed25519 keys")
+            return cls(private_key=key)
+        key = serialization.load_pem_public_key(data)
+        if not isinstance(key, Ed25519PublicKey):
+            raise ValueError("JWT_PRIVATE_KEY_FILES must hold Ed25519 keys")
+        return cls(public_key=key)
+
+
+class TokenSigner:
+    """
+    Signs and verifies tokens with PyJWT. The first key signs; every key
+    verifies tokens that name it, and tokens without a ``kid`` (issued
+    before keys had ids) are tried against every key of their algorithm.
+    """
+
+    def __init__(self, keys: List):
+        if not keys or not keys[0].can_sign:
+            raise ValueError("The first token key must be able to sign")
+        self.keys = keys
+        self.active = keys[0]
+        self._by_kid = {key.kid: key for key in keys}
+        self._headers = {"kid": self.active.kid}
+
+    def encode(self, claims: dict) -> str:
+        return jwt.encode(claims, self.active.signing_key, algorithm=self.active.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> dict:
+        """
+        Verified claims of a token; raises InvalidTokenError if it is forged,
+        malformed, expired (exp), not yet valid (nbf, iat) or marked with
+        critical extensions (crit), none of which are supported.
+        """
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError:
+            raise InvalidTokenError("Malformed token")
+        if "crit" in header:
+            raise InvalidTokenError("Unsupported critical header parameters")
+        kid = header.get("kid")
+        if kid is not None:
+            candidates = [self._by_kid[kid]] if kid in self._by_kid else []
+        else:
+            candidates = [key for key in self.keys if key.algorithm == header.get("alg")]
+        for key in candidates:
+            try:
+                # Only the key's own algorithm is accepted, whatever the header claims
+                claims = jwt.decode(token, key.verifying_key, algorithms=[key.algorithm])
+            except jwt.InvalidSignatureError:
+                continue
+            except jwt.ExpiredSignatureError:
+                raise InvalidTokenError("Token expired")
+            except jwt.InvalidTokenError as e:
+                raise InvalidTokenError(str(e) or "Invalid token")
+            if not isinstance(claims, dict):
+                raise InvalidTokenError("Malformed token")
+            return claims
+        raise InvalidTokenError("Signature verification failed")
+
+
+def load_signer(algorithm: str = ALGORITHM) -> TokenSigner:
+    if algorithm in HMAC_ALGORITHMS:
+        return TokenSigner([HMACKey(key, algorithm) for key in [SECRET_KEY, *PREVIOUS_SECRET_KEYS]])
+    if algorithm == "EdDSA":
+        keys = []
+        for path in JWT_PRIVATE_KEY_FILES:
+            with open(path, "rb") as f:
+                keys.append(Ed25519Key.from_pem(f.read()))
+        if not keys:
+            print("JWT_PRIVATE_KEY_FILES is not set; signing with a temporary key")  # For development only
+            keys = [Ed25519Key(Ed25519PrivateKey.generate())]
+        return TokenSigner(keys)
+    raise ValueError(f"Unsupported ALGORITHM: {algorithm}")
+
+
+token_signer = load_signer()
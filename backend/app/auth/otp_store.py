@@ -0,0 +1,280 @@
+"""
+OTP storage backends.
+
+send-otp and verify-otp may land on different uvicorn workers, so the store
+is pluggable: ``memory`` for a single process, ``sqlite`` for several workers
+on one host and ``redis`` for several hosts. Select one with OTP_STORE_BACKEND.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from enum import Enum
+import asyncio
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+
+from .utils import verify_otp
+
+load_dotenv()
+
+OTP_STORE_BACKEND = os.getenv("OTP_STORE_BACKEND", "memory")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_MAX_ENTRIES = int(os.getenv("OTP_MAX_ENTRIES", "100000"))
+OTP_SWEEP_INTERVAL_SECONDS = int(os.getenv("OTP_SWEEP_INTERVAL_SECONDS", "60"))
+OTP_STORE_PATH = os.getenv("OTP_STORE_PATH", "./otp_store.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class OTPStatus(str, Enum):
+    VALID = "valid"
+    INVALID = "invalid"
+    EXPIRED = "expired"
+    TOO_MANY_ATTEMPTS = "too_many_attempts"
+
+
+class OTPStore(ABC):
+    """Interface shared by all OTP backends. Every call is O(1) per phone number."""
+
+    def __init__(self, ttl: int = OTP_TTL_SECONDS, max_attempts: int = OTP_MAX_ATTEMPTS):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    async def save(self, phone_number: str, otp: str) -> None:
+        """Store a fresh OTP for phone_number, replacing any previous one."""
+
+    @abstractmethod
+    async def verify(self, phone_number: str, otp: str) -> OTPStatus:
+        """Check an OTP, counting the attempt. A valid OTP is consumed."""
+
+    @abstractmethod
+    async def discard(self, phone_number: str) -> None:
+        """Forget phone_number's OTP, if any."""
+
+    async def sweep(self) -> int:
+        """Remove expired entries and return how many were removed."""
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryOTPStore(OTPStore):
+    """
+    Per-process store. Entries are kept in expiry order, so sweeping only
+    touches expired entries and the oldest entry is evicted when full.
+    """
+
+    def __init__(self, max_entries: int = OTP_MAX_ENTRIES, **kwargs):
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    async def save(self, phone_number, otp):
+        self._entries.pop(phone_number, None)
+        self._entries[phone_number] = {
+            "otp": otp,
+            "expires_at": time.monotonic() + self.ttl,
+            "attempts": 0,
+        }
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def verify(self, phone_number, otp):
+        entry = self._entries.get(phone_number)
+        if entry is None:
+            return OTPStatus.INVALID
+        if entry["expires_at"] <= time.monotonic():
+            del self._entries[phone_number]
+            return OTPStatus.EXPIRED
+        entry["attempts"] += 1
+        if entry["attempts"] > self.max_attempts:
+            del self._entries[phone_number]
+            return OTPStatus.TOO_MANY_ATTEMPTS
+        if not verify_otp(entry["otp"], otp):
+            return OTPStatus.INVALID
+        del self._entries[phone_number]
+        return OTPStatus.VALID
+
+    async def discard(self, phone_number):
+        self._entries.pop(phone_number, None)
+
+    async def sweep(self):
+        now = time.monotonic()
+        removed = 0
+        while self._entries:
+            phone_number, entry = next(iter(self._entries.items()))
+            if entry["expires_at"] > now:
+                break
+            del self._entries[phone_number]
+            removed += 1
+        return removed
+
+
+class SQLiteOTPStore(OTPStore):
+    """
+    Store shared by every worker on one host through a WAL-mode SQLite file.
+    Blocking calls run in a thread so they never stall the event loop.
+    """
+
+    def __init__(self, path: str = OTP_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS otp_codes ("
+                " phone_number TEXT PRIMARY KEY,"
+                " otp TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_otp_codes_expires_at ON otp_codes (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _save(self, phone_number, otp):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO otp_codes (phone_number, otp, expires_at, attempts) VALUES (?, ?, ?, 0)",
+                (phone_number, otp, time.time() + self.ttl),
+            )
+
+    def _verify(self, phone_number, otp):
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so two workers cannot
+            # both consume the same OTP.
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT otp, expires_at, attempts FROM otp_codes WHERE phone_number = ?",
+                (phone_number,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return OTPStatus.INVALID
+            stored_otp, expires_at, attempts = row
+            if expires_at <= time.time():
+                status = OTPStatus.EXPIRED
+            elif attempts + 1 > self.max_attempts:
+                status = OTPStatus.TOO_MANY_ATTEMPTS
+            elif verify_otp(stored_otp, otp):
+                status = OTPStatus.VALID
+            else:
+                conn.execute(
+                    "UPDATE otp_codes SET attempts = attempts + 1 WHERE phone_number = ?",
+                    (phone_number,),
+                )
+                conn.execute("COMMIT")
+                return OTPStatus.INVALID
+            conn.execute("DELETE FROM otp_codes WHERE phone_number = ?", (phone_number,))
+            conn.execute("COMMIT")
+            return status
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _discard(self, phone_number):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM otp_codes WHERE phone_number = ?", (phone_number,))
+
+    def _sweep(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    async def save(self, phone_number, otp):
+        await asyncio.to_thread(self._save, phone_number, otp)
+
+    async def verify(self, phone_number, otp):
+        return await asyncio.to_thread(self._verify, phone_number, otp)
+
+    async def discard(self, phone_number):
+        await asyncio.to_thread(self._discard, phone_number)
+
+    async def sweep(self):
+        return await asyncio.to_thread(self._sweep)
+
+
+class RedisOTPStore(OTPStore):
+    """
+    Store shared across hosts. Expiry is handled by Redis key TTLs, so no
+    sweeping is needed. Works with any Redis-protocol server.
+    """
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "otp:", **kwargs):
+        super().__init__(**kwargs)
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("OTP_STORE_BACKEND=redis requires the 'redis' package") from e
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        # Count the attempt only if the key still exists, atomically, so an
+        # expired key is never recreated without a TTL.
+        self._count_attempt = self.redis.register_script(
+            "if redis.call('EXISTS', KEYS[1]) == 0 then return nil end "
+            "local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1) "
+            "return {attempts, redis.call('HGET', KEYS[1], 'otp')}"
+        )
+
+    def _key(self, phone_number):
+        return f"{self.prefix}{phone_number}"
+
+    async def save(self, phone_number, otp):
+        key = self._key(phone_number)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={"otp": otp, "attempts": 0})
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def verify(self, phone_number, otp):
+        found = await self._count_attempt(keys=[self._key(phone_number)])
+        if found is None:
+            return OTPStatus.INVALID
+        attempts, stored_otp = found
+        key = self._key(phone_number)
+        if int(attempts) > self.max_attempts:
+            await self.redis.delete(key)
+            return OTPStatus.TOO_MANY_ATTEMPTS
+        if not verify_otp(stored_otp, otp):
+            return OTPStatus.INVALID
+        # Only the caller whose DEL removes the key gets to consume the OTP
+        if not await self.redis.delete(key):
+            return OTPStatus.INVALID
+        return OTPStatus.VALID
+
+    async def discard(self, phone_number):
+        await self.redis.delete(self._key(phone_number))
+
+    async def close(self):
+        await self.redis.close()
+
+
+def create_otp_store(backend: str = OTP_STORE_BACKEND) -> OTPStore:
+    """Build the OTP store configured by OTP_STORE_BACKEND."""
+    if backend == "memory":
+        return InMemoryOTPStore()
+    if backend == "sqlite":
+        return SQLiteOTPStore()
+    if backend == "redis":
+        return RedisOTPStore()
+    raise ValueError(f"Unknown OTP_STORE_BACKEND: {backend}")
+
+
+async def run_sweeper(store: OTPStore, interval: int = OTP_SWEEP_INTERVAL_SECONDS) -> None:
+    """Periodically purge expired OTPs until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.sweep()
+        except Exception as e:
+            print(f"OTP sweep failed: {e}")
@@ -1,33 +1,33 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import hmac
 import os
 from dotenv import load_dotenv
 
-from ..database import get_db
+from ..database import get_async_db
+from ..replicas import current_subject
 from .. import models
+from .cache import cache_claims, cache_user, get_cached_claims, get_cached_user
+from .crypto import InvalidTokenError, hash_password_sync, token_signer, verify_password_sync
 
 load_dotenv()
 
 # Security
-SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a password against a hash. Blocks; request handlers use crypto_service.verify_password."""
+    return verify_password_sync(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Generate a password hash."""
-    return pwd_context.hash(password)
+    """Generate a password hash. Blocks; request handlers use crypto_service.hash_password."""
+    return hash_password_sync(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
@@ -37,27 +37,42 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return token_signer.encode(to_encode)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current user from the JWT token."""
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the current user from the JWT token.
+
+    Decoded claims and user rows are served from the auth cache when possible,
+    so a warm request does not touch the database.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    payload = get_cached_claims(token)
+    if payload is None:
+        try:
+            payload = token_signer.decode(token)
+        except InvalidTokenError:
             raise credentials_exception
-    except JWTError:
+        cache_claims(token, payload)
+    user_id: str = payload.get("sub")
+    if user_id is None:
         raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    # Lets app.replicas keep this user's reads on the primary right after they write
+    current_subject.set(user_id)
+
+    cached = get_cached_user(user_id)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
+    cache_user(user)
     return user
 
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
@@ -66,6 +81,14 @@ async def get_current_active_user(current_user: models.User = Depends(get_curren
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def require_roles(*roles: models.UserRole):
+    """Dependency factory allowing only active users with one of the given roles."""
+    async def checker(current_user: models.User = Depends(get_current_active_user)):
+        if current_user.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        return current_user
+    return checker
+
 def verify_otp(stored_otp: str, otp: str) -> bool:
-    """Verify OTP. In production, implement rate limiting and expiration."""
-    return stored_otp == otp
+    """Verify OTP in constant time. Expiry and attempt limits are enforced by the OTP store."""
+    return hmac.compare_digest(stored_otp.encode(), otp.encode())
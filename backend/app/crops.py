@@ -0,0 +1,129 @@
+"""
+Normalized crop index.
+
+``FarmerProfile.crops`` is a JSON list, which cannot be indexed. Each crop
+name is kept once in the ``crops`` vocabulary, and every (profile, crop)
+pair is a ``farmer_crops`` row carrying the profile's district and state.
+"Farmers growing X in district Y" is then one range scan of the
+(crop, district, state) index. The rows are rewritten in the same
+transaction whenever a profile's crops, district or state change.
+"""
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .eligibility import normalize
+
+_TRACKED = ("crops", "district", "state")
+
+
+def crop_ids(connection, names: Iterable[str]) -> Dict[str, int]:
+    """Ids of normalized crop names, adding unknown names to the vocabulary."""
+    names = set(names)
+    if not names:
+        return {}
+    table = models.Crop.__table__
+    module = postgresql if connection.dialect.name == "postgresql" else sqlite
+    connection.execute(
+        module.insert(table).on_conflict_do_nothing(index_elements=[table.c.name]),
+        [{"name": name} for name in names],
+    )
+    return dict(connection.execute(select(table.c.name, table.c.id).where(table.c.name.in_(names))).all())
+
+
+def index_profiles(connection, profiles: List[dict]) -> None:
+    """
+    Replace the farmer_crops rows of profiles, given as dicts with ``id``,
+    ``district``, ``state`` and ``crops`` (also used by bulk inserts).
+    """
+    if not profiles:
+        return
+    table = models.FarmerCrop.__table__
+    connection.execute(delete(table).where(table.c.profile_id.in_([profile["id"] for profile in profiles])))
+    crops = {
+        profile["id"]: {normalize(crop) for crop in profile.get("crops") or []} - {None}
+        for profile in profiles
+    }
+    ids = crop_ids(connection, set().union(*crops.values()))
+    rows = [
+        {
+            "profile_id": profile["id"],
+            "crop_id": ids[name],
+            "district": normalize(profile.get("district")),
+            "state": normalize(profile.get("state")),
+        }
+        for profile in profiles
+        for name in crops[profile["id"]]
+    ]
+    if rows:
+        connection.execute(insert(table), rows)
+
+
+def _columns(profile: models.FarmerProfile) -> dict:
+    return {"id": profile.id, "district": profile.district, "state": profile.state, "crops": profile.crops}
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_crop_index(session, flush_context):
+    changed = [obj for obj in session.new if isinstance(obj, models.FarmerProfile)]
+    for obj in session.dirty:
+        if isinstance(obj, models.FarmerProfile):
+            state = inspect(obj)
+            if any(state.attrs[attr].history.has_changes() for attr in _TRACKED):
+                changed.append(obj)
+    removed = [obj.id for obj in session.deleted if isinstance(obj, models.FarmerProfile)]
+    if not changed and not removed:
+        return
+    connection = session.connection()
+    index_profiles(connection, [_columns(profile) for profile in changed])
+    if removed:
+        table = models.FarmerCrop.__table__
+        connection.execute(delete(table).where(table.c.profile_id.in_(removed)))
+
+
+def rebuild_crop_index(db: Session, batch_size: int = 5000) -> int:
+    """Recreate all farmer_crops rows from the JSON column. Returns the number of profiles."""
+    connection = db.connection()
+    connection.execute(delete(models.FarmerCrop.__table__))
+    profile = models.FarmerProfile
+    rows = db.execute(
+        select(profile.id, profile.district, profile.state, profile.crops)
+        .execution_options(yield_per=batch_size)
+    )
+    indexed = 0
+    for partition in rows.mappings().partitions():
+        index_profiles(connection, [dict(row) for row in partition])
+        indexed += len(partition)
+    db.commit()
+    return indexed
+
+
+async def find_crop_id(db: AsyncSession, name: str) -> Optional[int]:
+    name = normalize(name)
+    if name is None:
+        return None
+    return (await db.execute(select(models.Crop.id).where(models.Crop.name == name))).scalar()
+
+
+def area_filters(district: Optional[str] = None, state: Optional[str] = None) -> list:
+    filters = []
+    if district:
+        filters.append(models.FarmerCrop.district == normalize(district))
+    if state:
+        filters.append(models.FarmerCrop.state == normalize(state))
+    return filters
+
+
+async def crop_counts(db: AsyncSession, district: Optional[str] = None, state: Optional[str] = None) -> List[dict]:
+    """Number of farmers growing each crop, optionally within a district and/or state."""
+    result = await db.execute(
+        select(models.Crop.name, func.count().label("farmers"))
+        .join(models.FarmerCrop, models.FarmerCrop.crop_id == models.Crop.id)
+        .where(*area_filters(district, state))
+        .group_by(models.Crop.name)
+        .order_by(func.count().desc(), models.Crop.name)
+    )
+    return [{"name": name, "farmers": farmers} for name, farmers in result]
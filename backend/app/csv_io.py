@@ -0,0 +1,230 @@
+"""
+Streaming CSV import and export of farmer profiles and issues.
+
+Imports read the upload in fixed-size chunks, validate each row with the
+schemas, and insert every chunk with one executemany per table. Exports
+stream rows from a server-side cursor. Memory use depends on the chunk
+size, not the file size.
+"""
+from typing import BinaryIO, Callable, Iterable, List
+import csv
+import io
+import os
+from dotenv import load_dotenv
+import pandas as pd
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from . import models, schemas
+from .analytics import add_reporter_districts, count_new_issues
+from .crops import index_profiles
+from .database import AsyncSessionLocal, SessionLocal
+from .eligibility import eligibility_engine
+from .geo.clusters import record_new_issues
+
+load_dotenv()
+
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", "5000"))
+# Only the first errors are reported, so a bad file cannot exhaust memory
+CSV_MAX_REPORTED_ERRORS = int(os.getenv("CSV_MAX_REPORTED_ERRORS", "1000"))
+
+FARMER_COLUMNS = [
+    "phone_number", "name", "language", "address", "village", "district",
+    "state", "pincode", "land_area", "crops",
+]
+ISSUE_COLUMNS = [
+    "id", "title", "description", "category", "status", "priority", "latitude",
+    "longitude", "reported_by", "assigned_to", "created_at", "updated_at",
+]
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def error(self, line: int, detail: str) -> None:
+        self.failed += 1
+        if len(self.errors) < CSV_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    def as_dict(self) -> dict:
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors}
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors()
+    )
+
+
+def _chunks(file: BinaryIO, chunk_size: int):
+    with pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False) as reader:
+        yield from reader
+
+
+def _validated_chunks(file: BinaryIO, schema, report: ImportReport, chunk_size: int):
+    """
+    Yield lists of (line number, validated row) per CSV chunk; invalid rows
+    go to the report. A file that cannot be parsed ends the import at the
+    chunk it breaks in: earlier chunks stay imported, and the report names
+    the first row that was not.
+    """
+    line = 1  # the header
+    chunks = _chunks(file, chunk_size)
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        except pd.errors.EmptyDataError:
+            report.error(line, "file: no CSV header")
+            return
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            report.error(line + 1, f"file: {e}")
+            return
+        rows = []
+        for record in chunk.to_dict("records"):
+            line += 1
+            try:
+                rows.append((line, schema(**record)))
+            except ValidationError as e:
+                report.error(line, _describe(e))
+        yield rows
+
+
+def import_farmers(file: BinaryIO, chunk_size: int = CSV_CHUNK_SIZE) -> dict:
+    """
+    Create a farmer user and profile per CSV row. Blocking; run it in a thread.
+
+    Phone numbers that are already registered (or repeated in the file) are
+    reported as errors and skipped.
+    """
+    report = ImportReport()
+    with SessionLocal() as db:
+        for rows in _validated_chunks(file, schemas.FarmerImportRow, report, chunk_size):
+            phones = {row.phone_number for _, row in rows}
+            existing = set(db.execute(
+                select(models.User.phone_number).where(models.User.phone_number.in_(phones))
+            ).scalars())
+            users, profiles = [], []
+            for line, row in rows:
+                if row.phone_number in existing:
+                    report.error(line, "phone_number: already registered")
+                    continue
+                existing.add(row.phone_number)
+                user_id = models.generate_uuid()
+                users.append({
+                    "id": user_id,
+                    "phone_number": row.phone_number,
+                    "name": row.name,
+                    "language": row.language,
+                    "role": models.UserRole.FARMER,
+                    "is_active": True,
+                })
+                profiles.append({
+                    "id": models.generate_uuid(),
+                    "user_id": user_id,
+                    **row.model_dump(include=set(schemas.FarmerProfileBase.model_fields)),
+                })
+            if users:
+                db.execute(insert(models.User), users)
+                db.execute(insert(models.FarmerProfile), profiles)
+                index_profiles(db.connection(), profiles)
+                db.commit()
+                # Bulk inserts bypass the ORM hooks that keep the engine current
+                eligibility_engine.update_profiles(profiles)
+                report.imported += len(users)
+    return report.as_dict()
+
+
+def import_issues(file: BinaryIO, chunk_size: int = CSV_CHUNK_SIZE) -> dict:
+    """
+    Create an issue per CSV row, reported by the user with ``reporter_phone``.
+    Blocking; run it in a thread.
+    """
+    report = ImportReport()
+    with SessionLocal() as db:
+        for rows in _validated_chunks(file, schemas.IssueImportRow, report, chunk_size):
+            phones = {row.reporter_phone for _, row in rows}
+            reporters = dict(db.execute(
+                select(models.User.phone_number, models.User.id).where(models.User.phone_number.in_(phones))
+            ).all())
+            issues = []
+            for line, row in rows:
+                reporter_id = reporters.get(row.reporter_phone)
+                if reporter_id is None:
+                    report.error(line, "reporter_phone: no user with this phone number")
+                    continue
+                location = row.location
+                if location is None and row.latitude is not None and row.longitude is not None:
+                    location = {"type": "Point", "coordinates": [row.longitude, row.latitude]}
+                issues.append({
+                    "id": models.generate_uuid(),
+                    "title": row.title,
+                    "description": row.description,
+                    "category": row.category,
+                    "status": models.IssueStatus(row.status),
+                    "priority": models.IssuePriority(row.priority),
+                    "location": location,
+                    "reported_by": reporter_id,
+                    # Bulk inserts bypass the ORM validator that fills these
+                    **models.LocatedMixin.point_columns(location),
+                })
+            if issues:
+                add_reporter_districts(db.connection(), issues)
+                db.execute(insert(models.Issue), issues)
+                record_new_issues(db.connection(), issues)
+                count_new_issues(db.connection(), issues)
+                db.commit()
+                report.imported += len(issues)
+    return report.as_dict()
+
+
+async def stream_csv(query, header: List[str], to_row: Callable[[tuple], Iterable],
+                     batch_size: int = CSV_CHUNK_SIZE):
+    """
+    Async generator of CSV text for a query, read through a server-side
+    cursor in batches. Opens its own session because it outlives the request
+    handler.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(to_row(row) for row in partition)
+            yield buffer.getvalue()
+
+
+def farmers_export_query():
+    profile = models.FarmerProfile
+    return (
+        select(
+            models.User.phone_number, models.User.name, models.User.language, profile.address,
+            profile.village, profile.district, profile.state, profile.pincode, profile.land_area,
+            profile.crops,
+        )
+        .join(profile, profile.user_id == models.User.id)
+        .order_by(models.User.created_at, models.User.id)
+    )
+
+
+def farmer_row(row) -> list:
+    *fields, crops = row
+    return [*fields, ";".join(crops or [])]
+
+
+def issues_export_query():
+    return select(*[getattr(models.Issue, column) for column in ISSUE_COLUMNS]).order_by(
+        models.Issue.created_at, models.Issue.id
+    )
+
+
+def issue_row(row) -> list:
+    return [value.value if isinstance(value, (models.IssueStatus, models.IssuePriority)) else value for value in row]
@@ -0,0 +1,432 @@
+"""
+Government scheme eligibility matching.
+
+Farmer profiles are held in memory as columns: dictionary-encoded state and
+district codes, land area, and a bitset of crops per farmer. Each scheme's
+``eligibility_criteria`` is compiled once into a ``Criteria`` and evaluated
+with NumPy over all farmers at once. The result is cached as one boolean
+mask per scheme, which answers both "schemes for a farmer" and "farmers for
+a scheme". When a profile or scheme changes, only its rows or its mask are
+recomputed.
+
+Those updates only see this process's commits, so the index is also
+rebuilt from the database every ELIGIBILITY_RELOAD_SECONDS, in a background
+thread. A rebuild reads and encodes into fresh arrays without holding the
+lock, then swaps them in and replays the changes committed meanwhile.
+
+Recognised criteria keys (all optional; anything else is ignored because
+it cannot be checked against profile data)::
+
+    {"states": [...], "districts": [...], "crops": [...],
+     "min_land_area": 0.5, "max_land_area": 5}
+
+``state``, ``district`` and ``crop`` may be given as a single string, and
+``land_area`` as ``{"min": ..., "max": ...}``. A farmer qualifies when every
+given criterion holds; ``crops`` needs any one of the listed crops.
+"""
+from typing import Dict, Iterable, List, Optional
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+# Rebuild the index this often so other workers' commits are seen; 0 turns it off
+ELIGIBILITY_RELOAD_SECONDS = float(os.getenv("ELIGIBILITY_RELOAD_SECONDS", "300"))
+
+WORD_BITS = 64
+
+# Everything a (re)load replaces
+_INDEX_ATTRIBUTES = (
+    "_size", "_rows", "_user_ids", "_alive", "_state", "_district", "_land_area", "_crops",
+    "_vocab", "_criteria", "_masks",
+)
+
+
+def normalize(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip().casefold()
+    return value or None
+
+
+def _names(criteria: dict, plural: str, singular: str) -> Optional[frozenset]:
+    value = criteria.get(plural, criteria.get(singular))
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    return frozenset(filter(None, (normalize(item) for item in value)))
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Criteria:
+    """Compiled eligibility criteria of one scheme."""
+
+    def __init__(self, states=None, districts=None, crops=None, min_land_area=None, max_land_area=None):
+        self.states = states
+        self.districts = districts
+        self.crops = crops
+        self.min_land_area = min_land_area
+        self.max_land_area = max_land_area
+
+    @classmethod
+    def compile(cls, criteria: Optional[dict]) -> "Criteria":
+        criteria = criteria if isinstance(criteria, dict) else {}
+        land_area = criteria.get("land_area")
+        land_area = land_area if isinstance(land_area, dict) else {}
+        return cls(
+            states=_names(criteria, "states", "state"),
+            districts=_names(criteria, "districts", "district"),
+            crops=_names(criteria, "crops", "crop"),
+            min_land_area=_number(criteria.get("min_land_area", land_area.get("min"))),
+            max_land_area=_number(criteria.get("max_land_area", land_area.get("max"))),
+        )
+
+
+def profile_snapshot(profile) -> dict:
+    """The profile fields the engine uses, as plain values."""
+    return {
+        "user_id": profile.user_id,
+        "state": profile.state,
+        "district": profile.district,
+        "land_area": profile.land_area,
+        "crops": list(profile.crops or []),
+    }
+
+
+class EligibilityEngine:
+    """
+    In-memory eligibility index. Loaded lazily from the database on first
+    use; afterwards kept current by the ORM hooks below. Thread-safe.
+    """
+
+    def __init__(self, session_factory=SessionLocal, initial_capacity: int = 1024,
+                 reload_seconds: float = ELIGIBILITY_RELOAD_SECONDS):
+        self._session_factory = session_factory
+        self._initial_capacity = initial_capacity
+        self._reload_seconds = reload_seconds
+        self._lock = threading.RLock()
+        # Held for a whole (re)load, so only one runs at a time; never taken by queries
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        # Updates seen while a reload is running, replayed onto its result
+        self._replay: Optional[list] = None
+        self._reset(initial_capacity)
+
+    def _reset(self, capacity: int) -> None:
+        self._size = 0
+        self._rows: Dict[str, int] = {}
+        self._user_ids = np.empty(capacity, dtype=object)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._state = np.full(capacity, -1, dtype=np.int32)
+        self._district = np.full(capacity, -1, dtype=np.int32)
+        self._land_area = np.full(capacity, np.nan)
+        self._crops = np.zeros((capacity, 1), dtype=np.uint64)
+        self._vocab: Dict[str, Dict[str, int]] = {"state": {}, "district": {}, "crop": {}}
+        self._criteria: Dict[str, Criteria] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+
+    # Loading
+
+    def ensure_loaded(self) -> None:
+        """
+        Load from the database unless already loaded, and start a background
+        reload when the index is older than reload_seconds. Blocking; run it
+        in a thread.
+        """
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load()
+        elif self._reload_seconds and time.monotonic() - self._loaded_at > self._reload_seconds:
+            if self._load_lock.acquire(blocking=False):
+                self._loaded_at = time.monotonic()  # no other request starts one meanwhile
+                threading.Thread(target=self._reload_in_background, name="eligibility-reload", daemon=True).start()
+
+    def _reload_in_background(self) -> None:
+        try:
+            self._load()
+        except Exception as e:
+            print(f"Eligibility reload failed: {e}")
+        finally:
+            self._load_lock.release()
+
+    def load(self) -> None:
+        """(Re)build everything from the database."""
+        with self._load_lock:
+            self._load()
+
+    def _load(self) -> None:
+        # Queries and updates keep using the current arrays until the swap
+        with self._lock:
+            self._replay = []
+        try:
+            fresh = EligibilityEngine(self._session_factory, self._initial_capacity, reload_seconds=0)
+            fresh._build()
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            replay, self._replay = self._replay, None
+            for name in _INDEX_ATTRIBUTES:
+                setattr(self, name, getattr(fresh, name))
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+            # Commits the snapshot may have missed; applying one twice is harmless
+            for method, args in replay:
+                getattr(self, method)(*args)
+
+    def _build(self) -> None:
+        """Read and encode everything from the database into this (unshared) engine."""
+        with self._session_factory() as db:
+            profile = models.FarmerProfile
+            profiles = db.execute(
+                select(profile.user_id, profile.state, profile.district, profile.land_area, profile.crops)
+            ).all()
+            schemes = db.execute(
+                select(models.GovernmentScheme.id, models.GovernmentScheme.eligibility_criteria)
+                .where(models.GovernmentScheme.is_active.is_(True))
+            ).all()
+
+            frame = pd.DataFrame(profiles, columns=["user_id", "state", "district", "land_area", "crops"])
+            self._reset(max(self._initial_capacity, len(frame)))
+            n = self._size = len(frame)
+            self._user_ids[:n] = frame["user_id"].to_numpy()
+            self._rows = {user_id: row for row, user_id in enumerate(frame["user_id"])}
+            self._alive[:n] = True
+            self._state[:n] = self._encode_column("state", frame["state"])
+            self._district[:n] = self._encode_column("district", frame["district"])
+            self._land_area[:n] = pd.to_numeric(frame["land_area"], errors="coerce").to_numpy(dtype=float)
+
+            crops = frame["crops"].explode().map(normalize).dropna()
+            codes = self._encode_column("crop", crops)
+            self._grow_crop_words()
+            np.bitwise_or.at(
+                self._crops,
+                (crops.index.to_numpy(), codes // WORD_BITS),
+                np.left_shift(np.uint64(1), (codes % WORD_BITS).astype(np.uint64)),
+            )
+
+            for scheme_id, criteria in schemes:
+                self._set_scheme(scheme_id, criteria)
+
+    def _encode_column(self, kind: str, values: pd.Series) -> np.ndarray:
+        """Dictionary codes for a column of raw values; -1 for missing."""
+        values = values.map(normalize)
+        vocab = self._vocab[kind]
+        codes, uniques = pd.factorize(values)
+        mapping = np.array([vocab.setdefault(value, len(vocab)) for value in uniques] + [-1], dtype=np.int32)
+        return mapping[codes]
+
+    def _code(self, kind: str, value) -> int:
+        value = normalize(value)
+        if value is None:
+            return -1
+        vocab = self._vocab[kind]
+        return vocab.setdefault(value, len(vocab))
+
+    # Storage
+
+    def _grow_rows(self, needed: int) -> None:
+        capacity = len(self._alive)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+
+        def grown(array, fill):
+            out = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            out[:len(array)] = array
+            return out
+
+        self._user_ids = grown(self._user_ids, None)
+        self._alive = grown(self._alive, False)
+        self._state = grown(self._state, -1)
+        self._district = grown(self._district, -1)
+        self._land_area = grown(self._land_area, np.nan)
+        self._crops = grown(self._crops, 0)
+        self._masks = {scheme_id: grown(mask, False) for scheme_id, mask in self._masks.items()}
+
+    def _grow_crop_words(self) -> None:
+        words = max(1, -(-len(self._vocab["crop"]) // WORD_BITS))
+        if words > self._crops.shape[1]:
+            extra = np.zeros((len(self._crops), words - self._crops.shape[1]), dtype=np.uint64)
+            self._crops = np.hstack([self._crops, extra])
+
+    def _crop_bits(self, crops: Iterable[str]) -> np.ndarray:
+        bits = np.zeros(self._crops.shape[1], dtype=np.uint64)
+        for crop in crops:
+            code = self._vocab["crop"].get(crop)
+            if code is not None:
+                bits[code // WORD_BITS] |= np.uint64(1) << np.uint64(code % WORD_BITS)
+        return bits
+
+    # Evaluation
+
+    def _evaluate(self, criteria: Criteria, rows=slice(None)) -> np.ndarray:
+        """Eligibility of the given rows (a slice or an index array) under criteria."""
+        n = self._size
+        mask = self._alive[:n][rows].copy()
+        for kind, names, column in (
+            ("state", criteria.states, self._state),
+            ("district", criteria.districts, self._district),
+        ):
+            if names is not None:
+                codes = [self._vocab[kind][name] for name in names if name in self._vocab[kind]]
+                mask &= np.isin(column[:n][rows], codes)
+        if criteria.min_land_area is not None:
+            mask &= self._land_area[:n][rows] >= criteria.min_land_area
+        if criteria.max_land_area is not None:
+            mask &= self._land_area[:n][rows] <= criteria.max_land_area
+        if criteria.crops is not None:
+            mask &= (self._crops[:n][rows] & self._crop_bits(criteria.crops)).any(axis=1)
+        return mask
+
+    def _set_scheme(self, scheme_id: str, criteria: Optional[dict]) -> None:
+        compiled = Criteria.compile(criteria)
+        mask = np.zeros(len(self._alive), dtype=bool)
+        mask[:self._size] = self._evaluate(compiled)
+        self._criteria[scheme_id] = compiled
+        self._masks[scheme_id] = mask
+
+    # Incremental updates
+
+    def update_profiles(self, profiles: Iterable[dict]) -> None:
+        """Insert or refresh farmer profiles given as ``profile_snapshot`` dicts."""
+        profiles = list(profiles)
+        with self._lock:
+            self._remember("update_profiles", profiles)
+            if not self._loaded:
+                return
+            positions = []
+            for profile in profiles:
+                row = self._rows.get(profile["user_id"])
+                if row is None:
+                    row = self._size
+                    self._grow_rows(row + 1)
+                    self._size += 1
+                    self._rows[profile["user_id"]] = row
+                    self._user_ids[row] = profile["user_id"]
+                self._alive[row] = True
+                self._state[row] = self._code("state", profile.get("state"))
+                self._district[row] = self._code("district", profile.get("district"))
+                land_area = _number(profile.get("land_area"))
+                self._land_area[row] = np.nan if land_area is None else land_area
+                crops = {normalize(crop) for crop in profile.get("crops") or []} - {None}
+                for crop in crops:
+                    self._code("crop", crop)
+                self._grow_crop_words()
+                self._crops[row] = self._crop_bits(crops)
+                positions.append(row)
+            self._recompute_rows(positions)
+
+    def remove_profiles(self, user_ids: Iterable[str]) -> None:
+        user_ids = list(user_ids)
+        with self._lock:
+            self._remember("remove_profiles", user_ids)
+            if not self._loaded:
+                return
+            positions = [self._rows[user_id] for user_id in user_ids if user_id in self._rows]
+            self._alive[positions] = False
+            self._recompute_rows(positions)
+
+    def _remember(self, method: str, *args) -> None:
+        if self._replay is not None:
+            self._replay.append((method, args))
+
+    def _recompute_rows(self, positions: List[int]) -> None:
+        if not positions:
+            return
+        rows = np.array(positions)
+        for scheme_id, criteria in self._criteria.items():
+            self._masks[scheme_id][rows] = self._evaluate(criteria, rows)
+
+    def update_scheme(self, scheme_id: str, criteria: Optional[dict], is_active: bool = True) -> None:
+        with self._lock:
+            self._remember("update_scheme", scheme_id, criteria, is_active)
+            if not self._loaded:
+                return
+            if is_active is False:
+                self.remove_scheme(scheme_id)
+            else:
+                self._set_scheme(scheme_id, criteria)
+
+    def remove_scheme(self, scheme_id: str) -> None:
+        with self._lock:
+            self._remember("remove_scheme", scheme_id)
+            self._criteria.pop(scheme_id, None)
+            self._masks.pop(scheme_id, None)
+
+    # Queries
+
+    def schemes_for(self, user_id: str) -> List[str]:
+        """Ids of the active schemes a farmer qualifies for."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                return []
+            return [scheme_id for scheme_id, mask in self._masks.items() if mask[row]]
+
+    def farmers_for(self, scheme_id: str) -> List[str]:
+        """User ids of the farmers qualifying for a scheme, in load order."""
+        with self._lock:
+            mask = self._masks.get(scheme_id)
+            if mask is None:
+                return []
+            return self._user_ids[:self._size][mask[:self._size]].tolist()
+
+    def has_scheme(self, scheme_id: str) -> bool:
+        return scheme_id in self._masks
+
+
+eligibility_engine = EligibilityEngine()
+
+
+# Changes are captured at flush time and applied only once committed.
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault("eligibility_changes", [])
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, models.FarmerProfile):
+            changes.append(("profile", profile_snapshot(obj)))
+        elif isinstance(obj, models.GovernmentScheme):
+            changes.append(("scheme", (obj.id, obj.eligibility_criteria, obj.is_active)))
+    for obj in session.deleted:
+        if isinstance(obj, models.FarmerProfile):
+            changes.append(("profile_deleted", obj.user_id))
+        elif isinstance(obj, models.GovernmentScheme):
+            changes.append(("scheme_deleted", obj.id))
+    if not changes:
+        session.info.pop("eligibility_changes")
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    for kind, value in session.info.pop("eligibility_changes", ()):
+        if kind == "profile":
+            eligibility_engine.update_profiles([value])
+        elif kind == "profile_deleted":
+            eligibility_engine.remove_profiles([value])
+        elif kind == "scheme":
+            eligibility_engine.update_scheme(*value)
+        else:
+            eligibility_engine.remove_scheme(value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("eligibility_changes", None)
@@ -0,0 +1,247 @@
+"""
+Zoom-level clustering of issues for map tiles.
+
+Every located issue is counted once per zoom level in the issue_tile_counts
+table, keyed by its cluster cell, status and priority. The table is updated
+in the same transaction as the issue itself, so serving a tile is a single
+primary-key range read whose size does not depend on the number of issues.
+"""
+from collections import defaultdict
+from typing import Dict, Tuple
+import math
+import os
+from dotenv import load_dotenv
+from sqlalchemy import delete, event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from .. import models
+
+load_dotenv()
+
+TILE_MIN_ZOOM = int(os.getenv("TILE_MIN_ZOOM", "0"))
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "16"))
+# Each tile is split into a 2^bits x 2^bits grid of cluster cells
+CLUSTER_GRID_BITS = int(os.getenv("CLUSTER_GRID_BITS", "3"))
+
+MAX_MERCATOR_LAT = 85.05112878
+
+STATUSES = list(models.IssueStatus)
+PRIORITIES = list(models.IssuePriority)
+
+Key = Tuple[int, int, int, models.IssueStatus, models.IssuePriority]
+
+
+def tile_xy(latitude: float, longitude: float, zoom: int) -> Tuple[int, int]:
+    """Web-mercator (x, y) of the tile containing a point at the given zoom."""
+    latitude = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, latitude))
+    n = 2 ** zoom
+    x = int((longitude + 180.0) / 360.0 * n)
+    lat_rad = math.radians(latitude)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def cluster_keys(latitude: float, longitude: float, status, priority):
+    """The (zoom, cell_x, cell_y, status, priority) key of a point at every zoom level."""
+    for zoom in range(TILE_MIN_ZOOM, TILE_MAX_ZOOM + 1):
+        cell_x, cell_y = tile_xy(latitude, longitude, zoom + CLUSTER_GRID_BITS)
+        yield (zoom, cell_x, cell_y, status, priority)
+
+
+def _add(deltas: Dict[Key, list], latitude, longitude, status, priority, sign: int) -> None:
+    if latitude is None or longitude is None:
+        return
+    status = status or models.IssueStatus.REPORTED
+    priority = priority or models.IssuePriority.MEDIUM
+    for key in cluster_keys(latitude, longitude, status, priority):
+        delta = deltas[key]
+        delta[0] += sign
+        delta[1] += sign * latitude
+        delta[2] += sign * longitude
+
+
+def _rows(deltas: Dict[Key, list]) -> list:
+    return [
+        {
+            "zoom": zoom, "cell_x": cell_x, "cell_y": cell_y, "status": status, "priority": priority,
+            "count": count, "lat_sum": lat_sum, "lon_sum": lon_sum,
+        }
+        for (zoom, cell_x, cell_y, status, priority), (count, lat_sum, lon_sum) in deltas.items()
+        if count
+    ]
+
+
+# Issue attributes whose previous values the incremental counts (here and in app.analytics) need
+PREVIOUS_ATTRS = ("latitude", "longitude", "status", "priority", "category")
+
+
+def previous_value(issue: models.Issue, attr: str):
+    """Value of an attribute as last stored in the database, for the after_flush hooks."""
+    history = inspect(issue).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # Assigned while unloaded or expired: the history has no old value, so use the one read before the flush
+    session = object_session(issue)
+    stored = None
+    if session is not None:
+        stored = session.info.get("issue_previous_values", {}).get(inspect(issue).identity[0])
+    if stored is not None:
+        return stored[attr]
+    return getattr(issue, attr)
+
+
+def _old_value_unknown(issue: models.Issue) -> bool:
+    state = inspect(issue)
+    if state.key is None:
+        return False
+    # Reading history this way never loads the attribute
+    return any(not history.deleted and not history.unchanged
+               for history in (state.attrs[attr].history for attr in PREVIOUS_ATTRS))
+
+
+@event.listens_for(Session, "before_flush")
+def _read_previous_values(session, flush_context, instances):
+    """
+    Read the stored values of issues whose old values are unknown, while the
+    database still has them; after the flush it holds the new ones.
+    """
+    issue_ids = [
+        inspect(issue).identity[0] for issue in (*session.dirty, *session.deleted)
+        if isinstance(issue, models.Issue) and _old_value_unknown(issue)
+    ]
+    if not issue_ids:
+        return
+    columns = [getattr(models.Issue, attr) for attr in PREVIOUS_ATTRS]
+    rows = session.execute(select(models.Issue.id, *columns).where(models.Issue.id.in_(issue_ids)))
+    session.info["issue_previous_values"] = {row[0]: dict(zip(PREVIOUS_ATTRS, row[1:])) for row in rows}
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _forget_previous_values(session, flush_context):
+    session.info.pop("issue_previous_values", None)
+
+
+_TRACKED = ("status", "priority", "latitude", "longitude")
+
+
+def _upsert(dialect_name: str):
+    module = postgresql if dialect_name == "postgresql" else sqlite
+    table = models.IssueTileCount.__table__
+    stmt = module.insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.zoom, table.c.cell_x, table.c.cell_y, table.c.status, table.c.priority],
+        set_={
+            "count": table.c.count + stmt.excluded.count,
+            "lat_sum": table.c.lat_sum + stmt.excluded.lat_sum,
+            "lon_sum": table.c.lon_sum + stmt.excluded.lon_sum,
+        },
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_issue_deltas(session, flush_context):
+    """Fold the issues written by this flush into the tile counts, in one statement."""
+    deltas: Dict[Key, list] = defaultdict(lambda: [0, 0.0, 0.0])
+    for issue in session.new:
+        if isinstance(issue, models.Issue):
+            _add(deltas, issue.latitude, issue.longitude, issue.status, issue.priority, +1)
+    for issue in session.dirty:
+        if not isinstance(issue, models.Issue):
+            continue
+        state = inspect(issue)
+        if not any(state.attrs[attr].history.has_changes() for attr in _TRACKED):
+            continue
+        _add(deltas, *(previous_value(issue, attr) for attr in ("latitude", "longitude", "status", "priority")), -1)
+        _add(deltas, issue.latitude, issue.longitude, issue.status, issue.priority, +1)
+    for issue in session.deleted:
+        if isinstance(issue, models.Issue):
+            _add(deltas, *(previous_value(issue, attr) for attr in ("latitude", "longitude", "status", "priority")), -1)
+
+    _apply(session.connection(), deltas)
+
+
+def _apply(connection, deltas: Dict[Key, list]) -> None:
+    rows = _rows(deltas)
+    if rows:
+        connection.execute(_upsert(connection.dialect.name), rows)
+
+
+def record_new_issues(connection, issues) -> None:
+    """
+    Count issues inserted outside the ORM unit of work (bulk imports), given
+    as mappings with latitude, longitude, status and priority.
+    """
+    deltas: Dict[Key, list] = defaultdict(lambda: [0, 0.0, 0.0])
+    for issue in issues:
+        _add(deltas, issue["latitude"], issue["longitude"], issue["status"], issue["priority"], +1)
+    _apply(connection, deltas)
+
+
+async def get_tile(db: AsyncSession, zoom: int, x: int, y: int) -> dict:
+    """
+    Clusters of one map tile in a compact form:
+
+    ``clusters`` is a list of ``[lat, lon, count, status_counts, priority_counts]``
+    where the count lists follow the order of ``statuses`` and ``priorities``.
+    """
+    size = 2 ** CLUSTER_GRID_BITS
+    table = models.IssueTileCount
+    result = await db.execute(
+        select(table.cell_x, table.cell_y, table.status, table.priority,
+               table.count, table.lat_sum, table.lon_sum)
+        .where(
+            table.zoom == zoom,
+            table.cell_x.between(x * size, x * size + size - 1),
+            table.cell_y.between(y * size, y * size + size - 1),
+            table.count > 0,
+        )
+    )
+    cells: Dict[Tuple[int, int], list] = {}
+    for cell_x, cell_y, status, priority, count, lat_sum, lon_sum in result:
+        cell = cells.get((cell_x, cell_y))
+        if cell is None:
+            cell = cells[(cell_x, cell_y)] = [0, 0.0, 0.0, [0] * len(STATUSES), [0] * len(PRIORITIES)]
+        cell[0] += count
+        cell[1] += lat_sum
+        cell[2] += lon_sum
+        cell[3][STATUSES.index(status)] += count
+        cell[4][PRIORITIES.index(priority)] += count
+
+    clusters = [
+        [round(lat_sum / count, 5), round(lon_sum / count, 5), count, by_status, by_priority]
+        for count, lat_sum, lon_sum, by_status, by_priority in cells.values()
+    ]
+    return {
+        "z": zoom,
+        "x": x,
+        "y": y,
+        "total": sum(cluster[2] for cluster in clusters),
+        "statuses": [s.value for s in STATUSES],
+        "priorities": [p.value for p in PRIORITIES],
+        "clusters": clusters,
+    }
+
+
+def rebuild_tile_counts(db: Session, batch_size: int = 5000) -> int:
+    """Recompute issue_tile_counts from scratch. Returns the number of issues counted."""
+    deltas: Dict[Key, list] = defaultdict(lambda: [0, 0.0, 0.0])
+    counted = 0
+    rows = db.execute(
+        select(models.Issue.latitude, models.Issue.longitude, models.Issue.status, models.Issue.priority)
+        .where(models.Issue.latitude.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for latitude, longitude, status, priority in rows:
+        _add(deltas, latitude, longitude, status, priority, +1)
+        counted += 1
+
+    db.execute(delete(models.IssueTileCount))
+    values = _rows(deltas)
+    for start in range(0, len(values), batch_size):
+        db.execute(models.IssueTileCount.__table__.insert(), values[start:start + batch_size])
+    db.commit()
+    return counted
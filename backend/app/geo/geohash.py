@@ -0,0 +1,104 @@
+"""
+Geohash encoding and bounding-box cover.
+
+A geohash prefix names a rectangular cell, and every point inside the cell
+shares the prefix. Prefix ranges can be served by an ordinary B-tree index
+on SQLite and PostgreSQL alike.
+"""
+from typing import List, Tuple
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Sorts after every BASE32 character, so [prefix, prefix + RANGE_END) spans a cell
+RANGE_END = "{"
+
+DEFAULT_PRECISION = 9  # roughly 5m x 5m cells
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(latitude: float, longitude: float, precision: int = DEFAULT_PRECISION) -> str:
+    """Geohash of a point at the given precision."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = value * 2 + 1
+                lon_lo = mid
+            else:
+                value *= 2
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value *= 2
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a cell at the given precision."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def cover(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = 32) -> List[str]:
+    """
+    Geohash prefixes whose cells together cover the bounding box.
+
+    Uses the finest precision that needs at most max_cells cells. Returns an
+    empty list when even single-character cells would exceed max_cells, in
+    which case callers should fall back to a plain lat/lon range scan.
+    """
+    best: List[str] = []
+    for precision in range(1, DEFAULT_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = math.floor((max_lat + 90) / height) - math.floor((min_lat + 90) / height) + 1
+        cols = math.floor((max_lon + 180) / width) - math.floor((min_lon + 180) / width) + 1
+        if rows * cols > max_cells:
+            break
+        start_lat = math.floor((min_lat + 90) / height) * height - 90 + height / 2
+        start_lon = math.floor((min_lon + 180) / width) * width - 180 + width / 2
+        best = sorted({
+            encode(min(start_lat + i * height, 90.0), min(start_lon + j * width, 180.0), precision)
+            for i in range(rows)
+            for j in range(cols)
+        })
+    return best
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle around a point."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    coslat = math.cos(math.radians(latitude))
+    dlon = 180.0 if coslat < 1e-9 else min(180.0, dlat / coslat)
+    return (
+        max(-90.0, latitude - dlat),
+        max(-180.0, longitude - dlon),
+        min(90.0, latitude + dlat),
+        min(180.0, longitude + dlon),
+    )
@@ -0,0 +1,33 @@
+from typing import Any, Optional, Tuple
+
+
+def _positions(coordinates: Any):
+    """Yield every [lon, lat] position in a GeoJSON coordinates array."""
+    if isinstance(coordinates, (list, tuple)) and coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+        return
+    for item in coordinates or ():
+        yield from _positions(item)
+
+
+def point_from_geojson(location: Optional[dict]) -> Optional[Tuple[float, float]]:
+    """
+    Representative (latitude, longitude) of a GeoJSON object.
+
+    Points map to themselves; Features use their geometry; other geometries
+    use the centre of their bounding box. Returns None for anything unusable.
+    """
+    if not isinstance(location, dict):
+        return None
+    if location.get("type") == "Feature":
+        return point_from_geojson(location.get("geometry"))
+    positions = [p for p in _positions(location.get("coordinates")) if len(p) >= 2]
+    if not positions:
+        return None
+    lons = [float(p[0]) for p in positions]
+    lats = [float(p[1]) for p in positions]
+    latitude = (min(lats) + max(lats)) / 2
+    longitude = (min(lons) + max(lons)) / 2
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
@@ -0,0 +1,84 @@
+"""
+Bounding-box and radius queries over models with a LocatedMixin.
+
+A bbox query becomes a handful of geohash prefix ranges plus an exact
+lat/lon filter, so it is answered from the geohash index. A radius query
+uses its enclosing bbox and then computes exact distances on the
+candidates' coordinates only.
+"""
+from typing import List, Sequence, Tuple
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import geohash
+
+
+def bbox_clause(model, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """SQL condition matching rows of model whose point lies in the bbox."""
+    clauses = [
+        model.latitude.between(min_lat, max_lat),
+        model.longitude.between(min_lon, max_lon),
+    ]
+    cells = geohash.cover(min_lat, min_lon, max_lat, max_lon)
+    if cells:
+        clauses.append(or_(*[
+            and_(model.geohash >= cell, model.geohash < cell + geohash.RANGE_END) for cell in cells
+        ]))
+    return and_(*clauses)
+
+
+async def within_bbox(db: AsyncSession, model, min_lat: float, min_lon: float, max_lat: float,
+                      max_lon: float, limit: int = 500, filters: Sequence = ()) -> List:
+    """Rows of model located inside the bounding box."""
+    query = (
+        select(model)
+        .where(bbox_clause(model, min_lat, min_lon, max_lat, max_lon), *filters)
+        .limit(limit)
+    )
+    result = await db.execute(query)
+    return list(result.scalars())
+
+
+async def within_radius(db: AsyncSession, model, latitude: float, longitude: float, radius_km: float,
+                        limit: int = 500, filters: Sequence = ()) -> List[Tuple[object, float]]:
+    """(row, distance_km) pairs within radius_km of a point, nearest first."""
+    bbox = geohash.radius_bbox(latitude, longitude, radius_km)
+    candidates = await db.execute(
+        select(model.id, model.latitude, model.longitude).where(bbox_clause(model, *bbox), *filters)
+    )
+    distances = {}
+    for row_id, lat, lon in candidates:
+        distance = geohash.haversine_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            distances[row_id] = distance
+    nearest = sorted(distances, key=distances.get)[:limit]
+    if not nearest:
+        return []
+    result = await db.execute(select(model).where(model.id.in_(nearest)))
+    rows = list(result.scalars())
+    rows.sort(key=lambda row: distances[row.id])
+    return [(row, distances[row.id]) for row in rows]
+
+
+def reindex_locations(db: Session, model, batch_size: int = 1000) -> int:
+    """
+    Recompute the point columns of every row from its GeoJSON location.
+
+    Used to backfill rows written before the spatial columns existed.
+    Returns the number of rows processed.
+    """
+    processed = 0
+    last_id = None
+    while True:
+        query = select(model).where(model.location.isnot(None)).order_by(model.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(model.id > last_id)
+        rows = list(db.execute(query).scalars())
+        if not rows:
+            return processed
+        for row in rows:
+            row.location = row.location
+        db.commit()
+        processed += len(rows)
+        last_id = rows[-1].id
@@ -0,0 +1,171 @@
+"""
+HTTP response cache for read-mostly content.
+
+Responses are cached already serialized (and lazily compressed) in
+per-tag LRU caches, keyed by path, query string and language. Each entry
+carries a strong ETag hashed from its body, so clients revalidating with
+``If-None-Match`` get a bodyless 304. (``updated_at`` would not do: it has
+second precision on SQLite, so two edits in one second would share a tag.)
+Committing a change to a tagged model clears that tag's cache in this
+process; the TTL bounds how long other workers keep serving the old entry.
+"""
+from typing import Awaitable, Callable, Dict, Optional
+import gzip
+import hashlib
+import os
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+load_dotenv()
+
+HTTP_CACHE_TTL_SECONDS = float(os.getenv("HTTP_CACHE_TTL_SECONDS", "300"))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "1000"))
+# How long clients and proxies may reuse a response before revalidating
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+COMPRESS_MIN_BYTES = 512
+
+TAGS = {
+    models.GovernmentScheme: "schemes",
+    models.TrainingModule: "training_modules",
+    models.SuccessStory: "success_stories",
+}
+
+
+class CachedResponse:
+    def __init__(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+        self.encoded: Dict[str, bytes] = {}
+
+    def encode(self, encoding: str) -> bytes:
+        """The body in the given content coding, compressed once and kept."""
+        if encoding == "identity":
+            return self.body
+        if encoding not in self.encoded:
+            if encoding == "br":
+                self.encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self.encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+        return self.encoded[encoding]
+
+
+def etag_for(key: tuple, body: bytes) -> str:
+    """Strong ETag from the cache key and the serialized body."""
+    digest = hashlib.sha256(repr(key).encode())
+    digest.update(body)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def request_language(request: Request) -> str:
+    language = request.query_params.get("language")
+    if not language:
+        accept = request.headers.get("accept-language", "")
+        language = accept.split(",")[0].split(";")[0].split("-")[0].strip()
+    return (language or "en").lower()
+
+
+def choose_encoding(request: Request, size: int) -> str:
+    if size < COMPRESS_MIN_BYTES:
+        return "identity"
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("accept-encoding", "").split(",")
+        if not part.strip().endswith(";q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        # Compressed variants carry an encoding suffix on the same ETag
+        if candidate.strip('"').split("-")[0] == base:
+            return True
+    return False
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int = HTTP_CACHE_MAX_ENTRIES, ttl: float = HTTP_CACHE_TTL_SECONDS):
+        self.caches = {tag: TTLCache(maxsize=maxsize, ttl=ttl) for tag in TAGS.values()}
+        self.generations = {tag: 0 for tag in TAGS.values()}
+        self.not_modified = 0
+
+    def invalidate(self, tag: str) -> None:
+        self.generations[tag] += 1
+        self.caches[tag].clear()
+
+    def stats(self) -> dict:
+        return {"not_modified": self.not_modified, **{tag: cache.stats() for tag, cache in self.caches.items()}}
+
+    async def respond(self, request: Request, tag: str,
+                      build: Callable[[], Awaitable[bytes]]) -> Response:
+        """Serve request from the cache, calling build() for the JSON body on a miss."""
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())), request_language(request))
+        cache = self.caches[tag]
+        entry: Optional[CachedResponse] = cache.get(key)
+        if entry is None:
+            generation = self.generations[tag]
+            body = await build()
+            entry = CachedResponse(body, etag_for(key, body))
+            # A write committed while building may not be in this body
+            if generation == self.generations[tag]:
+                cache.set(key, entry)
+
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}",
+            "Vary": "Accept-Encoding, Accept-Language",
+        }
+        if _matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        encoding = choose_encoding(request, len(entry.body))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+            headers["ETag"] = f'{entry.etag[:-1]}-{encoding}"'
+        return Response(content=entry.encode(encoding), media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_tags(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tag = TAGS.get(type(obj))
+        if tag is not None:
+            session.info.setdefault("http_cache_tags", set()).add(tag)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for tag in session.info.pop("http_cache_tags", ()):
+        response_cache.invalidate(tag)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("http_cache_tags", None)
@@ -0,0 +1,134 @@
+"""
+Convert stored ids to the compact UUID column type.
+
+Databases created before models.CompactUUID hold ids as 36-character text.
+On PostgreSQL the id and foreign key columns are altered to the native uuid
+type, with the foreign keys dropped and recreated around the change. On
+SQLite, whose columns accept any storage class, the values are rewritten in
+place as 16-byte blobs. Existing ids keep their values, so tokens and links
+that carry them stay valid; only new rows get time-ordered ids.
+
+Run once from the backend directory, with the API stopped:
+
+    python -m app.id_migration
+"""
+from typing import Dict, List, Tuple
+from sqlalchemy import Column, Table, inspect, text
+from sqlalchemy.dialects import postgresql
+
+from . import models
+from .database import Base, engine
+
+
+def uuid_columns() -> List[Tuple[Table, Column]]:
+    return [
+        (table, column)
+        for table in Base.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, models.CompactUUID)
+    ]
+
+
+def _uuid_blob(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        raw = bytes.fromhex(value.replace("-", ""))
+    except ValueError:
+        return value
+    return raw if len(raw) == 16 else value
+
+
+def _migrate_sqlite(connection) -> Dict[str, int]:
+    connection.connection.driver_connection.create_function("uuid_blob", 1, _uuid_blob, deterministic=True)
+    quote = connection.dialect.identifier_preparer.quote
+    existing = set(inspect(connection).get_table_names())
+    converted = {}
+    for table, column in uuid_columns():
+        if table.name not in existing:
+            continue
+        name = quote(column.name)
+        result = connection.execute(text(
+            f"UPDATE {quote(table.name)} SET {name} = uuid_blob({name}) WHERE typeof({name}) = 'text'"
+        ))
+        converted[f"{table.name}.{column.name}"] = result.rowcount
+        malformed = connection.execute(text(
+            f"SELECT count(*) FROM {quote(table.name)} WHERE typeof({name}) = 'text'"
+        )).scalar()
+        if malformed:
+            print(f"{table.name}.{column.name}: {malformed} values are not UUIDs and were left as text")
+    return converted
+
+
+def _migrate_postgresql(connection) -> Dict[str, int]:
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    existing = set(inspector.get_table_names())
+    current_types = {
+        (table_name, column["name"]): column["type"]
+        for table_name in existing
+        for column in inspector.get_columns(table_name)
+    }
+    pending = [
+        (table, column) for table, column in uuid_columns()
+        if table.name in existing and not isinstance(current_types.get((table.name, column.name)), postgresql.UUID)
+    ]
+    if not pending:
+        return {}
+    pending_names = {(table.name, column.name) for table, column in pending}
+
+    # A column's type cannot change while a foreign key ties it to a column of another type
+    foreign_keys = [
+        (table_name, fk)
+        for table_name in existing
+        for fk in inspector.get_foreign_keys(table_name)
+        if fk["name"] and (
+            any((table_name, name) in pending_names for name in fk["constrained_columns"])
+            or any((fk["referred_table"], name) in pending_names for name in fk["referred_columns"])
+        )
+    ]
+    for table_name, fk in foreign_keys:
+        connection.execute(text(f"ALTER TABLE {quote(table_name)} DROP CONSTRAINT {quote(fk['name'])}"))
+
+    converted = {}
+    for table, column in pending:
+        connection.execute(text(
+            f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(column.name)}"
+            f" TYPE uuid USING {quote(column.name)}::uuid"
+        ))
+        converted[f"{table.name}.{column.name}"] = connection.execute(
+            text(f"SELECT count({quote(column.name)}) FROM {quote(table.name)}")
+        ).scalar()
+
+    for table_name, fk in foreign_keys:
+        columns = ", ".join(quote(name) for name in fk["constrained_columns"])
+        referred = ", ".join(quote(name) for name in fk["referred_columns"])
+        on_delete = fk.get("options", {}).get("ondelete")
+        connection.execute(text(
+            f"ALTER TABLE {quote(table_name)} ADD CONSTRAINT {quote(fk['name'])}"
+            f" FOREIGN KEY ({columns}) REFERENCES {quote(fk['referred_table'])} ({referred})"
+            + (f" ON DELETE {on_delete}" if on_delete else "")
+        ))
+    return converted
+
+
+def migrate_ids(connection) -> Dict[str, int]:
+    """Convert text ids in place. Safe to run again; returns rows converted per column."""
+    if connection.dialect.name == "postgresql":
+        return _migrate_postgresql(connection)
+    if connection.dialect.name == "sqlite":
+        return _migrate_sqlite(connection)
+    return {}
+
+
+def main() -> None:
+    with engine.begin() as connection:
+        converted = migrate_ids(connection)
+    if not converted:
+        print("Nothing to convert")
+    for column, count in converted.items():
+        print(f"{column}: {count} rows converted")
+
+
+if __name__ == "__main__":
+    main()
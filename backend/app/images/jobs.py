@@ -0,0 +1,98 @@
+"""
+Background generation of image variants.
+
+Every stored image gets IMAGE_WIDTHS-wide JPEG and WebP variants, rendered
+in a process pool so resizing never occupies an API worker. Rendering
+starts right after an upload. A variant requested before it exists (or
+lost, e.g. when the pool was stopped mid-render) is rendered on demand;
+concurrent requests for the same image share one render.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+import asyncio
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+from ..cache import TTLCache
+from .render import EXTENSIONS, render_variants
+from .store import IMAGE_FEED_WIDTH, ImageStore, image_store
+
+load_dotenv()
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_WIDTHS = sorted(
+    {int(width) for width in os.getenv("IMAGE_WIDTHS", "160,320,640,1280").split(",")} | {IMAGE_FEED_WIDTH}
+)
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "75"))
+# An image whose variants failed to render is not retried for this long
+IMAGE_RETRY_SECONDS = int(os.getenv("IMAGE_RETRY_SECONDS", "300"))
+
+
+class ImageService:
+    def __init__(self, store: ImageStore, widths: List[int] = IMAGE_WIDTHS, workers: int = IMAGE_WORKERS):
+        self.store = store
+        self.widths = widths
+        self.workers = workers
+        self.quality = {"jpg": IMAGE_JPEG_QUALITY, "webp": IMAGE_WEBP_QUALITY}
+        self.counters = {
+            "rendered": 0, "failed": 0, "coalesced": 0,
+            "originals_served": 0, "variants_served": 0, "not_modified": 0, "partial": 0,
+        }
+        self.failed = TTLCache(maxsize=10000, ttl=IMAGE_RETRY_SECONDS)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        os.makedirs(self.store.root, exist_ok=True)
+        # Workers are spawned, not forked, so they never inherit the event loop or open connections
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self) -> None:
+        tasks: Set[asyncio.Task] = set(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return dict(self.counters, rendering=len(self._inflight), **self.store.stats())
+
+    def variant_names(self) -> List[str]:
+        return [f"{width}.{extension}" for width in self.widths for extension in EXTENSIONS]
+
+    def ready(self, image_id: str) -> bool:
+        return all(os.path.exists(self.store.variant_path(image_id, name)) for name in self.variant_names())
+
+    def submit(self, image_id: str) -> Optional[asyncio.Task]:
+        """Render the variants of a stored image unless that is under way or recently failed."""
+        if self.failed.get(image_id):
+            return None
+        task = self._inflight.get(image_id)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            return task
+        task = asyncio.create_task(self._render(image_id))
+        self._inflight[image_id] = task
+        task.add_done_callback(lambda _: self._inflight.pop(image_id, None))
+        return task
+
+    async def _render(self, image_id: str) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._pool, render_variants, self.store.original_path(image_id),
+                self.store.directory(image_id), self.widths, self.quality, self.store.max_pixels,
+            )
+            self.counters["rendered"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.counters["failed"] += 1
+            self.failed.set(image_id, True)
+            print(f"Image {image_id} variants failed: {str(e) or type(e).__name__}")
+
+
+image_service = ImageService(image_store)
@@ -0,0 +1,139 @@
+"""
+Lossless removal of photo metadata.
+
+Phone cameras write the GPS position, the device and the capture time
+into EXIF/XMP/IPTC blocks, and stored originals are public. Before an
+upload is stored, its metadata blocks are cut out of the file without
+decoding or re-compressing the image: JPEG APPn/COM segments, PNG text and
+eXIf chunks, WebP EXIF and XMP chunks. Colour profiles are kept, and so is
+the EXIF orientation, rewritten as the only tag, so the photo still shows
+the right way up.
+"""
+from typing import List, Optional
+import os
+import struct
+import tempfile
+import zlib
+from PIL import Image
+
+ORIENTATION = 0x0112
+
+# JPEG: SOI, EOI, start of scan, comment, and the APPn segments worth keeping
+SOI, EOI, SOS, COM = b"\xff\xd8", b"\xff\xd9", 0xDA, 0xFE
+APP0, APP2, APP14 = 0xE0, 0xE2, 0xEE
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_METADATA = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+WEBP_EXIF, WEBP_XMP = 0x08, 0x04
+
+
+def _orientation_tiff(orientation: Optional[int]) -> Optional[bytes]:
+    """A TIFF block holding only the orientation tag, or None when there is nothing to keep."""
+    if not orientation or orientation == 1:
+        return None
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    return exif.tobytes()[len(b"Exif\x00\x00"):]
+
+
+def strip_jpeg(data: bytes, orientation: Optional[int] = None) -> bytes:
+    if not data.startswith(SOI):
+        raise ValueError("Not a JPEG file")
+    parts: List[bytes] = [SOI]
+    tiff = _orientation_tiff(orientation)
+    if tiff is not None:
+        payload = b"Exif\x00\x00" + tiff
+        parts.append(b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload)
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Malformed JPEG segment")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == SOS:
+            # Scans and any later tables run up to the first EOI; anything after
+            # it (appended previews, depth maps) carries metadata of its own
+            end = data.find(EOI, pos)
+            parts.append(data[pos:] if end < 0 else data[pos:end + 2])
+            return b"".join(parts)
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        segment = data[pos:pos + 2 + length]
+        if marker == COM:
+            keep = False
+        elif 0xE0 <= marker <= 0xEF:
+            keep = marker in (APP0, APP14) or (marker == APP2 and segment[4:16] == b"ICC_PROFILE\x00")
+        else:
+            keep = True  # tables and frame headers
+        if keep:
+            parts.append(segment)
+        pos += 2 + length
+    raise ValueError("JPEG has no image data")
+
+
+def strip_png(data: bytes, orientation: Optional[int] = None) -> bytes:
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG file")
+    parts: List[bytes] = [PNG_SIGNATURE]
+    tiff = _orientation_tiff(orientation)
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos:pos + 12 + length]
+        pos += 12 + length
+        if kind not in PNG_METADATA:
+            parts.append(chunk)
+        if kind == b"IHDR" and tiff is not None:
+            parts.append(struct.pack(">I", len(tiff)) + b"eXIf" + tiff
+                         + struct.pack(">I", zlib.crc32(b"eXIf" + tiff)))
+        if kind == b"IEND":
+            break
+    return b"".join(parts)
+
+
+def strip_webp(data: bytes, orientation: Optional[int] = None) -> bytes:
+    if data[:4] != b"RIFF" or data[8:12] != b"WEBP":
+        raise ValueError("Not a WebP file")
+    chunks: List[bytes] = []
+    vp8x = None
+    pos = 12
+    while pos + 8 <= len(data):
+        kind, length = struct.unpack("<4sI", data[pos:pos + 8])
+        chunk = data[pos:pos + 8 + length + (length & 1)]
+        pos += 8 + length + (length & 1)
+        if kind in (b"EXIF", b"XMP "):
+            continue
+        if kind == b"VP8X":
+            vp8x = len(chunks)
+        chunks.append(chunk)
+    if vp8x is not None:
+        # Only the extended format has metadata chunks, announced in its flags
+        flags = chunks[vp8x][8] & ~(WEBP_EXIF | WEBP_XMP)
+        tiff = _orientation_tiff(orientation)
+        if tiff is not None:
+            flags |= WEBP_EXIF
+            chunks.append(b"EXIF" + struct.pack("<I", len(tiff)) + tiff + b"\x00" * (len(tiff) & 1))
+        chunks[vp8x] = chunks[vp8x][:8] + bytes([flags]) + chunks[vp8x][9:]
+    body = b"WEBP" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+STRIPPERS = {"JPEG": strip_jpeg, "PNG": strip_png, "WEBP": strip_webp}
+
+
+def strip_metadata(path: str) -> int:
+    """Rewrite the image at path without its metadata; returns its new size. Blocking."""
+    with Image.open(path) as image:
+        strip = STRIPPERS[image.format]
+        orientation = image.getexif().get(ORIENTATION)
+    with open(path, "rb") as f:
+        data = strip(f.read(), orientation)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(data)
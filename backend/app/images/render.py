@@ -0,0 +1,66 @@
+"""
+Image resizing with Pillow.
+
+Everything here runs in a worker process: it reads a stored original and
+writes its resized JPEG and WebP variants next to it, touching neither the
+database nor the event loop.
+"""
+from typing import Dict, List, Tuple
+import os
+import tempfile
+from PIL import Image, ImageOps
+
+EXTENSIONS = ("jpg", "webp")
+
+
+def probe(path: str, max_pixels: int) -> Tuple[str, int, int]:
+    """(format, width, height) read from the image header; raises on anything Pillow cannot decode safely."""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(path) as image:
+        if image.width * image.height > max_pixels:
+            raise Image.DecompressionBombError(f"{image.width}x{image.height} pixels is too large")
+        return image.format, image.width, image.height
+
+
+def _save(image: Image.Image, path: str, extension: str, quality: Dict[str, int]) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        if extension == "jpg":
+            image.save(tmp_path, "JPEG", quality=quality["jpg"], optimize=True, progressive=True)
+        else:
+            image.save(tmp_path, "WEBP", quality=quality["webp"], method=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def render_variants(source: str, directory: str, widths: List[int], quality: Dict[str, int], max_pixels: int) -> List[str]:
+    """
+    Write every width in both formats to directory as ``<width>.<ext>``;
+    returns the file names. Widths larger than the original get a copy at
+    the original size, so every advertised variant exists. EXIF orientation
+    is applied and metadata, including GPS tags, is dropped.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            # Flatten transparency onto white, as JPEG has no alpha
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        written = []
+        for width in sorted(widths, reverse=True):
+            resized = image
+            if width < image.width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            for extension in EXTENSIONS:
+                name = f"{width}.{extension}"
+                _save(resized, os.path.join(directory, name), extension, quality)
+                written.append(name)
+            # Each smaller size is resized from the previous one, which is much faster on large photos
+            image = resized
+    return written
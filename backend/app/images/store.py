@@ -0,0 +1,168 @@
+"""
+Content-addressed storage for uploaded images.
+
+An upload is streamed to a temporary file while its SHA-256 is computed.
+The hex digest is the image's id and names its directory:
+
+    IMAGE_STORE_DIR/ab/abcdef.../original     the upload without its metadata
+                                 meta.json    content type, size and dimensions
+                                 320.webp     variants written by app.images.jobs
+                                 320.jpg
+
+Uploading the same photo again finds the existing directory and stores
+nothing, so a picture shared in several stories (or retried over a flaky
+connection) is kept once. Stored files never change, which is what lets
+them be served with immutable cache headers. Originals are public, so EXIF
+and other metadata (GPS position included) is cut out of them losslessly
+before they are stored; see app.images.metadata.
+"""
+from datetime import datetime
+from typing import AsyncIterator, NamedTuple, Optional
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+from dotenv import load_dotenv
+from PIL import Image
+
+from .metadata import strip_metadata
+from .render import probe
+
+load_dotenv()
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "./image_store")
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(15 * 1024 * 1024)))
+# Uploads decoding to more pixels than this are refused (decompression bombs)
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+# Width of the thumbnails linked from story listings
+IMAGE_FEED_WIDTH = int(os.getenv("IMAGE_FEED_WIDTH", "320"))
+
+IMAGE_URL_PREFIX = "/api/images"
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+IMAGE_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class UnsupportedImage(Exception):
+    pass
+
+
+class StoredImage(NamedTuple):
+    id: str
+    content_type: str
+    width: int
+    height: int
+    size: int
+    created: bool  # False when the same bytes were already stored
+
+
+def image_url(image_id: str) -> str:
+    return f"{IMAGE_URL_PREFIX}/{image_id}"
+
+
+def variant_url(url: str, width: int) -> str:
+    """URL of a resized variant of a stored image's URL; any other URL is returned as is."""
+    image_id = url.rsplit("/", 1)[-1]
+    if url == image_url(image_id) and IMAGE_ID.match(image_id):
+        return f"{url}/{width}"
+    return url
+
+
+class ImageStore:
+    def __init__(self, root: str = IMAGE_STORE_DIR, max_bytes: int = IMAGE_MAX_BYTES,
+                 max_pixels: int = IMAGE_MAX_PIXELS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.counters = {"uploads": 0, "deduplicated": 0, "rejected": 0, "bytes_stored": 0}
+
+    def directory(self, image_id: str) -> str:
+        if not IMAGE_ID.match(image_id):
+            raise ValueError(f"Not an image id: {image_id!r}")
+        return os.path.join(self.root, image_id[:2], image_id)
+
+    def original_path(self, image_id: str) -> str:
+        return os.path.join(self.directory(image_id), "original")
+
+    def variant_path(self, image_id: str, name: str) -> str:
+        return os.path.join(self.directory(image_id), name)
+
+    def meta(self, image_id: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directory(image_id), "meta.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+    async def save(self, chunks: AsyncIterator[bytes]) -> StoredImage:
+        """Store an upload; raises ImageTooLarge or UnsupportedImage."""
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        self.counters["rejected"] += 1
+                        raise ImageTooLarge(f"Images are limited to {self.max_bytes / (1024 * 1024):g} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+            image_id = digest.hexdigest()
+            self.counters["uploads"] += 1
+            meta = self.meta(image_id)
+            if meta is not None:
+                self.counters["deduplicated"] += 1
+                return StoredImage(image_id, meta["content_type"], meta["width"], meta["height"], meta["size"], False)
+            try:
+                image_format, width, height = await asyncio.to_thread(probe, tmp_path, self.max_pixels)
+            except Image.DecompressionBombError as e:
+                self.counters["rejected"] += 1
+                raise UnsupportedImage(str(e))
+            except Exception:
+                self.counters["rejected"] += 1
+                raise UnsupportedImage("Not a readable JPEG, PNG or WebP image")
+            if image_format not in CONTENT_TYPES:
+                self.counters["rejected"] += 1
+                raise UnsupportedImage(f"Unsupported image format {image_format}; use JPEG, PNG or WebP")
+            try:
+                size = await asyncio.to_thread(strip_metadata, tmp_path)
+            except Exception:
+                self.counters["rejected"] += 1
+                raise UnsupportedImage(f"Malformed {image_format} image")
+            meta = {
+                "content_type": CONTENT_TYPES[image_format],
+                "width": width,
+                "height": height,
+                "size": size,
+                "uploaded_at": datetime.utcnow().isoformat(),
+            }
+            await asyncio.to_thread(self._commit, image_id, tmp_path, meta)
+            self.counters["bytes_stored"] += size
+            return StoredImage(image_id, meta["content_type"], width, height, size, True)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _commit(self, image_id: str, tmp_path: str, meta: dict) -> None:
+        # meta.json is written last, so an image counts as stored only once its original is in place
+        directory = self.directory(image_id)
+        os.makedirs(directory, exist_ok=True)
+        os.replace(tmp_path, os.path.join(directory, "original"))
+        fd, meta_tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp, os.path.join(directory, "meta.json"))
+
+
+image_store = ImageStore()
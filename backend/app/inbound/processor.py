@@ -0,0 +1,291 @@
+"""
+Turn queued WhatsApp and IVR messages into issues and issue updates.
+
+The processor claims a batch from the inbound queue and applies it in one
+transaction. It needs one query for the senders, two for the SIDs they
+have already applied and one for their open issues, and then a single
+commit. A
+message from a farmer with an open issue reported within
+INBOUND_THREAD_HOURS becomes an update on that issue, so a photo, a voice
+note and a location shared one after another build up one report. Any
+other message opens a new issue. Unknown numbers get a farmer account, as
+on first OTP login.
+
+The message SID is stored as the row's client_id, the same idempotency key
+offline sync uses, so a replayed message is never applied twice. If a batch
+fails to commit, its messages are retried one per transaction, so one bad
+message cannot hold up the rest.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+import asyncio
+import os
+import re
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..database import AsyncSessionLocal
+from .queue import INBOUND_MAX_ATTEMPTS, InboundQueue, QueuedMessage
+
+load_dotenv()
+
+INBOUND_BATCH_SIZE = int(os.getenv("INBOUND_BATCH_SIZE", "200"))
+INBOUND_BATCH_WAIT_MS = int(os.getenv("INBOUND_BATCH_WAIT_MS", "100"))
+INBOUND_POLL_SECONDS = float(os.getenv("INBOUND_POLL_SECONDS", "5"))
+INBOUND_THREAD_HOURS = int(os.getenv("INBOUND_THREAD_HOURS", "24"))
+# Country calling code stripped from sender numbers to match stored phone numbers
+INBOUND_COUNTRY_CODE = os.getenv("INBOUND_COUNTRY_CODE", "91")
+
+CHANNEL_TITLES = {"whatsapp": "WhatsApp report", "ivr": "IVR report"}
+OPEN_STATUSES = (models.IssueStatus.REPORTED, models.IssueStatus.IN_PROGRESS)
+
+
+class InvalidMessage(Exception):
+    """A message that can never be applied, e.g. without a sender."""
+
+
+class Report(NamedTuple):
+    sid: str
+    channel: str
+    phone_number: str
+    name: Optional[str]
+    text: str
+    location: Optional[dict]
+
+
+def normalize_phone(sender: str, country_code: str = INBOUND_COUNTRY_CODE) -> str:
+    """'whatsapp:+919876543210' -> '9876543210', matching numbers entered at OTP login."""
+    digits = re.sub(r"\D", "", sender)
+    if country_code and len(digits) == 10 + len(country_code) and digits.startswith(country_code):
+        digits = digits[len(country_code):]
+    return digits
+
+
+def message_sid(channel: str, params: Dict[str, str]) -> str:
+    """
+    Dedupe key of a webhook. An IVR call may post several recordings, so
+    each is keyed by its RecordingSid and anything else by the CallSid.
+    """
+    if channel == "ivr":
+        return params.get("RecordingSid") or params.get("CallSid", "")
+    return params.get("MessageSid") or params.get("SmsSid", "")
+
+
+def parse_report(message: QueuedMessage) -> Report:
+    """Read the Twilio webhook parameters stored for a message; raises InvalidMessage or ValueError."""
+    params = message.payload
+    phone_number = normalize_phone(params.get("From", ""))
+    if not 10 <= len(phone_number) <= 15:
+        raise InvalidMessage(f"Unusable sender {params.get('From')!r}")
+    lines = [(params.get("Body") or params.get("SpeechResult") or "").strip()]
+    if params.get("Digits"):
+        lines.append(f"Keypad: {params['Digits']}")
+    media = [params[f"MediaUrl{i}"] for i in range(int(params.get("NumMedia") or 0)) if params.get(f"MediaUrl{i}")]
+    if params.get("RecordingUrl"):
+        media.append(params["RecordingUrl"])
+    lines.extend(f"Media: {url}" for url in media)
+    location = None
+    try:
+        if params.get("Latitude") and params.get("Longitude"):
+            location = {"type": "Point", "coordinates": [float(params["Longitude"]), float(params["Latitude"])]}
+    except ValueError:
+        pass
+    return Report(
+        sid=message.sid,
+        channel=message.channel,
+        phone_number=phone_number,
+        name=(params.get("ProfileName") or "").strip()[:100] or None,
+        text="\n".join(line for line in lines if line)[:1000],
+        location=location,
+    )
+
+
+def issue_title(report: Report) -> str:
+    first_line = report.text.split("\n", 1)[0]
+    if not first_line or first_line.startswith("Media: "):
+        return CHANNEL_TITLES.get(report.channel, "Inbound report")
+    return first_line if len(first_line) <= 100 else first_line[:99] + "…"
+
+
+async def apply_reports(db: AsyncSession, reports: List[Report]) -> int:
+    """Add the rows for reports to the session, in order; returns how many were not applied before."""
+    phones = {report.phone_number for report in reports}
+    users = {
+        user.phone_number: user
+        for user in (await db.execute(select(models.User).where(models.User.phone_number.in_(phones)))).scalars()
+    }
+    open_issues: Dict[str, models.Issue] = {}
+    if users:
+        # Applied SIDs belong to known senders; filtering on them as well lets
+        # the (reported_by, client_id) and (created_by, client_id) unique
+        # indexes answer these lookups
+        user_ids = [user.id for user in users.values()]
+        sids = [report.sid for report in reports]
+        applied = set((await db.execute(
+            select(models.Issue.client_id)
+            .where(models.Issue.reported_by.in_(user_ids), models.Issue.client_id.in_(sids))
+        )).scalars())
+        applied.update((await db.execute(
+            select(models.IssueUpdate.client_id)
+            .where(models.IssueUpdate.created_by.in_(user_ids), models.IssueUpdate.client_id.in_(sids))
+        )).scalars())
+        reports = [report for report in reports if report.sid not in applied]
+        if not reports:
+            return 0
+
+        cutoff = datetime.utcnow() - timedelta(hours=INBOUND_THREAD_HOURS)
+        result = await db.execute(
+            select(models.Issue)
+            .where(
+                models.Issue.reported_by.in_(user_ids),
+                models.Issue.status.in_(OPEN_STATUSES),
+                models.Issue.created_at >= cutoff,
+            )
+            .order_by(models.Issue.created_at, models.Issue.id)
+        )
+        for issue in result.scalars():
+            open_issues[issue.reported_by] = issue  # the latest wins
+
+    for report in reports:
+        user = users.get(report.phone_number)
+        if user is None:
+            user = models.User(
+                id=models.generate_uuid(),
+                phone_number=report.phone_number,
+                name=report.name,
+                role=models.UserRole.FARMER,
+                is_active=True,
+            )
+            db.add(user)
+            users[report.phone_number] = user
+        issue = open_issues.get(user.id)
+        if issue is None:
+            issue = models.Issue(
+                id=models.generate_uuid(),
+                title=issue_title(report),
+                description=report.text or None,
+                status=models.IssueStatus.REPORTED,
+                location=report.location,
+                reported_by=user.id,
+                client_id=report.sid,
+            )
+            db.add(issue)
+            open_issues[user.id] = issue
+            continue
+        db.add(models.IssueUpdate(
+            id=models.generate_uuid(),
+            issue_id=issue.id,
+            status=issue.status,
+            notes=report.text or None,
+            created_by=user.id,
+            client_id=report.sid,
+        ))
+        if report.location and not issue.location:
+            issue.location = report.location
+    return len(reports)
+
+
+class InboundProcessor:
+    def __init__(self, queue: InboundQueue, batch_size: int = INBOUND_BATCH_SIZE,
+                 batch_wait_ms: int = INBOUND_BATCH_WAIT_MS, poll_seconds: float = INBOUND_POLL_SECONDS,
+                 max_attempts: int = INBOUND_MAX_ATTEMPTS):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.backlog = 0
+        self.stalled = False
+        self.counters = {"applied": 0, "skipped": 0, "failed": 0, "batches": 0, "isolated": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.queue.close()
+
+    def stats(self) -> dict:
+        return dict(self.counters, backlog=self.backlog, **{f"queue_{k}": v for k, v in self.queue.stats().items()})
+
+    async def _run(self) -> None:
+        await asyncio.to_thread(self.queue.purge)
+        while True:
+            try:
+                await asyncio.wait_for(self.queue.arrived.wait(), self.poll_seconds)
+                # Let a burst accumulate so it is committed in as few batches as possible
+                await asyncio.sleep(self.batch_wait)
+            except asyncio.TimeoutError:
+                pass
+            self.queue.arrived.clear()
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Inbound processing failed: {e}")
+
+    async def drain(self) -> int:
+        """
+        Process batches until the queue is empty, or until a batch in which
+        every message failed; returns how many messages were taken. The
+        failed messages are retried after their backoff, by a later drain.
+        """
+        total = 0
+        while True:
+            taken = await self.process_batch()
+            total += taken
+            if not taken or self.stalled:
+                self.backlog = await asyncio.to_thread(self.queue.backlog)
+                return total
+
+    async def process_batch(self) -> int:
+        """Claim, apply and settle one batch; returns how many messages it held."""
+        messages = await asyncio.to_thread(self.queue.claim, self.batch_size, self.max_attempts)
+        if not messages:
+            return 0
+        reports: Dict[int, Report] = {}
+        rejected: Dict[int, str] = {}
+        for message in messages:
+            try:
+                reports[message.seq] = parse_report(message)
+            except (InvalidMessage, ValueError) as e:
+                rejected[message.seq] = str(e)
+        done: List[int] = []
+        failed: Dict[int, str] = {}
+        if reports:
+            try:
+                await self._apply(list(reports.values()))
+                done.extend(reports)
+            except Exception as e:
+                print(f"Inbound batch of {len(reports)} failed, applying one by one: {e}")
+                self.counters["isolated"] += 1
+                for seq, report in reports.items():
+                    try:
+                        await self._apply([report])
+                        done.append(seq)
+                    except Exception as e:
+                        failed[seq] = str(e) or type(e).__name__
+        self.counters["batches"] += 1
+        self.counters["failed"] += len(failed) + len(rejected)
+        # Nothing went through, most likely because the database is down
+        self.stalled = bool(failed) and not done
+        await asyncio.to_thread(self.queue.complete, done, failed, rejected, self.max_attempts)
+        return len(messages)
+
+    async def _apply(self, reports: List[Report]) -> None:
+        async with AsyncSessionLocal() as db:
+            applied = await apply_reports(db, reports)
+            await db.commit()
+        self.counters["applied"] += applied
+        self.counters["skipped"] += len(reports) - applied
+
+
+inbound_queue = InboundQueue()
+inbound_processor = InboundProcessor(inbound_queue)
@@ -0,0 +1,261 @@
+"""
+Durable queue of inbound WhatsApp and IVR messages.
+
+Webhooks only append the raw Twilio parameters to a WAL-mode SQLite file
+and return. Appends that arrive while a write is in progress are committed
+together, so a campaign burst costs one fsync per batch rather than per
+message. The message SID is unique, so a webhook Twilio retries is stored
+once.
+
+Messages are claimed in arrival order, under a lease: a batch whose worker
+dies is claimed again once the lease runs out. A message that fails is
+retried after a backoff that doubles with every attempt, so an outage of
+the main database does not use up its attempts within seconds. Processed
+messages are kept for INBOUND_RETENTION_DAYS, so they can be replayed (see
+app.inbound.replay).
+"""
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import asyncio
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+import orjson
+
+load_dotenv()
+
+INBOUND_QUEUE_PATH = os.getenv("INBOUND_QUEUE_PATH", "./inbound_queue.db")
+# FULL survives power loss; NORMAL only process crashes, but skips most fsyncs
+INBOUND_QUEUE_SYNCHRONOUS = os.getenv("INBOUND_QUEUE_SYNCHRONOUS", "FULL")
+INBOUND_LEASE_SECONDS = int(os.getenv("INBOUND_LEASE_SECONDS", "60"))
+INBOUND_MAX_ATTEMPTS = int(os.getenv("INBOUND_MAX_ATTEMPTS", "5"))
+# Delay before the first retry of a failed message, doubled for each later one
+INBOUND_RETRY_SECONDS = int(os.getenv("INBOUND_RETRY_SECONDS", "30"))
+INBOUND_RETRY_MAX_SECONDS = int(os.getenv("INBOUND_RETRY_MAX_SECONDS", "900"))
+INBOUND_RETENTION_DAYS = int(os.getenv("INBOUND_RETENTION_DAYS", "7"))
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueuedMessage(NamedTuple):
+    seq: int
+    sid: str
+    channel: str
+    payload: Dict[str, str]
+    attempts: int
+
+
+class InboundQueue:
+    def __init__(self, path: str = INBOUND_QUEUE_PATH, synchronous: str = INBOUND_QUEUE_SYNCHRONOUS):
+        self.path = path
+        self.synchronous = synchronous
+        self.counters = {"received": 0, "duplicates": 0, "appends": 0}
+        self.arrived = asyncio.Event()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = Lock()
+        self._pending: List[tuple] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS inbound_messages ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " sid TEXT NOT NULL UNIQUE,"
+                " channel TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " received_at REAL NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " lease_until REAL,"
+                " error TEXT,"
+                " processed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_inbound_messages_state_seq ON inbound_messages (state, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_inbound_messages_received_at ON inbound_messages (received_at)")
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+    # Appending
+
+    async def put(self, sid: str, channel: str, payload: Dict[str, str]) -> bool:
+        """Durably queue a message. Returns False if its SID was already queued."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((sid, channel, orjson.dumps(payload).decode(), time.time(), future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                inserted = await asyncio.to_thread(self._insert, [row[:4] for row in batch])
+            except Exception as e:
+                for row in batch:
+                    if not row[4].done():
+                        row[4].set_exception(e)
+                continue
+            for row, new in zip(batch, inserted):
+                if not row[4].done():
+                    row[4].set_result(new)
+            self.arrived.set()
+
+    def _insert(self, rows: Sequence[tuple]) -> List[bool]:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = [
+                    conn.execute(
+                        "INSERT OR IGNORE INTO inbound_messages (sid, channel, payload, received_at)"
+                        " VALUES (?, ?, ?, ?)",
+                        row,
+                    ).rowcount == 1
+                    for row in rows
+                ]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self.counters["appends"] += 1
+        self.counters["received"] += sum(inserted)
+        self.counters["duplicates"] += len(inserted) - sum(inserted)
+        return inserted
+
+    # Consuming
+
+    def claim(self, limit: int, max_attempts: int = INBOUND_MAX_ATTEMPTS,
+              lease_seconds: int = INBOUND_LEASE_SECONDS) -> List[QueuedMessage]:
+        """
+        Lease up to limit pending messages whose retry delay has passed,
+        oldest first. Blocking.
+
+        A message whose lease ran out max_attempts times (its worker kept
+        dying on it) is marked failed instead of being handed out again.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT seq, sid, channel, payload, attempts FROM inbound_messages"
+                    " WHERE (state = 'pending' AND (lease_until IS NULL OR lease_until <= ?))"
+                    " OR (state = 'leased' AND lease_until < ?)"
+                    " ORDER BY seq LIMIT ?",
+                    (now, now, limit),
+                ).fetchall()
+                exhausted = [row for row in rows if row[4] >= max_attempts]
+                rows = [row for row in rows if row[4] < max_attempts]
+                conn.executemany(
+                    "UPDATE inbound_messages SET state = 'failed', lease_until = NULL,"
+                    " error = 'Lease expired on every attempt' WHERE seq = ?",
+                    [(row[0],) for row in exhausted],
+                )
+                conn.executemany(
+                    "UPDATE inbound_messages SET state = 'leased', lease_until = ?, attempts = attempts + 1"
+                    " WHERE seq = ?",
+                    [(now + lease_seconds, row[0]) for row in rows],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return [
+            QueuedMessage(seq, sid, channel, orjson.loads(payload), attempts + 1)
+            for seq, sid, channel, payload, attempts in rows
+        ]
+
+    def complete(self, done: Sequence[int], failed: Dict[int, str], rejected: Dict[int, str],
+                 max_attempts: int = INBOUND_MAX_ATTEMPTS, retry_seconds: int = INBOUND_RETRY_SECONDS,
+                 retry_max_seconds: int = INBOUND_RETRY_MAX_SECONDS) -> None:
+        """
+        Settle claimed messages. ``done`` are finished. ``failed`` (seq -> error)
+        go back to the queue until they have been attempted max_attempts times;
+        until the retry delay has passed, lease_until keeps them from being
+        claimed. ``rejected`` can never succeed and are marked failed at once.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE inbound_messages SET state = 'done', processed_at = ?, lease_until = NULL, error = NULL"
+                    " WHERE seq = ?",
+                    [(now, seq) for seq in done],
+                )
+                conn.executemany(
+                    "UPDATE inbound_messages SET error = ?,"
+                    " lease_until = CASE WHEN attempts >= ? THEN NULL"
+                    " ELSE ? + min(?, ? * (1 << min(attempts - 1, 20))) END,"
+                    " state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END"
+                    " WHERE seq = ?",
+                    [
+                        (error[:500], max_attempts, now, retry_max_seconds, retry_seconds, max_attempts, seq)
+                        for seq, error in failed.items()
+                    ],
+                )
+                conn.executemany(
+                    "UPDATE inbound_messages SET state = 'failed', lease_until = NULL, error = ? WHERE seq = ?",
+                    [(error[:500], seq) for seq, error in rejected.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def backlog(self) -> int:
+        """Messages waiting or being processed. Blocking."""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT count(*) FROM inbound_messages WHERE state IN ('pending', 'leased')"
+            ).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection().execute("SELECT state, count(*) FROM inbound_messages GROUP BY state")
+            return dict(rows.fetchall())
+
+    def requeue(self, sids: Optional[Sequence[str]] = None, states: Sequence[str] = (FAILED,),
+                since: Optional[float] = None) -> int:
+        """Put messages back in the queue with a fresh attempt budget; returns how many."""
+        query = "UPDATE inbound_messages SET state = 'pending', attempts = 0, lease_until = NULL, error = NULL WHERE 1 = 1"
+        params: list = []
+        if sids:
+            query += f" AND sid IN ({', '.join('?' * len(sids))})"
+            params.extend(sids)
+        if states:
+            query += f" AND state IN ({', '.join('?' * len(states))})"
+            params.extend(states)
+        if since is not None:
+            query += " AND received_at >= ?"
+            params.append(since)
+        with self._lock:
+            return self._connection().execute(query, params).rowcount
+
+    def purge(self, retention_days: int = INBOUND_RETENTION_DAYS) -> int:
+        """Delete processed messages older than the retention period."""
+        cutoff = time.time() - retention_days * 86400
+        with self._lock:
+            return self._connection().execute(
+                "DELETE FROM inbound_messages WHERE state = 'done' AND received_at < ?", (cutoff,)
+            ).rowcount
+
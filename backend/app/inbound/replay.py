@@ -0,0 +1,77 @@
+"""
+Inspect and replay the inbound WhatsApp/IVR queue.
+
+Run from the backend directory:
+
+    python -m app.inbound.replay                      # message counts by state
+    python -m app.inbound.replay --failed             # retry failed messages
+    python -m app.inbound.replay --since 2024-06-01   # reapply everything received since
+    python -m app.inbound.replay --sid SM0123 --sid SM4567
+    python -m app.inbound.replay --file export.jsonl --channel whatsapp
+
+--file imports webhook payloads, one JSON object of Twilio parameters per
+line (or {"channel": ..., "params": {...}}), e.g. recovered from Twilio's
+logs after an outage. Messages are deduplicated on their SID.
+
+Requeued messages are applied by a running API within INBOUND_POLL_SECONDS,
+or right away with --process. Messages that were already applied are
+recognized by their SID and skipped, so replaying is always safe, e.g. after
+restoring the database from a backup.
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+
+from .processor import inbound_processor, inbound_queue, message_sid
+from .queue import DONE, FAILED
+
+
+async def import_file(path: str, channel: str) -> tuple:
+    added = duplicates = 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            params = record.get("params", record)
+            record_channel = record.get("channel", channel) if "params" in record else channel
+            params = {name: str(value) for name, value in params.items()}
+            sid = message_sid(record_channel, params)
+            if not sid:
+                print(f"Skipping a record without a message SID: {line.strip()[:80]}")
+                continue
+            if await inbound_queue.put(sid, record_channel, params):
+                added += 1
+            else:
+                duplicates += 1
+    return added, duplicates
+
+
+async def main(args) -> None:
+    if args.file:
+        added, duplicates = await import_file(args.file, args.channel)
+        print(f"Imported {added} messages ({duplicates} already queued)")
+    if args.failed or args.since or args.sid:
+        since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+        states = [FAILED] if args.failed else [FAILED, DONE]
+        requeued = inbound_queue.requeue(sids=args.sid, states=states, since=since)
+        print(f"Requeued {requeued} messages")
+    if args.process:
+        processed = await inbound_processor.drain()
+        print(f"Processed {processed} messages: {inbound_processor.counters}")
+    for state, count in sorted(inbound_queue.counts().items()):
+        print(f"{state:<8}{count:>10}")
+    inbound_queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--failed", action="store_true", help="requeue messages that failed")
+    parser.add_argument("--since", help="requeue messages received since this ISO date or time")
+    parser.add_argument("--sid", action="append", help="requeue this message (repeatable)")
+    parser.add_argument("--file", help="import webhook payloads from a JSON lines file")
+    parser.add_argument("--channel", choices=["whatsapp", "ivr"], default="whatsapp",
+                        help="channel of --file records that do not name one")
+    parser.add_argument("--process", action="store_true", help="apply queued messages now")
+    asyncio.run(main(parser.parse_args()))
@@ -1,11 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from typing import List, Optional
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
 
+import asyncio
+
+from .auth.crypto import CryptoBusyError, crypto_service
+from .auth.otp_store import run_sweeper
+from .database import engine, init_db, close_db
+from .images.jobs import image_service
+from .inbound.processor import inbound_processor
+from .metrics import MetricsMiddleware
+from .replicas import read_router
+from .routers import analytics, auth, content, crops, data, eligibility, geo, images, issues, metrics, reports, search, sync, users, webhooks
+from .reports.jobs import report_service
+from .search.index import create_search_tables
+from .sms.dispatcher import sms_dispatcher
+
 # Load environment variables
 load_dotenv()
 
@@ -27,9 +42,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, in-flight requests and SQL timing, served on /api/metrics
+app.add_middleware(MetricsMiddleware)
+
+# The password hashing pool is full: ask the client to retry rather than queueing more work
+@app.exception_handler(CryptoBusyError)
+async def crypto_busy_handler(request: Request, exc: CryptoBusyError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Routers
+app.include_router(auth.router)
+app.include_router(geo.router)
+app.include_router(issues.router)
+app.include_router(users.router)
+app.include_router(sync.router)
+app.include_router(data.router)
+app.include_router(search.router)
+app.include_router(eligibility.router)
+app.include_router(crops.router)
+app.include_router(reports.router)
+app.include_router(analytics.router)
+app.include_router(content.router)
+app.include_router(metrics.router)
+app.include_router(webhooks.router)
+app.include_router(images.router)
+
+@app.on_event("startup")
+async def on_startup():
+    init_db()
+    with engine.begin() as connection:
+        create_search_tables(connection)
+    app.state.otp_sweeper = asyncio.create_task(run_sweeper(auth.otp_store))
+    sms_dispatcher.start()
+    report_service.start()
+    crypto_service.start()
+    inbound_processor.start()
+    read_router.start()
+    image_service.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.otp_sweeper.cancel()
+    await sms_dispatcher.stop()
+    await report_service.stop()
+    crypto_service.stop()
+    await inbound_processor.stop()
+    await read_router.stop()
+    await image_service.stop()
+    await auth.otp_store.close()
+    await close_db()
+
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
@@ -40,17 +109,6 @@ async def health_check():
 async def root():
     return {"message": "Welcome to AgriConnect API"}
 
-# Authentication endpoints
-@app.post("/api/auth/send-otp")
-async def send_otp(phone_number: str):
-    # TODO: Implement OTP sending logic
-    return {"message": "OTP sent successfully"}
-
-@app.post("/api/auth/verify-otp")
-async def verify_otp(phone_number: str, otp: str):
-    # TODO: Implement OTP verification logic
-    return {"message": "OTP verified successfully", "token": "sample-jwt-token"}
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,350 @@
+"""
+Request and SQL instrumentation.
+
+MetricsMiddleware times every HTTP request per route template and tracks how
+many are in flight. Engine event hooks time every SQL statement and charge it
+to the request that issued it: queries and database time per request, the
+statements with the most total time, slow statements (logged) and N+1
+patterns, meaning one statement run many times within a single request.
+
+Metrics live in this process and are rendered in the Prometheus text format
+by ``render()``; with several workers, each worker reports its own.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+import math
+import os
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+from .cache import TTLCache
+
+load_dotenv()
+
+# Statements slower than this are logged
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.25"))
+# A statement run this many times in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# Distinct statements tracked for the top statements table
+METRICS_MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", "500"))
+METRICS_TOP_STATEMENTS = int(os.getenv("METRICS_TOP_STATEMENTS", "20"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _bound(bound: float) -> str:
+    """Histogram ``le`` label: floats as Python repr (``1.0``, ``0.005``), infinity as ``+Inf``."""
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def _format(name: str, labels: Dict[str, str], value) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        name = f"{name}{{{label_text}}}"
+    if isinstance(value, float):
+        value = "+Inf" if value == math.inf else repr(value)
+    return f"{name} {value}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], object]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(_format(name, labels, value) for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (not cumulative), then sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _bound(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class StatementTable:
+    """Total time and executions per SQL statement, bounded to max_statements distinct statements."""
+
+    def __init__(self, max_statements: int = METRICS_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._totals: Dict[str, list] = {}
+        self._lock = Lock()
+
+    def record(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._totals.get(statement)
+            if entry is None:
+                if len(self._totals) >= self.max_statements:
+                    statement = "other"
+                entry = self._totals.setdefault(statement, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def top(self, n: int = METRICS_TOP_STATEMENTS) -> List[Tuple[str, int, float]]:
+        with self._lock:
+            items = [(statement, calls, seconds) for statement, (calls, seconds) in self._totals.items()]
+        return sorted(items, key=lambda item: item[2], reverse=True)[:n]
+
+    def render(self) -> List[str]:
+        name = "agriconnect_db_statement_seconds_total"
+        lines = [
+            f"# HELP {name} Total time of the most expensive SQL statements.",
+            f"# TYPE {name} counter",
+        ]
+        calls = []
+        for statement, count, seconds in self.top():
+            lines.append(_format(name, {"statement": shorten(statement)}, seconds))
+            calls.append(_format("agriconnect_db_statement_calls_total", {"statement": shorten(statement)}, count))
+        return lines + [
+            "# HELP agriconnect_db_statement_calls_total Executions of the most expensive SQL statements.",
+            "# TYPE agriconnect_db_statement_calls_total counter",
+            *calls,
+        ]
+
+
+REGISTRY: List[Metric] = []
+
+REQUESTS = Counter("agriconnect_http_requests_total", "HTTP requests by route and status.",
+                   ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("agriconnect_http_request_duration_seconds", "HTTP request latency.",
+                            ("method", "route"), LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("agriconnect_http_requests_in_flight", "HTTP requests being handled.", ("route",))
+REQUEST_QUERIES = Histogram("agriconnect_http_request_db_queries", "SQL statements per HTTP request.",
+                            ("route",), COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram("agriconnect_http_request_db_seconds", "SQL time per HTTP request.",
+                            ("route",), LATENCY_BUCKETS)
+QUERY_LATENCY = Histogram("agriconnect_db_query_duration_seconds", "SQL statement latency by calling route.",
+                          ("route",), QUERY_BUCKETS)
+SLOW_QUERIES = Counter("agriconnect_db_slow_queries_total",
+                       f"SQL statements slower than {SLOW_QUERY_SECONDS}s.", ("route",))
+N_PLUS_ONE = Counter("agriconnect_db_n_plus_one_total",
+                     f"Requests running one statement at least {N_PLUS_ONE_THRESHOLD} times.", ("route",))
+STATEMENTS = StatementTable()
+
+# Statements already logged as N+1, so each pattern is logged once per process
+_reported_n_plus_one = set()
+
+
+def shorten(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit - 3] + "..."
+
+
+class RequestStats:
+    """SQL activity of one request. Shared by reference with threads and greenlets the request spawns."""
+
+    __slots__ = ("route", "queries", "seconds", "statements")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements: Dict[str, int] = {}
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.seconds += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def report_n_plus_one(self) -> None:
+        repeated = [(s, n) for s, n in self.statements.items() if n >= N_PLUS_ONE_THRESHOLD]
+        if not repeated:
+            return
+        N_PLUS_ONE.inc(route=self.route)
+        for statement, count in repeated:
+            if (self.route, statement) not in _reported_n_plus_one:
+                _reported_n_plus_one.add((self.route, statement))
+                logger.warning("Possible N+1 in %s: statement ran %d times: %s",
+                               self.route, count, shorten(statement))
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight requests per route template."""
+
+    def __init__(self, app, route_cache_size: int = 10000):
+        self.app = app
+        # (method, path) -> route template; paths carry ids, so this is bounded
+        self._routes = TTLCache(maxsize=route_cache_size, ttl=3600)
+
+    def route_for(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        template = self._routes.get(key)
+        if template is None:
+            template = partial = None
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    template = route.path
+                    break
+                if match == Match.PARTIAL and partial is None:
+                    partial = route.path
+            template = template or partial or "unmatched"
+            self._routes.set(key, template)
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self.route_for(scope)
+        method = scope["method"]
+        stats = RequestStats(route)
+        token = _current_request.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc(route=route)
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - start
+            IN_FLIGHT.dec(route=route)
+            _current_request.reset(token)
+            REQUESTS.inc(method=method, route=route, status=str(status_code))
+            REQUEST_LATENCY.observe(elapsed, method=method, route=route)
+            REQUEST_QUERIES.observe(stats.queries, route=route)
+            REQUEST_DB_TIME.observe(stats.seconds, route=route)
+            stats.report_n_plus_one()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = perf_counter() - started.pop()
+    stats = _current_request.get()
+    route = stats.route if stats is not None else "background"
+    if stats is not None:
+        stats.record(statement, elapsed)
+    QUERY_LATENCY.observe(elapsed, route=route)
+    STATEMENTS.record(statement, elapsed)
+    if elapsed >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.inc(route=route)
+        logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, route, shorten(statement, 1000))
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_failed_query(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def render_stats(prefix: str, stats: dict) -> List[str]:
+    """
+    Gauges for a component's stats() dict. Nested dicts, such as one entry
+    per cache, become a ``group`` label.
+    """
+    series: Dict[str, List[str]] = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            for inner, inner_value in value.items():
+                if isinstance(inner_value, (int, float)):
+                    series.setdefault(f"{prefix}_{inner}", []).append(
+                        _format(f"{prefix}_{inner}", {"group": key}, inner_value)
+                    )
+        elif isinstance(value, (int, float)):
+            series.setdefault(f"{prefix}_{key}", []).append(_format(f"{prefix}_{key}", {}, value))
+    lines = []
+    for name, samples in series.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(samples)
+    return lines
+
+
+def render(components: Optional[Dict[str, dict]] = None) -> str:
+    """Every metric in the Prometheus text format, plus component stats as gauges."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(STATEMENTS.render())
+    for prefix, stats in (components or {}).items():
+        lines.extend(render_stats(prefix, stats))
+    return "\n".join(lines) + "\n"
@@ -1,14 +1,129 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, JSON, Float
-from sqlalchemy.orm import relationship
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Enum, Boolean, JSON, Float, Index, UniqueConstraint
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from enum import Enum as PyEnum
+from threading import Lock
+import secrets
+import time
 import uuid
 
-Base = declarative_base()
+from .database import Base
+from .geo import geohash
+from .geo.geojson import point_from_geojson
+
+# SQLite's CURRENT_TIMESTAMP (server_default=func.now()) has no fractional
+# seconds, so bound datetimes are stored the same way; otherwise timestamps
+# written by the server and by Python would not compare correctly in range
+# queries such as keyset pagination.
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite",
+)
+
+_uuid7_lock = Lock()
+_uuid7_last = [0, 0]  # milliseconds and counter of the last id
+
+def uuid7() -> uuid.UUID:
+    """
+    RFC 9562 version 7 UUID: 48 bits of Unix milliseconds, then random bits.
+
+    The 12-bit rand_a field is a counter within each millisecond, so ids made
+    by one process are strictly increasing and new rows append to the end of
+    primary key indexes instead of landing on random pages.
+    """
+    with _uuid7_lock:
+        millis = time.time_ns() // 1_000_000
+        last_millis, counter = _uuid7_last
+        if millis > last_millis:
+            # Start low in the counter range to leave room for ids in the same millisecond
+            counter = secrets.randbits(10)
+        else:
+            millis = last_millis
+            counter += 1
+            if counter > 0xFFF:
+                millis += 1
+                counter = secrets.randbits(10)
+        _uuid7_last[:] = [millis, counter]
+    value = millis << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | secrets.randbits(62)
+    return uuid.UUID(int=value)
 
 def generate_uuid():
-    return str(uuid.uuid4())
+    return str(uuid7())
+
+class CompactUUID(TypeDecorator):
+    """
+    UUID key that is a canonical string in Python, stored as the native
+    16-byte uuid type on PostgreSQL and as a 16-byte BLOB on SQLite instead
+    of 36 characters of text. Malformed ids, e.g. from a URL, match no row
+    instead of failing the query.
+    """
+    impl = String(36)
+    cache_ok = True
+
+    @property
+    def python_type(self):
+        return str
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(sqlite.BLOB())
+        return dialect.type_descriptor(String(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, uuid.UUID):
+            raw = value.bytes
+        else:
+            try:
+                raw = bytes.fromhex(str(value).replace("-", ""))
+            except ValueError:
+                raw = b""
+            if len(raw) != 16:
+                raw = bytes(16)  # the nil UUID, which is never generated
+        if dialect.name == "sqlite":
+            return raw
+        return _canonical(raw)
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, bytes):
+            return _canonical(value)
+        # PostgreSQL returns strings; SQLite rows not yet migrated still hold text
+        return None if value is None else str(value)
+
+def _canonical(raw: bytes) -> str:
+    """8-4-4-4-12 hex form of 16 bytes; cheaper than going through uuid.UUID."""
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+class LocatedMixin:
+    """
+    Point columns derived from the GeoJSON ``location`` column, kept in sync
+    on assignment, so map queries can use indexes instead of parsing JSON.
+    """
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String(12), nullable=True, index=True)
+
+    @staticmethod
+    def point_columns(location) -> dict:
+        """Values of the point columns for a GeoJSON location (also used by bulk inserts)."""
+        point = point_from_geojson(location)
+        if point is None:
+            return {"latitude": None, "longitude": None, "geohash": None}
+        return {"latitude": point[0], "longitude": point[1], "geohash": geohash.encode(*point)}
+
+    @validates("location")
+    def _index_location(self, key, location):
+        for column, value in self.point_columns(location).items():
+            setattr(self, column, value)
+        return location
 
 class UserRole(str, PyEnum):
     FARMER = "farmer"
@@ -18,26 +133,30 @@ class UserRole(str, PyEnum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_role_created_at_id", "role", "created_at", "id"),
+    )
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(CompactUUID, primary_key=True, default=generate_uuid)
     phone_number = Column(String(15), unique=True, nullable=False, index=True)
     name = Column(String(100), nullable=True)
     role = Column(Enum(UserRole), nullable=False)
     language = Column(String(10), default="en")
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
     
     # Relationships
     farmer_profile = relationship("FarmerProfile", back_populates="user", uselist=False)
-    issues = relationship("Issue", back_populates="reported_by_user")
-    assigned_issues = relationship("Issue", back_populates="assigned_to_user")
+    issues = relationship("Issue", foreign_keys="Issue.reported_by", back_populates="reported_by_user")
+    assigned_issues = relationship("Issue", foreign_keys="Issue.assigned_to", back_populates="assigned_to_user")
 
 class FarmerProfile(Base):
     __tablename__ = "farmer_profiles"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String, ForeignKey("users.id"), unique=True, nullable=False)
+    id = Column(CompactUUID, primary_key=True, default=generate_uuid)
+    user_id = Column(CompactUUID, ForeignKey("users.id"), unique=True, nullable=False)
     address = Column(String(255), nullable=True)
     village = Column(String(100), nullable=True)
     district = Column(String(100), nullable=True)
@@ -45,10 +164,42 @@ class FarmerProfile(Base):
     pincode = Column(String(10), nullable=True)
     land_area = Column(Float, nullable=True)  # in acres
     crops = Column(JSON, default=list)  # List of crops grown
-    
+
     # Relationships
     user = relationship("User", back_populates="farmer_profile")
 
+# District reports look profiles up by the case-folded district and state
+# (see app.reports.jobs), so the index is on those expressions
+Index(
+    "ix_farmer_profiles_district_state",
+    func.lower(func.trim(FarmerProfile.district)),
+    func.lower(func.trim(FarmerProfile.state)),
+)
+
+class Crop(Base):
+    """Crop vocabulary; names are stored stripped and case-folded."""
+    __tablename__ = "crops"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+
+class FarmerCrop(Base):
+    """
+    One row per crop in FarmerProfile.crops, with the profile's district and
+    state copied in (case-folded) so crop lookups by area are one index range.
+    Maintained by app.crops; the JSON column stays the source of truth.
+    """
+    __tablename__ = "farmer_crops"
+    __table_args__ = (
+        Index("ix_farmer_crops_crop_district_state", "crop_id", "district", "state", "profile_id"),
+        Index("ix_farmer_crops_crop_state", "crop_id", "state", "profile_id"),
+    )
+
+    profile_id = Column(CompactUUID, ForeignKey("farmer_profiles.id", ondelete="CASCADE"), primary_key=True)
+    crop_id = Column(Integer, ForeignKey("crops.id"), primary_key=True)
+    district = Column(String(100), nullable=True)
+    state = Column(String(100), nullable=True)
+
 class IssueStatus(str, PyEnum):
     REPORTED = "reported"
     IN_PROGRESS = "in_progress"
@@ -61,35 +212,105 @@ class IssuePriority(str, PyEnum):
     HIGH = "high"
     CRITICAL = "critical"
 
-class Issue(Base):
+class Issue(LocatedMixin, Base):
     __tablename__ = "issues"
+    __table_args__ = (
+        Index("ix_issues_lat_lon", "latitude", "longitude"),
+        # Keyset pagination: every listing ends its sort key with (created_at, id)
+        Index("ix_issues_created_at_id", "created_at", "id"),
+        Index("ix_issues_status_created_at", "status", "created_at", "id"),
+        Index("ix_issues_status_priority_created_at", "status", "priority", "created_at", "id"),
+        Index("ix_issues_reported_by_created_at", "reported_by", "created_at", "id"),
+        Index("ix_issues_assigned_to_created_at", "assigned_to", "created_at", "id"),
+        # Delta sync: rows changed after a client's watermark
+        Index("ix_issues_updated_at_id", "updated_at", "id"),
+        UniqueConstraint("reported_by", "client_id", name="uq_issues_reported_by_client_id"),
+    )
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(CompactUUID, primary_key=True, default=generate_uuid)
     title = Column(String(255), nullable=False)
     description = Column(String(1000), nullable=True)
     status = Column(Enum(IssueStatus), default=IssueStatus.REPORTED)
     priority = Column(Enum(IssuePriority), default=IssuePriority.MEDIUM)
     category = Column(String(100), nullable=True)
     location = Column(JSON, nullable=True)  # GeoJSON format
-    reported_by = Column(String, ForeignKey("users.id"), nullable=False)
-    assigned_to = Column(String, ForeignKey("users.id"), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    reported_by = Column(CompactUUID, ForeignKey("users.id"), nullable=False)
+    assigned_to = Column(CompactUUID, ForeignKey("users.id"), nullable=True)
+    client_id = Column(String(64), nullable=True)  # Idempotency key from offline clients
+    # Reporter's normalized profile district when the issue was created, filled
+    # in by app.analytics; the issue is counted under it in the rollups
+    district = Column(String(100), nullable=True)
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
+    # Summary of the updates, maintained by app.timeline so lists never join issue_updates
+    update_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_update_at = Column(Timestamp, nullable=True)
     
     # Relationships
     reported_by_user = relationship("User", foreign_keys=[reported_by], back_populates="issues")
     assigned_to_user = relationship("User", foreign_keys=[assigned_to], back_populates="assigned_issues")
-    updates = relationship("IssueUpdate", back_populates="issue")
+    updates = relationship(
+        "IssueUpdate", back_populates="issue", order_by="(IssueUpdate.created_at, IssueUpdate.id)"
+    )
+
+class IssueTileCount(Base):
+    """
+    Pre-aggregated issue counts per map cluster cell, maintained by
+    app.geo.clusters. A cell is a web-mercator tile CLUSTER_GRID_BITS zoom
+    levels below ``zoom``, so each map tile holds a small grid of cells.
+    """
+    __tablename__ = "issue_tile_counts"
+
+    zoom = Column(Integer, primary_key=True)
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    status = Column(Enum(IssueStatus), primary_key=True)
+    priority = Column(Enum(IssuePriority), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    lat_sum = Column(Float, nullable=False, default=0.0)
+    lon_sum = Column(Float, nullable=False, default=0.0)
+
+class IssueDailyCount(Base):
+    """
+    Issues per creation day, reporter district, category, status and
+    priority, maintained by app.analytics. Unknown districts and
+    categories are stored as ''.
+    """
+    __tablename__ = "issue_daily_counts"
+
+    day = Column(Date, primary_key=True)
+    district = Column(String(100), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    status = Column(Enum(IssueStatus), primary_key=True)
+    priority = Column(Enum(IssuePriority), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class IssueResolutionStat(Base):
+    """First resolutions per resolution day, with their total time from report to resolution."""
+    __tablename__ = "issue_resolution_stats"
+
+    day = Column(Date, primary_key=True)
+    district = Column(String(100), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    priority = Column(Enum(IssuePriority), primary_key=True)
+    resolved = Column(Integer, nullable=False, default=0)
+    total_seconds = Column(Float, nullable=False, default=0.0)
 
 class IssueUpdate(Base):
     __tablename__ = "issue_updates"
+    __table_args__ = (
+        Index("ix_issue_updates_issue_id_created_at", "issue_id", "created_at", "id"),
+        Index("ix_issue_updates_created_at_id", "created_at", "id"),
+        UniqueConstraint("created_by", "client_id", name="uq_issue_updates_created_by_client_id"),
+    )
 
-    id = Column(String, primary_key=True, default=generate_uuid)
-    issue_id = Column(String, ForeignKey("issues.id"), nullable=False)
+    id = Column(CompactUUID, primary_key=True, default=generate_uuid)
+    issue_id = Column(CompactUUID, ForeignKey("issues.id"), nullable=False)
     status = Column(Enum(IssueStatus), nullable=False)
     notes = Column(String(1000), nullable=True)
-    created_by = Column(String, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_by = Column(CompactUUID, ForeignKey("users.id"), nullable=False)
+    client_id = Column(String(64), nullable=True)  # Idempotency key from offline clients
+    created_at = Column(Timestamp, server_default=func.now())
     
     # Relationships
     issue = relationship("Issue", back_populates="updates")
@@ -97,8 +318,11 @@ class IssueUpdate(Base):
 
 class GovernmentScheme(Base):
     __tablename__ = "government_schemes"
+    __table_args__ = (
+        Index("ix_government_schemes_updated_at_id", "updated_at", "id"),
+    )
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(CompactUUID, primary_key=True, default=generate_uuid)
     title = Column(String(255), nullable=False)
     description = Column(String(2000), nullable=True)
     eligibility_criteria = Column(JSON, nullable=True)
@@ -107,35 +331,51 @@ class GovernmentScheme(Base):
     application_process = Column(String(1000), nullable=True)
     website_url = Column(String(255), nullable=True)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
 
 class TrainingModule(Base):
     __tablename__ = "training_modules"
+    __table_args__ = (
+        Index("ix_training_modules_updated_at_id", "updated_at", "id"),
+    )
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(CompactUUID, primary_key=True, default=generate_uuid)
     title = Column(String(255), nullable=False)
     description = Column(String(1000), nullable=True)
     content = Column(JSON, nullable=True)  # Can store rich text or structured content
     duration_minutes = Column(Integer, nullable=True)
     language = Column(String(10), default="en")
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
 
-class SuccessStory(Base):
+class SuccessStory(LocatedMixin, Base):
     __tablename__ = "success_stories"
+    __table_args__ = (
+        Index("ix_success_stories_lat_lon", "latitude", "longitude"),
+    )
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(CompactUUID, primary_key=True, default=generate_uuid)
     title = Column(String(255), nullable=False)
     description = Column(String(2000), nullable=True)
-    farmer_id = Column(String, ForeignKey("users.id"), nullable=False)
+    farmer_id = Column(CompactUUID, ForeignKey("users.id"), nullable=False)
     location = Column(JSON, nullable=True)  # GeoJSON format
     before_images = Column(JSON, nullable=True)  # List of image URLs
     after_images = Column(JSON, nullable=True)  # List of image URLs
     is_featured = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
     
     # Relationships
     farmer = relationship("User")
+
+class ReplicationHeartbeat(Base):
+    """
+    One row the primary stamps every few seconds. A replica's copy of it
+    shows how far behind the replica is (see app.replicas).
+    """
+    __tablename__ = "replication_heartbeat"
+
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(Float, nullable=False)  # Unix time of the last stamp
@@ -0,0 +1,123 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are selected with a WHERE condition on the sort key of the last row
+seen instead of OFFSET, so every page costs one index range scan no matter
+how deep it is. The sort key always ends with the primary key, which makes
+it unique and the order total.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional, Sequence, Tuple
+import base64
+import json
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or belongs to another ordering."""
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _load(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if issubclass(python_type, datetime):
+        return datetime.fromisoformat(value)
+    if issubclass(python_type, Enum):
+        return python_type(value)
+    return value
+
+
+def _signature(order: Sequence[Tuple[object, bool]]) -> str:
+    return ",".join(f"{column.key}:{'d' if descending else 'a'}" for column, descending in order)
+
+
+def encode_cursor(order: Sequence[Tuple[object, bool]], row) -> str:
+    """Opaque cursor pointing just after row in the given ordering."""
+    payload = {
+        "s": _signature(order),
+        "k": [_dump(getattr(row, column.key)) for column, _ in order],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(order: Sequence[Tuple[object, bool]], cursor: str) -> list:
+    """Sort-key values stored in a cursor, checked against the ordering."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["s"] != _signature(order) or len(payload["k"]) != len(order):
+            raise InvalidCursor("Cursor does not match this listing's sort order")
+        return [_load(column, value) for (column, _), value in zip(order, payload["k"])]
+    except InvalidCursor:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+
+def after(order: Sequence[Tuple[object, bool]], values: Sequence) -> object:
+    """
+    Condition selecting rows strictly after ``values`` in the ordering.
+
+    When every column sorts the same way this is a row-value comparison
+    (a, b) > (x, y), which both SQLite and PostgreSQL turn into a single
+    index range. Mixed directions are expanded into
+    (a > x) OR (a = x AND b < y) ...
+    """
+    directions = {descending for _, descending in order}
+    if len(directions) == 1:
+        columns = tuple_(*[column for column, _ in order])
+        bound = tuple_(*values, types=[column.type for column, _ in order])
+        return columns < bound if directions.pop() else columns > bound
+    branches = []
+    for i, (column, descending) in enumerate(order):
+        equal = [c == v for (c, _), v in zip(order[:i], values[:i])]
+        step = column < values[i] if descending else column > values[i]
+        branches.append(and_(*equal, step))
+    return or_(*branches)
+
+
+async def paginate(db: AsyncSession, query: Select, order: Sequence[Tuple[object, bool]],
+                   cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    Run one page of query sorted by order, a list of (column, descending) pairs
+    that must end with the primary key.
+
+    Returns ``{"items": [...], "next_cursor": str | None, "limit": int}``.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        query = query.where(after(order, decode_cursor(order, cursor)))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column, descending in order])
+    result = await db.execute(query.limit(limit + 1))
+    items: List = list(result.scalars())
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(order, items[-1])
+    return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+
+async def paginate_or_400(db: AsyncSession, query: Select, order: Sequence[Tuple[object, bool]],
+                          cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """paginate() for request handlers: a bad cursor becomes a 400 response."""
+    try:
+        return await paginate(db, query, order, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -0,0 +1,292 @@
+"""
+Read/write routing across the primary database and its read replicas.
+
+Handlers that only read take their session from get_read_db. Its SELECTs
+go to a replica (the same one for the whole request), unless:
+
+- the session has already written, or is flushing;
+- the statement is not a plain SELECT;
+- the current user committed a write within DB_READ_YOUR_WRITES_SECONDS,
+  so they always see their own changes;
+- no replica is healthy and within DB_REPLICA_MAX_LAG_SECONDS of the primary.
+
+In any of these cases it uses the primary. Everything else keeps using
+get_async_db, which always talks to the primary. That includes handlers
+that fill the HTTP response cache: the cache is cleared when a change is
+committed, and a lagging replica would fill it again with the old rows.
+
+Replication lag is measured the same way on every backend. The API stamps
+the one-row replication_heartbeat table on the primary every
+DB_REPLICA_CHECK_SECONDS and reads it back from each replica. A replica
+whose check fails, or whose connection errors during a request, takes no
+reads until a check succeeds again. Recent writers are remembered per
+worker process, so a read served by another worker is only guaranteed to be
+within the lag limit.
+
+Replicas can be tried locally with SQLite file copies:
+
+    DATABASE_REPLICA_URLS=sqlite:///./replica1.db,sqlite:///./replica2.db
+    python -m app.replicas copy --every 5    # refresh the copies every 5 seconds
+    python -m app.replicas status
+"""
+from contextvars import ContextVar
+from itertools import count
+from typing import List, Optional
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+from sqlalchemy import event, exc, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.selectable import CompoundSelect
+
+from . import models
+from .cache import TTLCache
+from .database import (
+    DATABASE_REPLICA_URLS,
+    DATABASE_URL,
+    AsyncSessionLocal,
+    async_engine,
+    replica_engines,
+)
+
+load_dotenv()
+
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "2"))
+DB_READ_YOUR_WRITES_SECONDS = float(
+    os.getenv("DB_READ_YOUR_WRITES_SECONDS", str(DB_REPLICA_MAX_LAG_SECONDS + DB_REPLICA_CHECK_SECONDS))
+)
+
+# Subject (user id) of the authenticated user of the current request, set by get_current_user
+current_subject: ContextVar[Optional[str]] = ContextVar("current_subject", default=None)
+
+# Users who committed a write recently, whose reads stay on the primary
+recent_writers = TTLCache(maxsize=100000, ttl=DB_READ_YOUR_WRITES_SECONDS)
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False  # until the first check
+        self.lag: Optional[float] = None
+        self.reads = 0
+        self.marked_down = 0
+        event.listen(engine.sync_engine, "handle_error", self._on_error)
+
+    def mark_down(self, reason) -> None:
+        if self.healthy:
+            print(f"Replica {self.name} marked down: {reason}")
+            self.marked_down += 1
+        self.healthy = False
+
+    def _on_error(self, context) -> None:
+        # Connection-level failures take the replica out at once; the next check brings it back
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+            self.mark_down(context.original_exception)
+
+    @property
+    def usable(self) -> bool:
+        return self.healthy and self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG_SECONDS
+
+
+class ReadRouter:
+    def __init__(self, engines: List[AsyncEngine]):
+        self.replicas = [Replica(f"replica{i + 1}", engine) for i, engine in enumerate(engines)]
+        self.counters = {"primary_reads": 0, "replica_reads": 0, "read_your_writes": 0, "no_replica": 0}
+        self._turn = count()
+        self._task: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[Replica]:
+        """A usable replica, round robin; None when every replica is down or lagging."""
+        usable = [replica for replica in self.replicas if replica.usable]
+        if not usable:
+            return None
+        return usable[next(self._turn) % len(usable)]
+
+    def start(self) -> None:
+        if self.replicas:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Replica check failed: {e}")
+            await asyncio.sleep(DB_REPLICA_CHECK_SECONDS)
+
+    async def beat(self) -> None:
+        """Stamp the heartbeat row on the primary."""
+        heartbeat = models.ReplicationHeartbeat.__table__
+        async with async_engine.begin() as connection:
+            result = await connection.execute(update(heartbeat).where(heartbeat.c.id == 1).values(beat_at=time.time()))
+            if not result.rowcount:
+                await connection.execute(heartbeat.insert().values(id=1, beat_at=time.time()))
+
+    async def check(self) -> None:
+        """Stamp the primary, then measure each replica's lag from its copy of the stamp."""
+        await self.beat()
+        heartbeat = models.ReplicationHeartbeat.__table__
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as connection:
+                    beat_at = (await connection.execute(
+                        select(heartbeat.c.beat_at).where(heartbeat.c.id == 1)
+                    )).scalar()
+            except Exception as e:
+                replica.mark_down(e)
+                continue
+            # A replica that has never seen a stamp is treated as infinitely behind
+            replica.lag = max(0.0, time.time() - beat_at) if beat_at is not None else float("inf")
+            replica.healthy = True
+
+    def stats(self) -> dict:
+        stats = dict(self.counters)
+        for replica in self.replicas:
+            stats[replica.name] = {
+                "healthy": int(replica.healthy),
+                "usable": int(replica.usable),
+                "reads": replica.reads,
+                "marked_down": replica.marked_down,
+            }
+            if replica.lag is not None and replica.lag != float("inf"):
+                stats[replica.name]["lag_seconds"] = round(replica.lag, 3)
+        return stats
+
+
+read_router = ReadRouter(replica_engines)
+
+
+def _is_read(clause) -> bool:
+    if isinstance(clause, (Select, CompoundSelect)):
+        return True
+    return isinstance(clause, TextClause) and clause.text.lstrip()[:6].upper() == "SELECT"
+
+
+class RoutingSession(Session):
+    """Session whose plain reads go to a replica; see the module docstring."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if "route" not in self.info:
+            subject = current_subject.get()
+            if subject is not None and recent_writers.get(subject):
+                read_router.counters["read_your_writes"] += 1
+                self.info["route"] = None
+            else:
+                self.info["route"] = read_router.pick()
+                if self.info["route"] is None:
+                    read_router.counters["no_replica"] += 1
+        read = _is_read(clause) and not self._flushing
+        if not read:
+            # Once the session writes, its reads follow the writes to the primary
+            self.info["wrote"] = True
+        replica = self.info["route"]
+        if replica is None or self.info.get("wrote"):
+            if read:
+                read_router.counters["primary_reads"] += 1
+            return async_engine.sync_engine
+        replica.reads += 1
+        read_router.counters["replica_reads"] += 1
+        return replica.engine.sync_engine
+
+
+ReadSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, sync_session_class=RoutingSession,
+    autoflush=False, expire_on_commit=False,
+)
+
+
+async def get_read_db():
+    """Dependency for a session of a read-only handler; served by replicas when configured."""
+    factory = ReadSessionLocal if read_router.replicas else AsyncSessionLocal
+    async with factory() as db:
+        yield db
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flush(session, flush_context):
+    session.info["committing_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["committing_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    if session.info.pop("committing_writes", False):
+        subject = current_subject.get()
+        if subject is not None:
+            recent_writers.set(subject, True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session):
+    session.info.pop("committing_writes", None)
+
+
+# Local replicas as SQLite file copies
+
+def sqlite_path(url: str) -> str:
+    if not url.startswith("sqlite"):
+        raise SystemExit(f"Not a SQLite URL: {url}")
+    return url.split(":///", 1)[1]
+
+
+def copy_sqlite(source: str, targets: List[str]) -> None:
+    """Snapshot the primary into each target file with SQLite's online backup."""
+    with sqlite3.connect(source) as primary:
+        for target in targets:
+            with sqlite3.connect(target) as replica:
+                primary.backup(replica)
+
+
+async def status() -> None:
+    await read_router.check()
+    for replica in read_router.replicas:
+        lag = "-" if replica.lag is None else f"{replica.lag:.1f}s"
+        print(f"{replica.name:<10}{'healthy' if replica.healthy else 'down':<9}lag {lag:<8}"
+              f"{'in use' if replica.usable else 'not used'}")
+    for engine in [async_engine, *replica_engines]:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local SQLite replicas: copy the primary, or show replica status.")
+    parser.add_argument("command", choices=["copy", "status"])
+    parser.add_argument("--every", type=float, help="with copy: repeat every this many seconds")
+    args = parser.parse_args()
+    if not DATABASE_REPLICA_URLS:
+        raise SystemExit("DATABASE_REPLICA_URLS is not set")
+    if args.command == "status":
+        asyncio.run(status())
+        return
+    source = sqlite_path(DATABASE_URL)
+    targets = [sqlite_path(url) for url in DATABASE_REPLICA_URLS]
+    while True:
+        copy_sqlite(source, targets)
+        print(f"Copied {source} to {', '.join(targets)}")
+        if not args.every:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
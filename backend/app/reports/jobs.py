@@ -0,0 +1,267 @@
+"""
+Background PDF report jobs.
+
+Submitting a report computes a cheap watermark of the data it covers and
+hashes it together with the report parameters, which include the date the
+report is for, since its weekly window moves with the calendar. That hash
+names the PDF in the report cache directory: an existing file is served at
+once, a report already being rendered is shared, and anything else is
+gathered on the event loop and rendered in a process pool, so rendering
+never occupies an API worker.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Dict, Optional, Set
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import uuid
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..cache import TTLCache
+from ..database import AsyncSessionLocal
+from ..eligibility import normalize
+from .render import render_district_report
+
+load_dotenv()
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "./report_cache")
+REPORT_CACHE_MAX_FILES = int(os.getenv("REPORT_CACHE_MAX_FILES", "1000"))
+REPORT_JOB_TTL_SECONDS = int(os.getenv("REPORT_JOB_TTL_SECONDS", "3600"))
+REPORT_MAX_JOBS = int(os.getenv("REPORT_MAX_JOBS", "10000"))
+
+# Bump when the layout or content of a report changes, so cached PDFs are not reused
+REPORT_VERSION = 1
+REPORT_WEEKS = 12
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ReportJob:
+    def __init__(self, kind: str, params: dict, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = JobStatus.QUEUED
+        self.cached = False
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+
+def report_key(kind: str, params: dict, watermark) -> str:
+    payload = {"kind": kind, "params": params, "watermark": watermark, "version": REPORT_VERSION}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# District reports cover farmers whose profile is in the district and the
+# issues they reported. The filters match ix_farmer_profiles_district_state.
+
+def _district_filters(district: str, state: Optional[str]) -> list:
+    profile = models.FarmerProfile
+    filters = [func.lower(func.trim(profile.district)) == district]
+    if state:
+        filters.append(func.lower(func.trim(profile.state)) == state)
+    return filters
+
+
+def _district_issues(district: str, state: Optional[str], *columns):
+    return (
+        select(*columns)
+        .join(models.FarmerProfile, models.FarmerProfile.user_id == models.Issue.reported_by)
+        .where(*_district_filters(district, state))
+    )
+
+
+async def _crop_counts(db: AsyncSession, district: str, state: Optional[str]) -> list:
+    query = (
+        select(models.Crop.name, func.count())
+        .join(models.FarmerCrop, models.FarmerCrop.crop_id == models.Crop.id)
+        .where(models.FarmerCrop.district == district)
+        .group_by(models.Crop.name)
+        .order_by(func.count().desc(), models.Crop.name)
+    )
+    if state:
+        query = query.where(models.FarmerCrop.state == state)
+    return [list(row) for row in await db.execute(query)]
+
+
+async def district_watermark(db: AsyncSession, district: str, state: Optional[str] = None) -> list:
+    """Aggregates that change whenever the district report's data does."""
+    issues = (await db.execute(_district_issues(
+        district, state, func.count(models.Issue.id), func.max(models.Issue.updated_at),
+    ))).one()
+    farmers = (await db.execute(
+        select(func.count(models.FarmerProfile.id), func.sum(models.FarmerProfile.land_area))
+        .where(*_district_filters(district, state))
+    )).one()
+    return [list(issues), list(farmers), await _crop_counts(db, district, state)]
+
+
+async def district_report_data(db: AsyncSession, district: str, state: Optional[str] = None,
+                               as_of: Optional[str] = None) -> dict:
+    """Plain data for render_district_report, for the weeks up to the ISO date as_of (default today)."""
+    issue = models.Issue
+    farmers, land_area = (await db.execute(
+        select(func.count(models.FarmerProfile.id), func.sum(models.FarmerProfile.land_area))
+        .where(*_district_filters(district, state))
+    )).one()
+
+    async def counts(column) -> list:
+        result = await db.execute(
+            _district_issues(district, state, column, func.count(issue.id)).group_by(column).order_by(func.count(issue.id).desc())
+        )
+        return [[getattr(value, "value", value) or "uncategorized", count] for value, count in result]
+
+    today = date.fromisoformat(as_of) if as_of else datetime.utcnow().date()
+    first_week = today - timedelta(days=today.weekday() + 7 * (REPORT_WEEKS - 1))
+    day = func.date(issue.created_at)
+    weeks = {first_week + timedelta(weeks=i): 0 for i in range(REPORT_WEEKS)}
+    result = await db.execute(
+        _district_issues(district, state, day, func.count(issue.id))
+        .where(issue.created_at >= datetime.combine(first_week, datetime.min.time()))
+        .group_by(day)
+    )
+    for value, count in result:
+        value = value if not isinstance(value, str) else datetime.strptime(value, "%Y-%m-%d").date()
+        week = value - timedelta(days=value.weekday())
+        if week in weeks:
+            weeks[week] += count
+
+    recent = await db.execute(
+        _district_issues(district, state, issue.created_at, issue.title, issue.status, issue.priority)
+        .order_by(issue.created_at.desc(), issue.id.desc())
+        .limit(20)
+    )
+    place = district.title() + (f", {state.title()}" if state else "")
+    return {
+        "title": f"District report: {place}",
+        "generated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
+        "farmers": farmers,
+        "land_area": land_area or 0.0,
+        "crops": (await _crop_counts(db, district, state))[:15],
+        "issues_by_week": [(week.strftime("%d %b"), count) for week, count in weeks.items()],
+        "issues_by_status": await counts(issue.status),
+        "issues_by_priority": await counts(issue.priority),
+        "issues_by_category": await counts(issue.category),
+        "recent_issues": [
+            (created.strftime("%Y-%m-%d") if created else "", title, status.value, priority.value)
+            for created, title, status, priority in recent
+        ],
+    }
+
+
+REPORTS = {
+    "district": (district_report_data, render_district_report),
+}
+
+
+class ReportService:
+    def __init__(self, cache_dir: str = REPORT_CACHE_DIR, workers: int = REPORT_WORKERS,
+                 max_cached_files: int = REPORT_CACHE_MAX_FILES):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_cached_files = max_cached_files
+        self.jobs = TTLCache(maxsize=REPORT_MAX_JOBS, ttl=REPORT_JOB_TTL_SECONDS)
+        self.counters = {"submitted": 0, "cache_hits": 0, "coalesced": 0, "rendered": 0, "failed": 0}
+        self._inflight: Dict[str, ReportJob] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Workers are spawned, not forked, so they never inherit the event loop or open connections
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def job(self, job_id: str) -> Optional[ReportJob]:
+        return self.jobs.get(job_id)
+
+    def stats(self) -> dict:
+        return dict(self.counters, running=len(self._inflight))
+
+    async def submit_district(self, db: AsyncSession, district: str, state: Optional[str] = None) -> ReportJob:
+        params = {"district": normalize(district), "state": normalize(state)}
+        watermark = await district_watermark(db, **params)
+        params["as_of"] = datetime.utcnow().date().isoformat()
+        return self._submit("district", params, report_key("district", params, watermark))
+
+    def _submit(self, kind: str, params: dict, key: str) -> ReportJob:
+        self.counters["submitted"] += 1
+        if key in self._inflight:
+            self.counters["coalesced"] += 1
+            return self._inflight[key]
+        job = ReportJob(kind, params, key)
+        path = self.path(key)
+        if os.path.exists(path):
+            os.utime(path)  # pruning removes the least recently used files
+            job.status = JobStatus.DONE
+            job.cached = True
+            job.finished_at = job.created_at
+            self.counters["cache_hits"] += 1
+        else:
+            self._inflight[key] = job
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self.jobs.set(job.id, job)
+        return job
+
+    async def _run(self, job: ReportJob) -> None:
+        gather, render = REPORTS[job.kind]
+        try:
+            async with AsyncSessionLocal() as db:
+                data = await gather(db, **job.params)
+            job.status = JobStatus.RUNNING
+            await asyncio.get_running_loop().run_in_executor(self._pool, render, data, self.path(job.key))
+            job.status = JobStatus.DONE
+            self.counters["rendered"] += 1
+            await asyncio.to_thread(self._prune)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e) or type(e).__name__
+            self.counters["failed"] += 1
+            print(f"Report {job.id} failed: {job.error}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            self._inflight.pop(job.key, None)
+
+    def _prune(self) -> None:
+        """Delete the least recently used PDFs beyond max_cached_files."""
+        files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".pdf")]
+        if len(files) <= self.max_cached_files:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_cached_files]:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+report_service = ReportService()
@@ -0,0 +1,95 @@
+"""
+PDF rendering with reportlab.
+
+Everything here runs in a worker process: it takes plain data gathered by
+app.reports.jobs and writes the PDF, touching neither the database nor
+the event loop.
+"""
+from typing import List, Tuple
+import os
+import tempfile
+from xml.sax.saxutils import escape
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+STYLES = getSampleStyleSheet()
+CHART_WIDTH = 170 * mm
+CHART_HEIGHT = 60 * mm
+
+
+def _table(rows: List[list], header: List[str]) -> Table:
+    table = Table([header] + rows, hAlign="LEFT", repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#2e7d32")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f1f8e9")]),
+    ]))
+    return table
+
+
+def _bar_chart(series: List[Tuple[str, int]]) -> Drawing:
+    drawing = Drawing(CHART_WIDTH, CHART_HEIGHT)
+    chart = VerticalBarChart()
+    chart.x, chart.y = 30, 30
+    chart.width, chart.height = CHART_WIDTH - 40, CHART_HEIGHT - 40
+    chart.data = [[value for _, value in series] or [0]]
+    chart.categoryAxis.categoryNames = [label for label, _ in series] or [""]
+    chart.categoryAxis.labels.angle = 30
+    chart.categoryAxis.labels.fontSize = 6
+    chart.categoryAxis.labels.boxAnchor = "ne"
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 7
+    chart.bars[0].fillColor = colors.HexColor("#66bb6a")
+    drawing.add(chart)
+    return drawing
+
+
+def _section(title: str) -> list:
+    return [Spacer(1, 6 * mm), Paragraph(title, STYLES["Heading2"])]
+
+
+def render_district_report(data: dict, path: str) -> int:
+    """Write the district report PDF to path atomically. Returns its size in bytes."""
+    story = [
+        Paragraph(escape(data["title"]), STYLES["Title"]),
+        Paragraph(f"Generated {data['generated_at']}", STYLES["Normal"]),
+        *_section("Farmers"),
+        _table(
+            [[data["farmers"], f"{data['land_area']:.1f}"]],
+            ["Registered farmers", "Total land area (acres)"],
+        ),
+        *_section("Main crops"),
+        _table([[name, count] for name, count in data["crops"]], ["Crop", "Farmers"]),
+        *_section("Issues reported per week"),
+        _bar_chart(data["issues_by_week"]),
+        *_section("Issues by status and priority"),
+        _table([[name, count] for name, count in data["issues_by_status"]], ["Status", "Issues"]),
+        Spacer(1, 3 * mm),
+        _table([[name, count] for name, count in data["issues_by_priority"]], ["Priority", "Issues"]),
+        *_section("Issues by category"),
+        _table([[name, count] for name, count in data["issues_by_category"]], ["Category", "Issues"]),
+        *_section("Recent issues"),
+        _table(
+            [[created, Paragraph(escape(title), STYLES["BodyText"]), status, priority]
+             for created, title, status, priority in data["recent_issues"]],
+            ["Reported", "Title", "Status", "Priority"],
+        ),
+    ]
+
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            SimpleDocTemplate(out, pagesize=A4, title=data["title"]).build(story)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return os.path.getsize(path)
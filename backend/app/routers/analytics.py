@@ -0,0 +1,29 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from .. import models, schemas
+from ..analytics import issue_stats
+from ..auth.utils import require_roles
+from ..replicas import get_read_db
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+@router.get("/issues", response_model=schemas.IssueStats)
+async def get_issue_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    district: Optional[str] = None,
+    category: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(require_roles(models.UserRole.NGO_ADMIN)),
+):
+    """
+    Issue counts by status, priority, district, category and creation day,
+    and mean time to first resolution for issues resolved in the range.
+    Served from rollup tables. NGO admins only.
+    """
+    if start and end and start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must not be after end")
+    return await issue_stats(db, start, end, district, category)
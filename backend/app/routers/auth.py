@@ -1,77 +1,129 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 import random
 import string
 
 from .. import models, schemas
-from ..database import get_db
-from .utils import (
+from ..database import get_async_db
+from ..auth.admission import AdmissionRejected, client_ip, otp_admission
+from ..auth.otp_store import OTPStatus, create_otp_store
+from ..sms.dispatcher import QueueFullError, sms_dispatcher
+from ..auth.utils import (
     get_password_hash,
     create_access_token,
-    verify_otp,
+    get_current_active_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
-# In-memory storage for OTPs (in production, use Redis or a database)
-otp_store = {}
+# OTP storage; backend chosen by OTP_STORE_BACKEND (memory, sqlite or redis)
+otp_store = create_otp_store()
 
 def generate_otp(length=6):
     """Generate a random OTP of specified length."""
     return ''.join(random.choices(string.digits, k=length))
 
-@router.post("/send-otp", response_model=schemas.OTPResponse)
-async def send_otp(request: schemas.OTPRequest, db: Session = Depends(get_db)):
+def otp_admission_for(endpoint: str):
+    """Dependency applying admission control (see auth.admission) to an OTP endpoint."""
+    async def admit(http_request: Request):
+        try:
+            # Already parsed and cached by the time dependencies run
+            body = await http_request.json()
+        except ValueError:
+            body = None
+        phone_number = body.get("phone_number") if isinstance(body, dict) else None
+        if not isinstance(phone_number, str):
+            phone_number = None  # left for request validation to reject
+        try:
+            otp_admission.enter(endpoint, client_ip(http_request), phone_number)
+        except AdmissionRejected as exc:
+            raise HTTPException(status_code=exc.status_code, detail=exc.detail, headers=exc.headers)
+        try:
+            yield
+        finally:
+            otp_admission.leave()
+    return admit
+
+@router.post("/send-otp", response_model=schemas.OTPResponse, dependencies=[Depends(otp_admission_for("send"))])
+async def send_otp(request: schemas.OTPRequest):
     """
     Send OTP to the provided phone number.
-    In a production environment, this would integrate with an SMS gateway.
+
+    The SMS is queued for the dispatcher and the user row is only created once
+    the OTP is verified, so this endpoint never waits on the gateway or the database.
     """
-    # Check if user exists, if not create a new user
-    user = db.query(models.User).filter(models.User.phone_number == request.phone_number).first()
-    
-    if not user:
-        # Create a new user with default role as FARMER
-        user = models.User(
-            phone_number=request.phone_number,
-            role=models.UserRole.FARMER,
-            is_active=True
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    
-    # Generate and store OTP (in production, send via SMS)
     otp = generate_otp()
-    otp_store[request.phone_number] = {
-        "otp": otp,
-        "user_id": user.id
-    }
-    
-    print(f"OTP for {request.phone_number}: {otp}")  # For development only
-    
-    return {"message": "OTP sent successfully", "otp": otp}  # In production, don't return OTP
+    await otp_store.save(request.phone_number, otp)
+    try:
+        message_id = sms_dispatcher.enqueue(request.phone_number, f"Your AgriConnect OTP is {otp}")
+    except QueueFullError:
+        await otp_store.discard(request.phone_number)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OTP service is busy, please retry shortly",
+        )
+
+    return {"message": "OTP sent successfully", "otp": otp, "message_id": message_id}  # In production, don't return OTP
+
+@router.get("/send-otp/{message_id}", response_model=schemas.OTPDeliveryStatus)
+async def otp_delivery_status(message_id: str):
+    """Delivery status of a queued OTP message, as seen by this worker."""
+    delivery_status = sms_dispatcher.status(message_id)
+    if delivery_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Message not found",
+        )
+    return {"message_id": message_id, "status": delivery_status.value}
 
-@router.post("/verify-otp", response_model=schemas.Token)
-async def verify_otp_endpoint(request: schemas.OTPVerification, db: Session = Depends(get_db)):
+@router.post("/verify-otp", response_model=schemas.Token, dependencies=[Depends(otp_admission_for("verify"))])
+async def verify_otp_endpoint(request: schemas.OTPVerification, db: AsyncSession = Depends(get_async_db)):
     """Verify OTP and return access token if valid."""
-    stored_otp_data = otp_store.get(request.phone_number)
-    
-    if not stored_otp_data or not verify_otp(stored_otp_data["otp"], request.otp):
+    check = await otp_store.verify(request.phone_number, request.otp)
+
+    if check == OTPStatus.TOO_MANY_ATTEMPTS:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, request a new OTP",
+        )
+    if check == OTPStatus.EXPIRED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="OTP expired",
+        )
+    if check != OTPStatus.VALID:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid OTP",
         )
     
-    # Get user from database
-    user = db.query(models.User).filter(models.User.id == stored_otp_data["user_id"]).first()
+    # Get the user, creating one with the default FARMER role on first login
+    result = await db.execute(
+        select(models.User).where(models.User.phone_number == request.phone_number)
+    )
+    user = result.scalar_one_or_none()
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
+        user = models.User(
+            phone_number=request.phone_number,
+            role=models.UserRole.FARMER,
+            is_active=True
         )
+        db.add(user)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Created concurrently by another request for the same number
+            await db.rollback()
+            result = await db.execute(
+                select(models.User).where(models.User.phone_number == request.phone_number)
+            )
+            user = result.scalar_one()
+        await db.refresh(user)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -79,9 +131,6 @@ async def verify_otp_endpoint(request: schemas.OTPVerification, db: Session = De
         data={"sub": str(user.id)}, expires_delta=access_token_expires
     )
     
-    # Clean up OTP
-    otp_store.pop(request.phone_number, None)
-    
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -92,12 +141,15 @@ async def verify_otp_endpoint(request: schemas.OTPVerification, db: Session = De
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """OAuth2 compatible token login, get an access token for future requests"""
     # This is a placeholder. In a real app, you would validate username/password
     # For now, we'll just return a token for any user that exists
-    user = db.query(models.User).filter(models.User.phone_number == form_data.username).first()
+    result = await db.execute(
+        select(models.User).where(models.User.phone_number == form_data.username)
+    )
+    user = result.scalar_one_or_none()
     
     if not user:
         raise HTTPException(
@@ -107,7 +159,8 @@ async def login_for_access_token(
         )
     
     # In a real app, you would verify the password here
-    # if not verify_password(form_data.password, user.hashed_password):
+    # Hashing runs on the crypto pool; when it is full, CryptoBusyError becomes a 503
+    # if not await crypto_service.verify_password(form_data.password, user.hashed_password):
     #     raise HTTPException(
     #         status_code=status.HTTP_401_UNAUTHORIZED,
     #         detail="Incorrect username or password",
@@ -0,0 +1,84 @@
+"""
+Public, read-mostly content: government schemes, training modules and
+featured success stories. Responses are served through the HTTP response
+cache.
+
+These handlers read from the primary, not a replica (see app.replicas): a
+commit clears the cache, and a lagging replica could refill it with the old
+rows for HTTP_CACHE_TTL_SECONDS.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from .. import models, schemas
+from ..database import get_async_db
+from ..http_cache import response_cache
+
+router = APIRouter(prefix="/api", tags=["Content"])
+
+FEATURED_STORIES_LIMIT = 50
+
+async def cached_list(request: Request, tag: str, db: AsyncSession, query, schema) -> Response:
+    adapter = TypeAdapter(List[schema])
+
+    async def build():
+        rows = list((await db.execute(query)).scalars())
+        # Validated into the schema first, so computed fields are evaluated on the model, not the row
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+    return await response_cache.respond(request, tag, build)
+
+async def cached_item(request: Request, tag: str, db: AsyncSession, model, item_id: str, schema) -> Response:
+    async def build():
+        row = await db.get(model, item_id)
+        if row is None or getattr(row, "is_active", True) is False:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        return schema.model_validate(row).model_dump_json().encode()
+
+    return await response_cache.respond(request, tag, build)
+
+@router.get("/schemes", response_model=List[schemas.GovernmentSchemeResponse])
+async def list_schemes(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Active government schemes, by title."""
+    query = (
+        select(models.GovernmentScheme)
+        .where(models.GovernmentScheme.is_active.is_(True))
+        .order_by(models.GovernmentScheme.title, models.GovernmentScheme.id)
+    )
+    return await cached_list(request, "schemes", db, query, schemas.GovernmentSchemeResponse)
+
+@router.get("/schemes/{scheme_id}", response_model=schemas.GovernmentSchemeResponse)
+async def get_scheme(scheme_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await cached_item(request, "schemes", db, models.GovernmentScheme, scheme_id, schemas.GovernmentSchemeResponse)
+
+@router.get("/training-modules", response_model=List[schemas.TrainingModuleResponse])
+async def list_training_modules(
+    request: Request,
+    language: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Active training modules, optionally in one language, by title."""
+    query = select(models.TrainingModule).where(models.TrainingModule.is_active.is_(True))
+    if language:
+        query = query.where(models.TrainingModule.language == language)
+    query = query.order_by(models.TrainingModule.title, models.TrainingModule.id)
+    return await cached_list(request, "training_modules", db, query, schemas.TrainingModuleResponse)
+
+@router.get("/training-modules/{module_id}", response_model=schemas.TrainingModuleResponse)
+async def get_training_module(module_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await cached_item(request, "training_modules", db, models.TrainingModule, module_id, schemas.TrainingModuleResponse)
+
+@router.get("/success-stories/featured", response_model=List[schemas.SuccessStoryResponse])
+async def list_featured_stories(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Featured success stories, newest first."""
+    query = (
+        select(models.SuccessStory)
+        .where(models.SuccessStory.is_featured.is_(True))
+        .order_by(models.SuccessStory.created_at.desc(), models.SuccessStory.id.desc())
+        .limit(FEATURED_STORIES_LIMIT)
+    )
+    return await cached_list(request, "success_stories", db, query, schemas.SuccessStoryResponse)
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from .. import models, schemas
+from ..auth.utils import get_current_active_user, require_roles
+from ..crops import area_filters, crop_counts, find_crop_id
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate_or_400
+from ..replicas import get_read_db
+from ..serialization import fast_page
+
+router = APIRouter(prefix="/api/crops", tags=["Crops"])
+
+staff = require_roles(models.UserRole.VLE, models.UserRole.NGO_ADMIN, models.UserRole.EXPERT)
+
+@router.get("", response_model=List[schemas.CropCount])
+async def list_crops(
+    district: Optional[str] = None,
+    state: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Crops grown by registered farmers with farmer counts, most grown first."""
+    return await crop_counts(db, district, state)
+
+@router.get("/{crop}/farmers", response_model=schemas.FarmerProfilePage)
+async def list_crop_farmers(
+    crop: str,
+    district: Optional[str] = None,
+    state: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(staff),
+):
+    """
+    Profiles of farmers growing a crop, optionally within a district and/or
+    state. Names match case-insensitively. VLEs, NGO admins and experts only.
+    """
+    crop_id = await find_crop_id(db, crop)
+    if crop_id is None:
+        return {"items": [], "next_cursor": None, "limit": limit}
+    query = (
+        select(models.FarmerProfile)
+        .join(models.FarmerCrop, models.FarmerCrop.profile_id == models.FarmerProfile.id)
+        .where(models.FarmerCrop.crop_id == crop_id, *area_filters(district, state))
+    )
+    page = await paginate_or_400(db, query, [(models.FarmerProfile.id, False)], cursor, limit)
+    return fast_page(page, schemas.FarmerProfileResponse)
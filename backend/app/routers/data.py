@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi.responses import StreamingResponse
+import asyncio
+
+from .. import models, schemas
+from ..auth.utils import require_roles
+from ..csv_io import (
+    FARMER_COLUMNS,
+    ISSUE_COLUMNS,
+    farmer_row,
+    farmers_export_query,
+    import_farmers,
+    import_issues,
+    issue_row,
+    issues_export_query,
+    stream_csv,
+)
+
+router = APIRouter(prefix="/api/data", tags=["Data import/export"])
+
+ngo_admin = require_roles(models.UserRole.NGO_ADMIN)
+
+def csv_response(body, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/farmers/import", response_model=schemas.ImportReport)
+async def import_farmers_csv(file: UploadFile = File(...), current_user: models.User = Depends(ngo_admin)):
+    """
+    Import farmers from CSV with the columns of the export. ``crops`` is a
+    ``;``-separated list. Rows are validated individually; failures are
+    reported by line number and do not stop the import. A file that cannot
+    be parsed stops it; the report gives the first line not imported.
+    """
+    return await asyncio.to_thread(import_farmers, file.file)
+
+@router.get("/farmers/export")
+async def export_farmers_csv(current_user: models.User = Depends(ngo_admin)):
+    """Stream all farmer profiles as CSV."""
+    return csv_response(stream_csv(farmers_export_query(), FARMER_COLUMNS, farmer_row), "farmers.csv")
+
+@router.post("/issues/import", response_model=schemas.ImportReport)
+async def import_issues_csv(file: UploadFile = File(...), current_user: models.User = Depends(ngo_admin)):
+    """
+    Import issues from CSV. Required columns are ``title`` and ``reporter_phone``;
+    ``latitude``/``longitude`` set the issue location.
+    """
+    return await asyncio.to_thread(import_issues, file.file)
+
+@router.get("/issues/export")
+async def export_issues_csv(current_user: models.User = Depends(ngo_admin)):
+    """Stream all issues as CSV."""
+    return csv_response(stream_csv(issues_export_query(), ISSUE_COLUMNS, issue_row), "issues.csv")
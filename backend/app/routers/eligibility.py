@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+import asyncio
+
+from .. import models, schemas
+from ..auth.utils import get_current_active_user, require_roles
+from ..eligibility import eligibility_engine
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..replicas import get_read_db
+
+router = APIRouter(prefix="/api/eligibility", tags=["Eligibility"])
+
+staff = require_roles(models.UserRole.VLE, models.UserRole.NGO_ADMIN)
+
+async def eligible_schemes(db: AsyncSession, user_id: str) -> List[models.GovernmentScheme]:
+    await asyncio.to_thread(eligibility_engine.ensure_loaded)
+    scheme_ids = eligibility_engine.schemes_for(user_id)
+    if not scheme_ids:
+        return []
+    result = await db.execute(
+        select(models.GovernmentScheme)
+        .where(models.GovernmentScheme.id.in_(scheme_ids))
+        .order_by(models.GovernmentScheme.title)
+    )
+    return list(result.scalars())
+
+@router.get("/schemes", response_model=List[schemas.GovernmentSchemeResponse])
+async def my_eligible_schemes(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Active schemes the current farmer qualifies for."""
+    return await eligible_schemes(db, current_user.id)
+
+@router.get("/farmers/{user_id}/schemes", response_model=List[schemas.GovernmentSchemeResponse])
+async def farmer_eligible_schemes(
+    user_id: str,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(staff),
+):
+    """Active schemes a farmer qualifies for. VLEs and NGO admins only."""
+    return await eligible_schemes(db, user_id)
+
+@router.get("/schemes/{scheme_id}/farmers", response_model=schemas.EligibleFarmers)
+async def scheme_eligible_farmers(
+    scheme_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: models.User = Depends(staff),
+):
+    """User ids of the farmers qualifying for an active scheme. VLEs and NGO admins only."""
+    await asyncio.to_thread(eligibility_engine.ensure_loaded)
+    if not eligibility_engine.has_scheme(scheme_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scheme not found or not active")
+    user_ids = eligibility_engine.farmers_for(scheme_id)
+    return {"scheme_id": scheme_id, "total": len(user_ids), "user_ids": user_ids[offset:offset + limit]}
@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from .. import models, schemas
+from ..auth.utils import get_current_active_user
+from ..geo.clusters import TILE_MAX_ZOOM, TILE_MIN_ZOOM, get_tile
+from ..geo.index import within_bbox, within_radius
+from ..replicas import get_read_db
+
+router = APIRouter(prefix="/api/geo", tags=["Maps"])
+
+MAX_RESULTS = 2000
+MAX_RADIUS_KM = 500
+
+def check_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Bounding box minimums must not exceed maximums",
+        )
+
+@router.get("/issues", response_model=List[schemas.IssueResponse])
+async def issues_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    issue_status: Optional[schemas.IssueStatus] = Query(None, alias="status"),
+    limit: int = Query(500, ge=1, le=MAX_RESULTS),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Issues located inside a map viewport."""
+    check_bbox(min_lat, min_lon, max_lat, max_lon)
+    filters = [models.Issue.status == issue_status] if issue_status else []
+    return await within_bbox(db, models.Issue, min_lat, min_lon, max_lat, max_lon, limit, filters)
+
+@router.get("/issues/nearby", response_model=List[schemas.IssueResponse])
+async def issues_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=MAX_RADIUS_KM),
+    issue_status: Optional[schemas.IssueStatus] = Query(None, alias="status"),
+    limit: int = Query(500, ge=1, le=MAX_RESULTS),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Issues within radius_km of a point, nearest first."""
+    filters = [models.Issue.status == issue_status] if issue_status else []
+    found = await within_radius(db, models.Issue, lat, lon, radius_km, limit, filters)
+    return [issue for issue, _ in found]
+
+@router.get("/stories", response_model=List[schemas.SuccessStoryResponse])
+async def stories_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(500, ge=1, le=MAX_RESULTS),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Success stories located inside a map viewport."""
+    check_bbox(min_lat, min_lon, max_lat, max_lon)
+    return await within_bbox(db, models.SuccessStory, min_lat, min_lon, max_lat, max_lon, limit)
+
+@router.get("/stories/nearby", response_model=List[schemas.SuccessStoryResponse])
+async def stories_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=MAX_RADIUS_KM),
+    limit: int = Query(500, ge=1, le=MAX_RESULTS),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Success stories within radius_km of a point, nearest first."""
+    found = await within_radius(db, models.SuccessStory, lat, lon, radius_km, limit)
+    return [story for story, _ in found]
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def issue_tile(
+    response: Response,
+    z: int = Path(..., ge=TILE_MIN_ZOOM, le=TILE_MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Pre-aggregated issue clusters for one web-mercator map tile."""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tile coordinates out of range for zoom level",
+        )
+    response.headers["Cache-Control"] = "private, max-age=30"
+    return await get_tile(db, z, x, y)
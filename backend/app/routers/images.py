@@ -0,0 +1,300 @@
+"""
+Image uploads and delivery for success stories.
+
+Uploads are streamed into the content-addressed image store, either as a
+raw request body (``Content-Type: image/jpeg``) or as the ``file`` field of
+a multipart form, which is parsed incrementally rather than spooled. The
+returned URL goes into a story's before_images or after_images.
+
+Images and their resized variants never change once stored, so they are
+served with a strong ETag and a one-year immutable Cache-Control. The
+server also answers If-None-Match/If-Modified-Since with 304 and single
+byte ranges with 206, so an interrupted download on a slow connection
+resumes instead of starting over.
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import os
+import re
+
+from .. import models, schemas
+from ..auth.utils import get_current_active_user
+from ..images.jobs import image_service
+from ..images.store import (
+    IMAGE_URL_PREFIX,
+    ImageTooLarge,
+    StoredImage,
+    UnsupportedImage,
+    image_store,
+    image_url,
+)
+
+router = APIRouter(prefix=IMAGE_URL_PREFIX, tags=["Images"])
+
+CHUNK_BYTES = 64 * 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+MEDIA_TYPES = {"jpg": "image/jpeg", "webp": "image/webp"}
+VARIANT = re.compile(r"^(\d+)(?:\.(jpg|webp))?$")
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FilePart:
+    """Callbacks for python-multipart that keep the data of the form's 'file' field, and nothing else."""
+
+    def __init__(self):
+        self.data: List[bytes] = []
+        self.found = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = self._value = b""
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._headers.clear,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def on_headers_finished(self) -> None:
+        _, disposition = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = not self.found and disposition.get(b"name") == b"file" and b"filename" in disposition
+        self.found = self.found or self._in_file
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.data.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        self._in_file = False
+
+
+async def multipart_chunks(request: Request) -> AsyncIterator[bytes]:
+    """
+    The 'file' field of a multipart form, parsed as the body arrives, so
+    neither the file nor the other fields are ever held or spooled whole.
+    The body is cut off at the size limit even without a Content-Length.
+    """
+    _, options = parse_options_header(request.headers["content-type"])
+    if not options.get(b"boundary"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing multipart boundary")
+    part = FilePart()
+    parser = MultipartParser(options[b"boundary"], part.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > image_store.max_bytes + CHUNK_BYTES:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
+            parser.write(chunk)
+            for data in part.data:
+                yield data
+            part.data.clear()
+        parser.finalize()
+    except MultipartParseError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body")
+    if not part.found:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected an image in the 'file' field")
+
+
+async def upload_chunks(request: Request) -> AsyncIterator[bytes]:
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        async for chunk in multipart_chunks(request):
+            yield chunk
+    else:
+        async for chunk in request.stream():
+            if chunk:
+                yield chunk
+
+
+def image_response(image: StoredImage) -> dict:
+    url = image_url(image.id)
+    return {
+        "id": image.id,
+        "url": url,
+        "content_type": image.content_type,
+        "width": image.width,
+        "height": image.height,
+        "size": image.size,
+        "variants": {str(width): f"{url}/{width}" for width in image_service.widths},
+        "variants_ready": image_service.ready(image.id),
+    }
+
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def requested_range(request: Request, etag: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    The single byte range asked for, as inclusive offsets, or None to send
+    the whole file. Multiple ranges and malformed headers get the whole
+    file; a range past the end raises 416.
+    """
+    match = BYTE_RANGE.match(request.headers.get("range", "").replace(" ", ""))
+    if match is None or size == 0:
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        return None  # the client's partial copy is of something else
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        start, end = max(0, size - int(last)), size - 1
+        if int(last) == 0:
+            start = size
+    else:
+        return None
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    # A sync generator: StreamingResponse runs it in the threadpool
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def send_file(request: Request, path: str, media_type: str, etag: str, cache_control: str,
+              headers: Optional[Dict[str, str]] = None) -> Response:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        **(headers or {}),
+    }
+    if not_modified(request, etag, stat.st_mtime):
+        image_service.counters["not_modified"] += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    byte_range = requested_range(request, etag, stat.st_size)
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+    start, end = byte_range
+    image_service.counters["partial"] += 1
+    headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        read_range(path, start, end), status_code=status.HTTP_206_PARTIAL_CONTENT, media_type=media_type, headers=headers,
+    )
+
+
+def stored_meta(image_id: str) -> dict:
+    try:
+        meta = image_store.meta(image_id)
+    except ValueError:
+        meta = None
+    if meta is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    return meta
+
+
+def send_original(request: Request, image_id: str, meta: dict, cache_control: str = IMMUTABLE,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    image_service.counters["originals_served"] += 1
+    return send_file(request, image_store.original_path(image_id), meta["content_type"], f'"{image_id}"',
+                     cache_control, headers)
+
+
+@router.post("", response_model=schemas.ImageResponse, status_code=status.HTTP_201_CREATED)
+async def upload_image(
+    request: Request,
+    response: Response,
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Store a JPEG, PNG or WebP image and start rendering its variants.
+    Uploading an image that is already stored returns it with status 200.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > image_store.max_bytes + CHUNK_BYTES:
+        # Refused before reading anything; multipart framing is allowed a little slack
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
+    try:
+        image = await image_store.save(upload_chunks(request))
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except UnsupportedImage as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    if not image.created:
+        response.status_code = status.HTTP_200_OK
+    if not image_service.ready(image.id):
+        image_service.submit(image.id)
+    return image_response(image)
+
+
+@router.get("/{image_id}")
+async def get_image(image_id: str, request: Request):
+    """The image as uploaded, without its metadata."""
+    return send_original(request, image_id, stored_meta(image_id))
+
+
+@router.get("/{image_id}/{variant}")
+async def get_image_variant(image_id: str, variant: str, request: Request):
+    """
+    A resized variant: ``320.webp``, ``320.jpg``, or ``320`` for WebP when
+    the client accepts it and JPEG otherwise. Until the variant has been
+    rendered, the original is sent with a no-cache header instead.
+    """
+    match = VARIANT.match(variant)
+    if match is None or int(match[1]) not in image_service.widths:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown image variant")
+    meta = stored_meta(image_id)
+    width, extension = int(match[1]), match[2]
+    headers = {}
+    if extension is None:
+        extension = "webp" if "image/webp" in request.headers.get("accept", "") else "jpg"
+        headers["Vary"] = "Accept"
+    path = image_store.variant_path(image_id, f"{width}.{extension}")
+    if not os.path.exists(path):
+        image_service.submit(image_id)
+        return send_original(request, image_id, meta, cache_control="no-cache", headers=headers)
+    image_service.counters["variants_served"] += 1
+    return send_file(request, path, MEDIA_TYPES[extension], f'"{image_id[:32]}-{width}.{extension}"', IMMUTABLE, headers)
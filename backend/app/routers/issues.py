@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from .. import models, schemas
+from ..auth.utils import get_current_active_user
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate_or_400
+from ..replicas import get_read_db
+from ..serialization import fast_page
+from ..timeline import timeline_options
+
+router = APIRouter(prefix="/api/issues", tags=["Issues"])
+
+@router.get("", response_model=schemas.IssuePage)
+async def list_issues(
+    issue_status: Optional[schemas.IssueStatus] = Query(None, alias="status"),
+    priority: Optional[schemas.IssuePriority] = None,
+    category: Optional[str] = None,
+    reported_by: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """List issues by creation time, optionally filtered. Pass ``next_cursor`` back as ``cursor``."""
+    query = select(models.Issue)
+    if issue_status:
+        query = query.where(models.Issue.status == issue_status)
+    if priority:
+        query = query.where(models.Issue.priority == priority)
+    if category:
+        query = query.where(models.Issue.category == category)
+    if reported_by:
+        query = query.where(models.Issue.reported_by == reported_by)
+    if assigned_to:
+        query = query.where(models.Issue.assigned_to == assigned_to)
+    descending = order == "desc"
+    sort = [(models.Issue.created_at, descending), (models.Issue.id, descending)]
+    return fast_page(await paginate_or_400(db, query, sort, cursor, limit), schemas.IssueResponse)
+
+@router.get("/{issue_id}/updates", response_model=schemas.IssueUpdatePage)
+async def list_issue_updates(
+    issue_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Status history of an issue, oldest first."""
+    query = select(models.IssueUpdate).where(models.IssueUpdate.issue_id == issue_id)
+    sort = [(models.IssueUpdate.created_at, False), (models.IssueUpdate.id, False)]
+    return fast_page(await paginate_or_400(db, query, sort, cursor, limit), schemas.IssueUpdateResponse)
+
+@router.get("/{issue_id}", response_model=schemas.IssueTimeline)
+async def get_issue_timeline(
+    issue_id: str,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """An issue with its reporter, assignee and full status history, oldest first."""
+    result = await db.execute(
+        select(models.Issue).where(models.Issue.id == issue_id).options(*timeline_options())
+    )
+    issue = result.unique().scalar_one_or_none()
+    if issue is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Issue not found")
+    return issue
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+import os
+import secrets
+from dotenv import load_dotenv
+
+from ..auth.admission import otp_admission
+from ..auth.cache import cache_stats
+from ..auth.crypto import crypto_service
+from ..database import async_engine, engine
+from ..http_cache import response_cache
+from ..images.jobs import image_service
+from ..inbound.processor import inbound_processor
+from ..metrics import render
+from ..replicas import read_router
+from ..reports.jobs import report_service
+from ..sms.dispatcher import sms_dispatcher
+
+load_dotenv()
+
+# When set, scrapers must send "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+def pool_stats(pool) -> dict:
+    """Connection counts of a QueuePool; other pool classes report nothing."""
+    stats = {}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    """Request, SQL and component metrics in the Prometheus text format."""
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not secrets.compare_digest(supplied, METRICS_TOKEN):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    body = render({
+        "agriconnect_auth_cache": cache_stats(),
+        "agriconnect_crypto": crypto_service.stats(),
+        "agriconnect_otp_admission": otp_admission.stats(),
+        "agriconnect_sms": sms_dispatcher.stats(),
+        "agriconnect_reports": report_service.stats(),
+        "agriconnect_inbound": inbound_processor.stats(),
+        "agriconnect_http_cache": response_cache.stats(),
+        "agriconnect_images": image_service.stats(),
+        "agriconnect_db_pool": {
+            "sync": pool_stats(engine.pool),
+            "async": pool_stats(async_engine.pool),
+            **{replica.name: pool_stats(replica.engine.pool) for replica in read_router.replicas},
+        },
+        "agriconnect_db_replicas": read_router.stats(),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
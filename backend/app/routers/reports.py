@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import os
+
+from .. import models, schemas
+from ..auth.utils import require_roles
+from ..database import get_async_db
+from ..reports.jobs import JobStatus, ReportJob, report_service
+
+router = APIRouter(prefix="/api/reports", tags=["Reports"])
+
+staff = require_roles(models.UserRole.VLE, models.UserRole.NGO_ADMIN)
+
+def job_response(job: ReportJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status.value,
+        "cached": job.cached,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "download_url": f"{router.prefix}/{job.id}/download" if job.status == JobStatus.DONE else None,
+    }
+
+def get_job(job_id: str) -> ReportJob:
+    job = report_service.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report job not found")
+    return job
+
+@router.post("/district", response_model=schemas.ReportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_district_report(
+    request: schemas.DistrictReportRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(staff),
+):
+    """
+    Start rendering a district report. Poll the returned job until its status
+    is ``done``; an unchanged report is served from cache immediately.
+    """
+    job = await report_service.submit_district(db, request.district, request.state)
+    return job_response(job)
+
+@router.get("/{job_id}", response_model=schemas.ReportJobResponse)
+async def report_status(job_id: str, current_user: models.User = Depends(staff)):
+    return job_response(get_job(job_id))
+
+@router.get("/{job_id}/download")
+async def download_report(job_id: str, current_user: models.User = Depends(staff)):
+    job = get_job(job_id)
+    if job.status != JobStatus.DONE:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Report is {job.status.value}")
+    path = report_service.path(job.key)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Report expired from cache, submit it again")
+    return FileResponse(path, media_type="application/pdf", filename=f"{job.kind}-report.pdf")
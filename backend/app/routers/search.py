@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from .. import models, schemas
+from ..auth.utils import get_current_active_user
+from ..replicas import get_read_db
+from ..search.index import DOC_TYPES, search
+
+router = APIRouter(prefix="/api/search", tags=["Search"])
+
+@router.get("", response_model=schemas.SearchResponse)
+async def search_content(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[List[str]] = Query(None),
+    language: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Search schemes, training modules and success stories. Every word of ``q``
+    must match, as a prefix; title matches rank higher.
+    """
+    unknown = set(types or ()) - set(DOC_TYPES)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown types: {', '.join(sorted(unknown))}",
+        )
+    results = await search(db, q, types or DOC_TYPES, language, limit)
+    return {"query": q, "results": results}
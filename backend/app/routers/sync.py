@@ -0,0 +1,188 @@
+"""
+Offline-first delta sync.
+
+A device sends everything it queued while offline in one request and gets
+back everything that changed on the server since its last sync. Uploads
+carry client-generated idempotency keys, so a request retried after a
+dropped connection never creates duplicates.
+"""
+from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List
+import os
+from dotenv import load_dotenv
+
+from .. import models, schemas
+from ..auth.utils import get_current_active_user
+from ..database import get_async_db
+from ..pagination import InvalidCursor, after, decode_cursor, encode_cursor
+
+load_dotenv()
+
+# Rows stamped within this many seconds of now are held back until the next
+# sync, so a transaction that commits late cannot slip behind a watermark.
+SYNC_SAFETY_LAG_SECONDS = int(os.getenv("SYNC_SAFETY_LAG_SECONDS", "2"))
+
+router = APIRouter(prefix="/api/sync", tags=["Sync"])
+
+async def upsert_issues(db: AsyncSession, user_id: str, items: List[schemas.SyncIssue]) -> Dict[str, str]:
+    """Create issues whose client_id this user has not uploaded before."""
+    if not items:
+        return {}
+    result = await db.execute(
+        select(models.Issue.client_id, models.Issue.id).where(
+            models.Issue.reported_by == user_id,
+            models.Issue.client_id.in_({item.client_id for item in items}),
+        )
+    )
+    ids = dict(result.all())
+    for item in items:
+        if item.client_id in ids:
+            continue
+        issue = models.Issue(
+            id=models.generate_uuid(),
+            reported_by=user_id,
+            **item.model_dump(exclude={"client_id", "priority"}),
+            priority=models.IssuePriority(item.priority),
+            client_id=item.client_id,
+        )
+        db.add(issue)
+        ids[item.client_id] = issue.id
+    return ids
+
+async def upsert_issue_updates(db: AsyncSession, user_id: str, role: models.UserRole,
+                               items: List[schemas.SyncIssueUpdate], issue_ids: Dict[str, str],
+                               errors: List[dict]) -> Dict[str, str]:
+    """Create issue updates not uploaded before and apply their status to the issue."""
+    if not items:
+        return {}
+    result = await db.execute(
+        select(models.IssueUpdate.client_id, models.IssueUpdate.id).where(
+            models.IssueUpdate.created_by == user_id,
+            models.IssueUpdate.client_id.in_({item.client_id for item in items}),
+        )
+    )
+    ids = dict(result.all())
+    pending = [item for item in items if item.client_id not in ids]
+
+    # Resolve issue_client_id references to issues uploaded in earlier syncs
+    unresolved = {
+        item.issue_client_id for item in pending
+        if not item.issue_id and item.issue_client_id and item.issue_client_id not in issue_ids
+    }
+    if unresolved:
+        result = await db.execute(
+            select(models.Issue.client_id, models.Issue.id).where(
+                models.Issue.reported_by == user_id, models.Issue.client_id.in_(unresolved)
+            )
+        )
+        issue_ids = {**issue_ids, **dict(result.all())}
+
+    targets = {item.issue_id or issue_ids.get(item.issue_client_id) for item in pending} - {None}
+    issues = {}
+    if targets:
+        result = await db.execute(select(models.Issue).where(models.Issue.id.in_(targets)))
+        issues = {issue.id: issue for issue in result.scalars()}
+    # Issues created earlier in this batch are pending in the session, not yet in the database
+    for obj in db.new:
+        if isinstance(obj, models.Issue):
+            issues[obj.id] = obj
+
+    for item in pending:
+        if item.client_id in ids:
+            continue
+        issue = issues.get(item.issue_id or issue_ids.get(item.issue_client_id))
+        if issue is None:
+            errors.append({"client_id": item.client_id, "detail": "Issue not found"})
+            continue
+        if role == models.UserRole.FARMER and issue.reported_by != user_id:
+            errors.append({"client_id": item.client_id, "detail": "Not allowed to update this issue"})
+            continue
+        update = models.IssueUpdate(
+            id=models.generate_uuid(),
+            issue_id=issue.id,
+            status=models.IssueStatus(item.status),
+            notes=item.notes,
+            created_by=user_id,
+            client_id=item.client_id,
+        )
+        db.add(update)
+        issue.status = update.status
+        ids[item.client_id] = update.id
+    return ids
+
+async def pull_changes(db: AsyncSession, model, cursor, limit: int, cutoff, filters=()):
+    """Rows of model changed after the cursor's (updated_at, id) watermark."""
+    order = [(model.updated_at, False), (model.id, False)]
+    query = select(model).where(model.updated_at <= cutoff, *filters)
+    if cursor:
+        query = query.where(after(order, decode_cursor(order, cursor)))
+    query = query.order_by(model.updated_at, model.id).limit(limit + 1)
+    rows = list((await db.execute(query)).scalars())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (encode_cursor(order, rows[-1]) if rows else cursor), has_more
+
+@router.post("", response_model=schemas.SyncResponse)
+async def sync(
+    request: schemas.SyncRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Upload queued issues and issue updates, then pull changes.
+
+    Uploads are applied in a single transaction. Pass the returned ``cursors``
+    back on the next sync; keep syncing while ``has_more`` is true.
+    """
+    # Read before any rollback: rolling back expires current_user, which
+    # belongs to this session, and reloading it would need a new query
+    user_id, role = current_user.id, current_user.role
+    for attempt in range(2):
+        errors: List[dict] = []
+        try:
+            issue_ids = await upsert_issues(db, user_id, request.issues)
+            update_ids = await upsert_issue_updates(db, user_id, role, request.issue_updates, issue_ids, errors)
+            await db.commit()
+            break
+        except IntegrityError:
+            # The same batch was committed concurrently (e.g. a client retry);
+            # a second pass finds those rows and skips them.
+            await db.rollback()
+            if attempt:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Sync conflict, please retry")
+
+    db_now = (await db.execute(select(func.now()))).scalar_one()
+    cutoff = db_now - timedelta(seconds=SYNC_SAFETY_LAG_SECONDS)
+    own_issues = [or_(models.Issue.reported_by == user_id, models.Issue.assigned_to == user_id)]
+    tables = {
+        "issues": (models.Issue, own_issues),
+        "schemes": (models.GovernmentScheme, ()),
+        "training_modules": (models.TrainingModule, ()),
+    }
+    pulled = {}
+    cursors = {}
+    has_more = False
+    try:
+        for name, (model, filters) in tables.items():
+            rows, cursors[name], more = await pull_changes(
+                db, model, request.cursors.get(name), request.limit, cutoff, filters
+            )
+            pulled[name] = rows
+            has_more = has_more or more
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {
+        "issue_ids": issue_ids,
+        "issue_update_ids": update_ids,
+        "errors": errors,
+        "issues": pulled["issues"],
+        "schemes": pulled["schemes"],
+        "training_modules": pulled["training_modules"],
+        "cursors": {name: cursor for name, cursor in cursors.items() if cursor},
+        "has_more": has_more,
+    }
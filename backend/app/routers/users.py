@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from .. import models, schemas
+from ..auth.utils import require_roles
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate_or_400
+from ..replicas import get_read_db
+from ..serialization import fast_page
+
+router = APIRouter(prefix="/api/users", tags=["Users"])
+
+@router.get("", response_model=schemas.UserPage)
+async def list_users(
+    role: Optional[schemas.UserRole] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(require_roles(models.UserRole.NGO_ADMIN)),
+):
+    """List users, newest first. NGO admins only."""
+    query = select(models.User)
+    if role:
+        query = query.where(models.User.role == role)
+    sort = [(models.User.created_at, True), (models.User.id, True)]
+    return fast_page(await paginate_or_400(db, query, sort, cursor, limit), schemas.UserResponse)
@@ -0,0 +1,81 @@
+"""
+Twilio webhooks for WhatsApp and IVR reports.
+
+Each webhook is acknowledged as soon as its parameters are in the durable
+inbound queue; issues are created from the queue in batches by
+app.inbound.processor. Requests are checked against X-Twilio-Signature when
+TWILIO_AUTH_TOKEN is set.
+"""
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response
+from typing import Dict
+import base64
+import hashlib
+import hmac
+import os
+from xml.sax.saxutils import escape
+from dotenv import load_dotenv
+
+from ..inbound.processor import inbound_queue, message_sid
+from ..sms.gateway import TWILIO_AUTH_TOKEN
+
+load_dotenv()
+
+# Public base URL Twilio calls (e.g. https://api.example.org) when behind a
+# proxy, since signatures cover the URL as Twilio sent it
+TWILIO_WEBHOOK_BASE_URL = os.getenv("TWILIO_WEBHOOK_BASE_URL")
+IVR_THANK_YOU = os.getenv("IVR_THANK_YOU", "Thank you. Your report has been recorded.")
+
+router = APIRouter(prefix="/api/webhooks/twilio", tags=["Webhooks"])
+
+
+def twilio_signature(url: str, params: Dict[str, str], auth_token: str) -> str:
+    """X-Twilio-Signature for a form POST: HMAC-SHA1 of the URL followed by the sorted parameters."""
+    data = url + "".join(f"{name}{params[name]}" for name in sorted(params))
+    return base64.b64encode(hmac.new(auth_token.encode(), data.encode(), hashlib.sha1).digest()).decode()
+
+
+async def twilio_params(request: Request) -> Dict[str, str]:
+    params = {name: value for name, value in (await request.form()).items() if isinstance(value, str)}
+    if TWILIO_AUTH_TOKEN:
+        url = str(request.url)
+        if TWILIO_WEBHOOK_BASE_URL:
+            url = TWILIO_WEBHOOK_BASE_URL.rstrip("/") + request.url.path
+            if request.url.query:
+                url += "?" + request.url.query
+        expected = twilio_signature(url, params, TWILIO_AUTH_TOKEN)
+        if not hmac.compare_digest(request.headers.get("x-twilio-signature", ""), expected):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Twilio signature")
+    return params
+
+
+async def enqueue(channel: str, params: Dict[str, str]) -> None:
+    sid = message_sid(channel, params)
+    if not sid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing message SID")
+    try:
+        await inbound_queue.put(sid, channel, params)
+    except Exception as e:
+        # Twilio retries webhooks that fail, so nothing is lost
+        print(f"Inbound queue write failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Please retry")
+
+
+def twiml(body: str = "") -> Response:
+    return Response(f'<?xml version="1.0" encoding="UTF-8"?><Response>{body}</Response>', media_type="application/xml")
+
+
+@router.post("/whatsapp")
+async def whatsapp_message(request: Request):
+    """Incoming WhatsApp message. Answered with empty TwiML, so Twilio sends no reply."""
+    params = await twilio_params(request)
+    await enqueue("whatsapp", params)
+    return twiml()
+
+
+@router.post("/ivr")
+async def ivr_report(request: Request):
+    """Action URL of the IVR's <Gather> or <Record>: queues the speech, keypad input or recording."""
+    params = await twilio_params(request)
+    await enqueue("ivr", params)
+    return twiml(f"<Say>{escape(IVR_THANK_YOU)}</Say><Hangup/>")
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, EmailStr, Field, computed_field, root_validator, validator
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
+from .images.store import IMAGE_FEED_WIDTH, variant_url
+
 # Enums
 class UserRole(str, Enum):
     FARMER = "farmer"
@@ -94,6 +96,8 @@ class IssueResponse(IssueBase):
     assigned_to: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+    update_count: int = 0
+    last_update_at: Optional[datetime] = None
 
 # Issue update schemas
 class IssueUpdateBase(BaseSchema):
@@ -109,6 +113,20 @@ class IssueUpdateResponse(IssueUpdateBase):
     created_by: str
     created_at: datetime
 
+# Issue timeline schemas
+class UserSummary(BaseSchema):
+    id: str
+    name: Optional[str] = None
+    role: UserRole
+
+class IssueTimelineEntry(IssueUpdateResponse):
+    created_by_user: Optional[UserSummary] = None
+
+class IssueTimeline(IssueResponse):
+    reported_by_user: Optional[UserSummary] = None
+    assigned_to_user: Optional[UserSummary] = None
+    updates: List[IssueTimelineEntry] = []
+
 # Government scheme schemas
 class GovernmentSchemeBase(BaseSchema):
     title: str
@@ -174,6 +192,82 @@ class SuccessStoryResponse(SuccessStoryBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+    # Small variants of uploaded images for story listings; other URLs are passed through
+    @computed_field
+    @property
+    def before_thumbnails(self) -> Optional[List[str]]:
+        return [variant_url(url, IMAGE_FEED_WIDTH) for url in self.before_images] if self.before_images else None
+
+    @computed_field
+    @property
+    def after_thumbnails(self) -> Optional[List[str]]:
+        return [variant_url(url, IMAGE_FEED_WIDTH) for url in self.after_images] if self.after_images else None
+
+# CSV import schemas
+class CSVRow(BaseSchema):
+    @root_validator(pre=True)
+    def drop_blank_cells(cls, values):
+        # Empty CSV cells mean "not provided", so field defaults apply
+        return {k: v for k, v in values.items() if not (isinstance(v, str) and not v.strip())}
+
+class FarmerImportRow(CSVRow, FarmerProfileBase):
+    phone_number: str = Field(..., min_length=10, max_length=15)
+    name: Optional[str] = None
+    language: str = "en"
+
+    @validator("crops", pre=True)
+    def split_crops(cls, v):
+        if isinstance(v, str):
+            return [crop.strip() for crop in v.split(";") if crop.strip()]
+        return v
+
+class IssueImportRow(CSVRow, IssueBase):
+    reporter_phone: str = Field(..., min_length=10, max_length=15)
+    status: IssueStatus = IssueStatus.REPORTED
+    priority: IssuePriority = IssuePriority.MEDIUM
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class ImportRowError(BaseModel):
+    line: int
+    detail: str
+
+class ImportReport(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+# Offline sync schemas
+class SyncIssue(IssueCreate):
+    client_id: str = Field(..., min_length=1, max_length=64)
+
+class SyncIssueUpdate(IssueUpdateCreate):
+    client_id: str = Field(..., min_length=1, max_length=64)
+    # Either the server id of an existing issue or the client_id of one in this batch
+    issue_id: Optional[str] = None
+    issue_client_id: Optional[str] = None
+
+class SyncRequest(BaseModel):
+    issues: List[SyncIssue] = Field(default_factory=list, max_length=500)
+    issue_updates: List[SyncIssueUpdate] = Field(default_factory=list, max_length=500)
+    # Opaque watermarks returned by the previous sync, per table
+    cursors: Dict[str, str] = Field(default_factory=dict)
+    limit: int = Field(200, ge=1, le=1000)
+
+class SyncError(BaseModel):
+    client_id: str
+    detail: str
+
+class SyncResponse(BaseModel):
+    issue_ids: Dict[str, str]  # client_id -> server id
+    issue_update_ids: Dict[str, str]
+    errors: List[SyncError]
+    issues: List[IssueResponse]
+    schemes: List[GovernmentSchemeResponse]
+    training_modules: List[TrainingModuleResponse]
+    cursors: Dict[str, str]
+    has_more: bool
+
 # Authentication schemas
 class OTPRequest(BaseModel):
     phone_number: str = Field(..., min_length=10, max_length=15)
@@ -184,6 +278,11 @@ class OTPVerification(OTPRequest):
 class OTPResponse(BaseModel):
     message: str
     otp: Optional[str] = None  # Only for development
+    message_id: Optional[str] = None
+
+class OTPDeliveryStatus(BaseModel):
+    message_id: str
+    status: str
 
 class Token(BaseModel):
     access_token: str
@@ -204,3 +303,92 @@ class PaginatedResponse(BaseModel):
     page: int
     page_size: int
     items: List[Any]
+
+class CursorPaginatedResponse(BaseModel):
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    limit: int
+
+class UserPage(CursorPaginatedResponse):
+    items: List[UserResponse]
+
+class IssuePage(CursorPaginatedResponse):
+    items: List[IssueResponse]
+
+class IssueUpdatePage(CursorPaginatedResponse):
+    items: List[IssueUpdateResponse]
+
+# Search
+class SearchResult(BaseModel):
+    type: str
+    id: str
+    title: str
+    snippet: Optional[str] = None
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+# Eligibility
+class EligibleFarmers(BaseModel):
+    scheme_id: str
+    total: int
+    user_ids: List[str]
+
+# Crops
+class CropCount(BaseModel):
+    name: str
+    farmers: int
+
+class FarmerProfilePage(CursorPaginatedResponse):
+    items: List[FarmerProfileResponse]
+
+# Reports
+class DistrictReportRequest(BaseModel):
+    district: str = Field(..., min_length=1, max_length=100)
+    state: Optional[str] = Field(None, max_length=100)
+
+class ReportJobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    cached: bool
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+# Images
+class ImageResponse(BaseModel):
+    id: str
+    url: str
+    content_type: str
+    width: int
+    height: int
+    size: int
+    variants: Dict[str, str]  # width -> URL
+    variants_ready: bool
+
+# Analytics
+class DayCount(BaseModel):
+    day: date
+    count: int
+
+class PriorityResolution(BaseModel):
+    resolved: int
+    mean_hours: float
+
+class ResolutionStats(BaseModel):
+    resolved: int
+    mean_hours: Optional[float] = None
+    by_priority: Dict[str, PriorityResolution]
+
+class IssueStats(BaseModel):
+    total: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    by_district: Dict[str, int]
+    by_category: Dict[str, int]
+    by_day: List[DayCount]
+    resolution: ResolutionStats
@@ -0,0 +1,216 @@
+"""
+Full-text search over government schemes, training modules and success stories.
+
+Text is tokenized here rather than by the database: the stock tokenizers of
+SQLite FTS5 and PostgreSQL split Devanagari, Telugu and Tamil words at
+their vowel signs. A token is a run of letters, digits and combining marks.
+SQLite then stores the tokens in an FTS5 table with the ``ascii`` tokenizer
+(which leaves non-ASCII characters alone), and PostgreSQL stores them as a
+weighted tsvector. Both support ranked, prefix-matching queries, and both
+are updated in the same transaction as the source rows.
+"""
+from typing import Iterable, List, Optional, Sequence
+import unicodedata
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+
+SEARCHABLE = {
+    models.GovernmentScheme: "scheme",
+    models.TrainingModule: "training_module",
+    models.SuccessStory: "success_story",
+}
+DOC_TYPES = list(SEARCHABLE.values())
+
+MAX_BODY_CHARS = 20000
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """Lower-cased NFC tokens; zero-width joiners are dropped, other separators split."""
+    if not value:
+        return []
+    chars = []
+    for ch in unicodedata.normalize("NFC", value).casefold():
+        category = unicodedata.category(ch)
+        if category[0] in "LNM":
+            chars.append(ch)
+        elif category != "Cf":
+            chars.append(" ")
+    return "".join(chars).split()
+
+
+def _strings(value) -> Iterable[str]:
+    """Every string inside a JSON value."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def document_for(obj) -> Optional[dict]:
+    """Search document for a model instance, or None if it should not be searchable."""
+    if getattr(obj, "is_active", True) is False:
+        return None
+    parts = [obj.description or ""]
+    if isinstance(obj, models.GovernmentScheme):
+        parts += [obj.application_process or "", *_strings(obj.benefits), *_strings(obj.eligibility_criteria)]
+    elif isinstance(obj, models.TrainingModule):
+        parts += list(_strings(obj.content))
+    body = " ".join(parts)[:MAX_BODY_CHARS]
+    return {
+        "doc_type": SEARCHABLE[type(obj)],
+        "doc_id": obj.id,
+        "language": getattr(obj, "language", None),
+        "title": obj.title,
+        "title_tokens": tokenize(obj.title),
+        "body_tokens": tokenize(body),
+    }
+
+
+def create_search_tables(connection) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS search_documents ("
+            " id BIGSERIAL PRIMARY KEY, doc_type TEXT NOT NULL, doc_id TEXT NOT NULL,"
+            " language TEXT, title TEXT NOT NULL, document TSVECTOR NOT NULL,"
+            " UNIQUE (doc_type, doc_id))"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)"
+        ))
+        return
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS search_documents ("
+        " id INTEGER PRIMARY KEY, doc_type TEXT NOT NULL, doc_id TEXT NOT NULL,"
+        " language TEXT, title TEXT NOT NULL, UNIQUE (doc_type, doc_id))"
+    ))
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts"
+        " USING fts5(title, body, tokenize='ascii', prefix='2 3')"
+    ))
+
+
+def _remove(connection, doc_type: str, doc_id: str) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text("DELETE FROM search_documents WHERE doc_type = :doc_type AND doc_id = :doc_id"),
+            {"doc_type": doc_type, "doc_id": doc_id},
+        )
+        return
+    rowid = connection.execute(
+        text("SELECT id FROM search_documents WHERE doc_type = :doc_type AND doc_id = :doc_id"),
+        {"doc_type": doc_type, "doc_id": doc_id},
+    ).scalar()
+    if rowid is not None:
+        connection.execute(text("DELETE FROM search_fts WHERE rowid = :rowid"), {"rowid": rowid})
+        connection.execute(text("DELETE FROM search_documents WHERE id = :rowid"), {"rowid": rowid})
+
+
+def _index(connection, doc: dict) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "INSERT INTO search_documents (doc_type, doc_id, language, title, document)"
+            " VALUES (:doc_type, :doc_id, :language, :title,"
+            "  setweight(array_to_tsvector(CAST(:title_tokens AS text[])), 'A')"
+            "  || setweight(array_to_tsvector(CAST(:body_tokens AS text[])), 'B'))"
+            " ON CONFLICT (doc_type, doc_id) DO UPDATE SET"
+            " language = EXCLUDED.language, title = EXCLUDED.title, document = EXCLUDED.document"
+        ), doc)
+        return
+    _remove(connection, doc["doc_type"], doc["doc_id"])
+    rowid = connection.execute(
+        text(
+            "INSERT INTO search_documents (doc_type, doc_id, language, title)"
+            " VALUES (:doc_type, :doc_id, :language, :title) RETURNING id"
+        ),
+        doc,
+    ).scalar_one()
+    connection.execute(
+        text("INSERT INTO search_fts (rowid, title, body) VALUES (:rowid, :title, :body)"),
+        {"rowid": rowid, "title": " ".join(doc["title_tokens"]), "body": " ".join(doc["body_tokens"])},
+    )
+
+
+def index_object(connection, obj) -> None:
+    """Add, refresh or drop the search document of one model instance."""
+    doc = document_for(obj)
+    if doc is None:
+        _remove(connection, SEARCHABLE[type(obj)], obj.id)
+    else:
+        _index(connection, doc)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, flush_context):
+    changed = [obj for obj in (*session.new, *session.dirty) if type(obj) in SEARCHABLE]
+    deleted = [obj for obj in session.deleted if type(obj) in SEARCHABLE]
+    if not changed and not deleted:
+        return
+    connection = session.connection()
+    for obj in changed:
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        index_object(connection, obj)
+    for obj in deleted:
+        _remove(connection, SEARCHABLE[type(obj)], obj.id)
+
+
+def rebuild_search_index(db: Session, batch_size: int = 1000) -> int:
+    """Drop and recreate every search document. Returns the number indexed."""
+    connection = db.connection()
+    connection.execute(text("DELETE FROM search_documents"))
+    if connection.dialect.name != "postgresql":
+        connection.execute(text("DELETE FROM search_fts"))
+    indexed = 0
+    for model in SEARCHABLE:
+        for obj in db.query(model).yield_per(batch_size):
+            index_object(connection, obj)
+            indexed += 1
+    db.commit()
+    return indexed
+
+
+async def search(db: AsyncSession, query: str, doc_types: Sequence[str] = DOC_TYPES,
+                 language: Optional[str] = None, limit: int = 20) -> List[dict]:
+    """
+    Ranked documents matching every token of query, each as a prefix.
+    Documents without a language match any requested language.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    params = {"doc_types": list(doc_types), "language": language, "limit": limit}
+    language_filter = " AND (d.language = :language OR d.language IS NULL)" if language else ""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        params["query"] = " & ".join(f"'{token}':*" for token in tokens)
+        sql = (
+            "SELECT d.doc_type, d.doc_id, d.title, NULL AS snippet, ts_rank(d.document, q) AS score"
+            " FROM search_documents d, CAST(:query AS tsquery) q"
+            " WHERE d.document @@ q AND d.doc_type IN :doc_types" + language_filter +
+            " ORDER BY score DESC LIMIT :limit"
+        )
+    else:
+        params["query"] = " ".join(f'"{token}"*' for token in tokens)
+        sql = (
+            "SELECT d.doc_type, d.doc_id, d.title,"
+            f" snippet(search_fts, 1, '[', ']', '…', 12) AS snippet,"
+            f" -bm25(search_fts, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score"
+            " FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid"
+            " WHERE search_fts MATCH :query AND d.doc_type IN :doc_types" + language_filter +
+            " ORDER BY score DESC LIMIT :limit"
+        )
+    statement = text(sql).bindparams(bindparam("doc_types", expanding=True))
+    result = await db.execute(statement, params)
+    return [
+        {"type": doc_type, "id": doc_id, "title": title, "snippet": snippet, "score": score}
+        for doc_type, doc_id, title, snippet, score in result
+    ]
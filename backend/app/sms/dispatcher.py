@@ -0,0 +1,159 @@
+"""
+In-process queue for outbound SMS.
+
+Requests enqueue a message and return immediately; worker tasks drain the
+queue in batches, send them through the configured gateway and retry
+failures with exponential backoff.
+"""
+from enum import Enum
+from typing import List, Optional
+import asyncio
+import os
+import random
+from dotenv import load_dotenv
+
+from ..cache import TTLCache
+from .gateway import SMSGateway, SMSMessage, create_gateway
+
+load_dotenv()
+
+SMS_WORKERS = int(os.getenv("SMS_WORKERS", "4"))
+SMS_QUEUE_MAX_SIZE = int(os.getenv("SMS_QUEUE_MAX_SIZE", "10000"))
+SMS_BATCH_SIZE = int(os.getenv("SMS_BATCH_SIZE", "50"))
+SMS_BATCH_WAIT_MS = int(os.getenv("SMS_BATCH_WAIT_MS", "50"))
+SMS_MAX_ATTEMPTS = int(os.getenv("SMS_MAX_ATTEMPTS", "4"))
+SMS_RETRY_BASE_SECONDS = float(os.getenv("SMS_RETRY_BASE_SECONDS", "1"))
+SMS_STATUS_TTL_SECONDS = int(os.getenv("SMS_STATUS_TTL_SECONDS", "3600"))
+
+
+class DeliveryStatus(str, Enum):
+    QUEUED = "queued"
+    SENDING = "sending"
+    RETRYING = "retrying"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the dispatch queue cannot accept more messages."""
+
+
+class SMSDispatcher:
+    def __init__(self, gateway: SMSGateway, workers: int = SMS_WORKERS,
+                 max_queue_size: int = SMS_QUEUE_MAX_SIZE, batch_size: int = SMS_BATCH_SIZE,
+                 batch_wait_ms: int = SMS_BATCH_WAIT_MS, max_attempts: int = SMS_MAX_ATTEMPTS,
+                 retry_base_seconds: float = SMS_RETRY_BASE_SECONDS):
+        self.gateway = gateway
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.statuses = TTLCache(maxsize=max_queue_size * 10, ttl=SMS_STATUS_TTL_SECONDS)
+        self.counters = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "batches": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_handles = {}
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Give queued messages up to timeout seconds to drain, then cancel the workers."""
+        if self._queue is None:
+            return
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.gateway.close()
+        self._queue = None
+
+    def enqueue(self, to: str, body: str) -> str:
+        """Queue a message for delivery and return its id. Never waits on the gateway."""
+        if self._queue is None:
+            raise RuntimeError("SMS dispatcher is not running")
+        message = SMSMessage(to=to, body=body)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            raise QueueFullError("SMS queue is full")
+        self.statuses.set(message.id, DeliveryStatus.QUEUED)
+        self.counters["enqueued"] += 1
+        return message.id
+
+    def status(self, message_id: str) -> Optional[DeliveryStatus]:
+        return self.statuses.get(message_id)
+
+    def stats(self) -> dict:
+        return dict(self.counters, queued=self._queue.qsize() if self._queue else 0)
+
+    async def _next_batch(self) -> List[SMSMessage]:
+        """Wait for one message, then give others up to batch_wait seconds to join it."""
+        batch = [await self._queue.get()]
+        if self._queue.qsize() < self.batch_size - 1:
+            await asyncio.sleep(self.batch_wait)
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._send(batch)
+            except Exception as e:
+                print(f"SMS batch failed: {e}")
+                for message in batch:
+                    self._retry_or_fail(message, retryable=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, batch: List[SMSMessage]) -> None:
+        for message in batch:
+            message.attempts += 1
+            self.statuses.set(message.id, DeliveryStatus.SENDING)
+        self.counters["batches"] += 1
+        results = {r.message_id: r for r in await self.gateway.send_batch(batch)}
+        for message in batch:
+            result = results.get(message.id)
+            if result is not None and result.ok:
+                self.statuses.set(message.id, DeliveryStatus.SENT)
+                self.counters["sent"] += 1
+            else:
+                self._retry_or_fail(message, retryable=result is None or result.retryable)
+
+    def _retry_or_fail(self, message: SMSMessage, retryable: bool) -> None:
+        if not retryable or message.attempts >= self.max_attempts:
+            self.statuses.set(message.id, DeliveryStatus.FAILED)
+            self.counters["failed"] += 1
+            return
+        # Exponential backoff with full jitter
+        delay = random.uniform(0, self.retry_base_seconds * 2 ** (message.attempts - 1))
+        self.statuses.set(message.id, DeliveryStatus.RETRYING)
+        self.counters["retried"] += 1
+        loop = asyncio.get_running_loop()
+        self._retry_handles[message.id] = loop.call_later(delay, self._requeue, message)
+
+    def _requeue(self, message: SMSMessage) -> None:
+        self._retry_handles.pop(message.id, None)
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.statuses.set(message.id, DeliveryStatus.FAILED)
+            self.counters["failed"] += 1
+
+
+sms_dispatcher = SMSDispatcher(create_gateway())
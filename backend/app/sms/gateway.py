@@ -0,0 +1,112 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional
+import asyncio
+import os
+import random
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SMS_GATEWAY = os.getenv("SMS_GATEWAY", "fake")
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER")
+
+
+@dataclass
+class SMSMessage:
+    to: str
+    body: str
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    attempts: int = 0
+
+
+@dataclass
+class DeliveryResult:
+    message_id: str
+    ok: bool
+    provider_id: Optional[str] = None
+    error: Optional[str] = None
+    retryable: bool = True
+
+
+class SMSGateway(ABC):
+    """Interface for outbound SMS providers. Implementations send a whole batch per call."""
+
+    @abstractmethod
+    async def send_batch(self, messages: List[SMSMessage]) -> List[DeliveryResult]:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeSMSGateway(SMSGateway):
+    """
+    Local gateway for development and load tests. Prints messages instead of
+    sending them, with optional simulated latency and failure rate. The last
+    max_sent messages are kept in ``sent``.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, echo: bool = True,
+                 max_sent: int = 1000):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.echo = echo
+        self.sent: Deque[SMSMessage] = deque(maxlen=max_sent)
+
+    async def send_batch(self, messages):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        results = []
+        for message in messages:
+            if random.random() < self.failure_rate:
+                results.append(DeliveryResult(message.id, ok=False, error="simulated failure"))
+                continue
+            if self.echo:
+                print(f"SMS to {message.to}: {message.body}")  # For development only
+            self.sent.append(message)
+            results.append(DeliveryResult(message.id, ok=True, provider_id=f"fake-{message.id}"))
+        return results
+
+
+class TwilioSMSGateway(SMSGateway):
+    """
+    Twilio gateway. Twilio has no batch endpoint and its client is blocking,
+    so a batch is sent as concurrent calls on worker threads.
+    """
+
+    def __init__(self, account_sid: str = TWILIO_ACCOUNT_SID, auth_token: str = TWILIO_AUTH_TOKEN,
+                 from_number: str = TWILIO_FROM_NUMBER):
+        from twilio.rest import Client
+
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def _send(self, message: SMSMessage) -> DeliveryResult:
+        from twilio.base.exceptions import TwilioRestException
+
+        try:
+            sent = self.client.messages.create(to=message.to, from_=self.from_number, body=message.body)
+        except TwilioRestException as e:
+            # 4xx responses (bad number, blocked recipient) will not succeed on retry
+            retryable = e.status is None or e.status >= 500 or e.status == 429
+            return DeliveryResult(message.id, ok=False, error=str(e.msg), retryable=retryable)
+        except Exception as e:
+            return DeliveryResult(message.id, ok=False, error=str(e))
+        return DeliveryResult(message.id, ok=True, provider_id=sent.sid)
+
+    async def send_batch(self, messages):
+        return await asyncio.gather(*(asyncio.to_thread(self._send, m) for m in messages))
+
+
+def create_gateway(name: str = SMS_GATEWAY) -> SMSGateway:
+    """Build the SMS gateway configured by SMS_GATEWAY."""
+    if name == "fake":
+        return FakeSMSGateway()
+    if name == "twilio":
+        return TwilioSMSGateway()
+    raise ValueError(f"Unknown SMS_GATEWAY: {name}")
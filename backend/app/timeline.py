@@ -0,0 +1,127 @@
+"""
+Issue timelines.
+
+Issue.update_count and Issue.last_update_at summarize an issue's status
+history, so issue lists never have to touch issue_updates. They are updated
+in the same transaction as the IssueUpdate rows they count, with atomic
+increments, so concurrent updates to one issue are all counted.
+rebuild_update_counts() recomputes them from scratch.
+
+timeline_options() loads an issue with its reporter, assignee and every
+update with its author in two queries, however long the history is.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import bindparam, case, event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import models
+
+_SUMMARY = ("update_count", "last_update_at", "updated_at")
+
+
+def timeline_options() -> tuple:
+    """Loader options for an issue's full timeline; use with select(models.Issue).options(*timeline_options())."""
+    return (
+        joinedload(models.Issue.reported_by_user),
+        joinedload(models.Issue.assigned_to_user),
+        selectinload(models.Issue.updates).joinedload(models.IssueUpdate.created_by_user),
+    )
+
+
+def _latest_update():
+    update_row = models.IssueUpdate
+    return (
+        select(func.max(update_row.created_at))
+        .where(update_row.issue_id == models.Issue.__table__.c.id)
+        .scalar_subquery()
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_issue_updates(session, flush_context):
+    added: Dict[str, list] = defaultdict(lambda: [0, None])
+    removed: Dict[str, int] = defaultdict(int)
+    for obj in session.new:
+        if isinstance(obj, models.IssueUpdate):
+            entry = added[obj.issue_id]
+            entry[0] += 1
+            # created_at comes back from the INSERT where the database supports RETURNING
+            created_at = inspect(obj).dict.get("created_at") or datetime.utcnow()
+            entry[1] = created_at if entry[1] is None else max(entry[1], created_at)
+    for obj in session.deleted:
+        if isinstance(obj, models.IssueUpdate):
+            removed[obj.issue_id] += 1
+    if not (added or removed):
+        return
+
+    connection = session.connection()
+    issue = models.Issue.__table__
+    if added:
+        at = bindparam("at")
+        connection.execute(
+            update(issue)
+            .where(issue.c.id == bindparam("issue_id"))
+            .values(
+                update_count=issue.c.update_count + bindparam("added"),
+                last_update_at=case(
+                    (or_(issue.c.last_update_at.is_(None), issue.c.last_update_at < at), at),
+                    else_=issue.c.last_update_at,
+                ),
+            ),
+            [{"issue_id": issue_id, "added": count, "at": at} for issue_id, (count, at) in added.items()],
+        )
+    if removed:
+        connection.execute(
+            update(issue)
+            .where(issue.c.id == bindparam("issue_id"))
+            .values(update_count=issue.c.update_count - bindparam("removed"), last_update_at=_latest_update()),
+            [{"issue_id": issue_id, "removed": count} for issue_id, count in removed.items()],
+        )
+
+    # Refresh issues loaded in this session, so nothing has to lazy-load the new values
+    loaded = {}
+    for issue_id in {*added, *removed}:
+        obj = session.identity_map.get(session.identity_key(models.Issue, issue_id))
+        if obj is not None:
+            loaded[issue_id] = obj
+    if loaded:
+        columns = [issue.c.id, *(issue.c[name] for name in _SUMMARY)]
+        for row in connection.execute(select(*columns).where(issue.c.id.in_(loaded))):
+            for name in _SUMMARY:
+                set_committed_value(loaded[row.id], name, row._mapping[name])
+
+
+def rebuild_update_counts(db: Session, batch_size: int = 5000) -> int:
+    """
+    Recompute update_count and last_update_at of every issue from its updates.
+
+    Used to backfill issues written before the columns existed; updated_at is
+    left alone so offline clients do not re-download every issue. Returns the
+    number of issues processed.
+    """
+    issue = models.Issue.__table__
+    counts = (
+        select(func.count(models.IssueUpdate.id))
+        .where(models.IssueUpdate.issue_id == issue.c.id)
+        .scalar_subquery()
+    )
+    processed = 0
+    last_id = None
+    while True:
+        query = select(issue.c.id).order_by(issue.c.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(issue.c.id > last_id)
+        ids = list(db.execute(query).scalars())
+        if not ids:
+            return processed
+        db.execute(
+            update(issue)
+            .where(issue.c.id >= ids[0], issue.c.id <= ids[-1])
+            .values(update_count=counts, last_update_at=_latest_update(), updated_at=issue.c.updated_at)
+        )
+        db.commit()
+        processed += len(ids)
+        last_id = ids[-1]
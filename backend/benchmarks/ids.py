@@ -0,0 +1,102 @@
+"""
+Compare primary key formats on SQLite: random UUID4 text (the old format),
+time-ordered UUIDv7 text, and UUIDv7 as 16-byte blobs (models.CompactUUID).
+
+Run from the backend directory:
+
+    python -m benchmarks.ids [--rows 500000] [--chunk-size 5000]
+
+Each format gets a fresh database file with an issues-like table: a primary
+key, an indexed foreign key and a (created_at, id) listing index. The script
+reports insert throughput, file size and point lookups by primary key.
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, create_engine, insert, select
+
+from app.models import CompactUUID, generate_uuid
+
+FORMATS = {
+    "uuid4 text": (String, lambda: str(uuid.uuid4())),
+    "uuid7 text": (String, generate_uuid),
+    "uuid7 blob": (CompactUUID, generate_uuid),
+}
+
+
+def make_table(key_type) -> Table:
+    metadata = MetaData()
+    return Table(
+        "items", metadata,
+        Column("id", key_type, primary_key=True),
+        Column("parent_id", key_type, index=True),
+        Column("title", String(100)),
+        Column("created_at", DateTime),
+        Index("ix_items_created_at_id", "created_at", "id"),
+    )
+
+
+def run(name: str, rows: int, chunk_size: int, directory: str) -> dict:
+    key_type, new_id = FORMATS[name]
+    path = os.path.join(directory, name.replace(" ", "_") + ".db")
+    engine = create_engine(f"sqlite:///{path}")
+    table = make_table(key_type)
+    table.metadata.create_all(engine)
+    parents = [new_id() for _ in range(1000)]
+    start = datetime(2024, 1, 1)
+    ids = []
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        for offset in range(0, rows, chunk_size):
+            chunk = []
+            for i in range(offset, min(rows, offset + chunk_size)):
+                row_id = new_id()
+                ids.append(row_id)
+                chunk.append({
+                    "id": row_id,
+                    "parent_id": random.choice(parents),
+                    "title": f"Issue {i}",
+                    "created_at": start + timedelta(seconds=i),
+                })
+            connection.execute(insert(table), chunk)
+            connection.commit()
+    insert_seconds = time.perf_counter() - started
+
+    sample = random.sample(ids, min(5000, len(ids)))
+    with engine.connect() as connection:
+        started = time.perf_counter()
+        for row_id in sample:
+            connection.execute(select(table.c.title).where(table.c.id == row_id)).one()
+        lookup_seconds = time.perf_counter() - started
+    engine.dispose()
+    return {
+        "format": name,
+        "rows_per_second": rows / insert_seconds,
+        "size_mb": os.path.getsize(path) / 1e6,
+        "lookup_us": lookup_seconds / len(sample) * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    random.seed(0)
+    print(f"{'format':<12}{'rows/s':>10}{'size MB':>10}{'lookup us':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in FORMATS:
+            result = run(name, args.rows, args.chunk_size, directory)
+            print(
+                f"{result['format']:<12}{result['rows_per_second']:>10.0f}"
+                f"{result['size_mb']:>10.1f}{result['lookup_us']:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
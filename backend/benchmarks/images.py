@@ -0,0 +1,99 @@
+"""
+Size and rendering cost of success-story image variants.
+
+Run from the backend directory:
+
+    python -m benchmarks.images [--images 8] [--width 3000] [--height 2250]
+
+Uploads --images synthetic photos (texture at several scales, which
+compresses about as well as a real field photo) through the ASGI app into
+a temporary image store and waits for their variants. It then prints the
+average size of each variant next to the original, and how long a story
+feed of IMAGE_FEED_WIDTH WebP thumbnails takes to download at 2G speed
+(about 50 kbit/s) compared with the full-size photos.
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import tempfile
+import time
+
+# Keep the benchmark's images out of the API's real store
+os.environ["IMAGE_STORE_DIR"] = tempfile.mkdtemp()
+
+import httpx
+from PIL import Image
+
+from app.auth.utils import create_access_token
+from app.database import AsyncSessionLocal, init_db
+from app.images.jobs import image_service
+from app.images.store import IMAGE_FEED_WIDTH
+from app.main import app
+from app.models import User, UserRole, generate_uuid
+
+TWO_G_BYTES_PER_SECOND = 50_000 / 8
+FEED_SIZE = 10
+
+
+def synthetic_photo(seed: int, width: int, height: int) -> bytes:
+    rng = random.Random(seed)
+    photo = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    for scale, weight in ((64, 0.5), (8, 0.3), (1, 0.08)):
+        size = (max(1, width // scale), max(1, height // scale))
+        noise = Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+        photo = Image.blend(photo, noise.resize((width, height), Image.Resampling.BICUBIC), weight)
+    out = io.BytesIO()
+    photo.save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+async def benchmark_user() -> str:
+    async with AsyncSessionLocal() as db:
+        user = User(id=generate_uuid(), phone_number=f"5{random.randrange(10 ** 9):09d}", role=UserRole.FARMER)
+        db.add(user)
+        await db.commit()
+    return create_access_token({"sub": user.id})
+
+
+async def main(args) -> None:
+    init_db()
+    photos = [synthetic_photo(seed, args.width, args.height) for seed in range(args.images)]
+    headers = {"Authorization": f"Bearer {await benchmark_user()}", "Content-Type": "image/jpeg"}
+    transport = httpx.ASGITransport(app=app)
+    image_service.start()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            started = time.perf_counter()
+            ids = []
+            for photo in photos:
+                response = await client.post("/api/images", content=photo, headers=headers)
+                response.raise_for_status()
+                ids.append(response.json()["id"])
+            uploaded = time.perf_counter() - started
+            await asyncio.gather(*(image_service.submit(image_id) for image_id in ids))
+            rendered = time.perf_counter() - started
+    finally:
+        await image_service.stop()
+
+    print(f"{args.images} uploads of {args.width}x{args.height}: {uploaded * 1000 / args.images:.1f} ms each; "
+          f"variants ready after {rendered:.2f}s with {image_service.workers} workers")
+    original = sum(len(photo) for photo in photos) / len(photos)
+    print(f"{'variant':<12}{'avg KB':>9}{'of original':>13}")
+    print(f"{'original':<12}{original / 1024:>9.1f}{'100%':>13}")
+    sizes = {}
+    for name in image_service.variant_names():
+        sizes[name] = sum(os.path.getsize(image_service.store.variant_path(i, name)) for i in ids) / len(ids)
+        print(f"{name:<12}{sizes[name] / 1024:>9.1f}{sizes[name] / original:>13.1%}")
+    thumbnail = sizes[f"{IMAGE_FEED_WIDTH}.webp"]
+    print(f"Feed of {FEED_SIZE} photos at 2G: {FEED_SIZE * original / TWO_G_BYTES_PER_SECOND:.0f}s full size, "
+          f"{FEED_SIZE * thumbnail / TWO_G_BYTES_PER_SECOND:.1f}s as thumbnails")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2250)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""
+Throughput of the WhatsApp/IVR ingestion pipeline.
+
+Run from the backend directory against a scratch database:
+
+    python -m benchmarks.inbound [--messages 5000] [--senders 500] [--concurrency 50] [--batch-sizes 1 50 200]
+
+For each batch size the script posts --messages WhatsApp webhooks from
+--senders numbers through the ASGI app, measuring how fast they are
+acknowledged, then drains the queue into issues and issue updates with the
+processor at that batch size. Batch size 1, a commit per message, is how
+the messages would be applied if each webhook wrote to the database itself.
+Every run uses new numbers, so each creates the same mix of users, issues
+and updates. The queue lives in a temporary file.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# Keep the benchmark's messages out of the API's real queue
+os.environ["INBOUND_QUEUE_PATH"] = os.path.join(tempfile.mkdtemp(), "inbound_queue.db")
+
+import httpx
+
+from app.database import init_db
+from app.inbound.processor import InboundProcessor, inbound_queue
+from app.main import app
+from benchmarks.load import percentile
+
+PHONE_START = 6000000000
+
+
+async def post_webhooks(client: httpx.AsyncClient, run: int, messages: int, senders: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = iter(range(messages))
+
+    async def worker():
+        for i in remaining:
+            data = {
+                "MessageSid": f"SMbench{run:03d}{i:08d}",
+                "From": f"whatsapp:+91{PHONE_START + run * 100000 + i % senders}",
+                "Body": f"Pest attack on field {i}\nLeaves turning yellow",
+            }
+            started = time.perf_counter()
+            response = await client.post("/api/webhooks/twilio/whatsapp", data=data)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {"acks_per_second": messages / elapsed, "p95_ms": percentile(latencies, 95) * 1000}
+
+
+async def main(args) -> None:
+    init_db()
+    print(f"{'batch':>6}{'acks/s':>10}{'ack p95 ms':>12}{'applied/s':>11}{'commits':>9}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for run, batch_size in enumerate(args.batch_sizes):
+            acks = await post_webhooks(client, run, args.messages, args.senders, args.concurrency)
+            processor = InboundProcessor(inbound_queue, batch_size=batch_size)
+            started = time.perf_counter()
+            await processor.drain()
+            elapsed = time.perf_counter() - started
+            if processor.counters["applied"] != args.messages:
+                raise SystemExit(f"Applied {processor.counters['applied']} of {args.messages} messages")
+            print(
+                f"{batch_size:>6}{acks['acks_per_second']:>10.0f}{acks['p95_ms']:>12.2f}"
+                f"{args.messages / elapsed:>11.0f}{processor.counters['batches']:>9}"
+            )
+    inbound_queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--senders", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 50, 200])
+    asyncio.run(main(parser.parse_args()))
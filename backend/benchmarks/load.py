@@ -0,0 +1,262 @@
+"""
+In-process load scenarios against the ASGI app.
+
+Run from the backend directory against a seeded database (see
+benchmarks/seed.py):
+
+    python -m benchmarks.load --requests 2000 --concurrency 50
+    python -m benchmarks.load --output results.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load --baseline benchmarks/baseline.json --max-regression 0.2
+
+Requests go through httpx's ASGI transport, so the numbers cover routing,
+dependencies, database access and serialization but not the network or the
+server's HTTP parsing. Each scenario runs its requests from a fixed number of
+concurrent clients and reports latency percentiles and throughput. With
+--baseline, the run exits with status 1 if any scenario's p95 latency or
+throughput is worse than the stored baseline by more than --max-regression.
+"""
+from typing import Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+from sqlalchemy import select
+
+# Every benchmark request comes from one address; keep the per-IP OTP limit out of the way
+os.environ.setdefault("OTP_IP_PER_MINUTE", "0")
+
+from app import models
+from app.auth.cache import user_cache
+from app.database import SessionLocal
+from app.main import app
+from app.sms.dispatcher import sms_dispatcher
+from app.sms.gateway import FakeSMSGateway
+
+# Phone numbers used by the OTP scenario; kept clear of the seeded range
+OTP_PHONE_START = 7000000000
+# The number otp_flood hammers, and how many requests it sends per timed flow
+FLOOD_PHONE = str(OTP_PHONE_START - 3)
+FLOOD_REQUESTS = 10
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(name: str, latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3)
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+async def login(client: httpx.AsyncClient, phone_number: str) -> str:
+    response = await client.post("/api/auth/send-otp", json={"phone_number": phone_number})
+    response.raise_for_status()
+    response = await client.post(
+        "/api/auth/verify-otp", json={"phone_number": phone_number, "otp": response.json()["otp"]}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def phone_with_role(role: models.UserRole) -> Optional[str]:
+    with SessionLocal() as db:
+        return db.execute(
+            select(models.User.phone_number).where(models.User.role == role, models.User.is_active.is_(True)).limit(1)
+        ).scalar()
+
+
+def ensure_admin_phone() -> str:
+    """A phone number of an active NGO admin, promoting a user if the database has none."""
+    phone_number = phone_with_role(models.UserRole.NGO_ADMIN)
+    if phone_number:
+        return phone_number
+    phone_number = str(OTP_PHONE_START - 1)
+    with SessionLocal() as db:
+        user = db.execute(select(models.User).where(models.User.phone_number == phone_number)).scalar()
+        if user is None:
+            user = models.User(phone_number=phone_number, name="Benchmark admin", is_active=True)
+            db.add(user)
+        user.role = models.UserRole.NGO_ADMIN
+        db.commit()
+    user_cache.clear()
+    return phone_number
+
+
+class Scenarios:
+    """Each scenario makes one logical request (or flow) per call and returns its final response."""
+
+    def __init__(self, client: httpx.AsyncClient, farmer_token: str, admin_token: str):
+        self.client = client
+        self.farmer = {"Authorization": f"Bearer {farmer_token}"}
+        self.admin = {"Authorization": f"Bearer {admin_token}"}
+        self.next_phone = OTP_PHONE_START
+
+    async def otp_flow(self) -> httpx.Response:
+        phone_number = str(self.next_phone)
+        self.next_phone += 1
+        response = await self.client.post("/api/auth/send-otp", json={"phone_number": phone_number})
+        if response.status_code != 200:
+            return response
+        return await self.client.post(
+            "/api/auth/verify-otp", json={"phone_number": phone_number, "otp": response.json()["otp"]}
+        )
+
+    async def otp_flood(self) -> httpx.Response:
+        """otp_flow while send-otp is flooded for another number; the flood is shed, the flow should not slow down."""
+        flood = [
+            self.client.post("/api/auth/send-otp", json={"phone_number": FLOOD_PHONE})
+            for _ in range(FLOOD_REQUESTS)
+        ]
+        responses = await asyncio.gather(self.otp_flow(), *flood)
+        return responses[0]
+
+    async def auth_me(self) -> httpx.Response:
+        return await self.client.get("/api/auth/me", headers=self.farmer)
+
+    async def issues_list(self) -> httpx.Response:
+        params = {"limit": 50}
+        if random.random() < 0.5:
+            params["status"] = random.choice([s.value for s in models.IssueStatus])
+        return await self.client.get("/api/issues", params=params, headers=self.farmer)
+
+    async def users_list(self) -> httpx.Response:
+        return await self.client.get("/api/users", params={"limit": 50}, headers=self.admin)
+
+    async def schemes(self) -> httpx.Response:
+        return await self.client.get("/api/schemes")
+
+    def get(self, name: str) -> Callable[[], Awaitable[httpx.Response]]:
+        return getattr(self, name)
+
+
+SCENARIOS = ["otp_flow", "otp_flood", "auth_me", "issues_list", "users_list", "schemes"]
+
+
+async def run_scenario(name: str, call: Callable[[], Awaitable[httpx.Response]],
+                       requests: int, concurrency: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await call()
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await call()
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, latencies, errors, time.perf_counter() - started)
+
+
+def regressions(results: List[dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    failures = []
+    for result in results:
+        base = baseline.get(result["scenario"])
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            failures.append(f"{result['scenario']}: p95 {result['p95_ms']:.2f} ms vs baseline {base['p95_ms']:.2f} ms")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            failures.append(
+                f"{result['scenario']}: {result['throughput']:.0f} req/s vs baseline {base['throughput']:.0f} req/s"
+            )
+        if result["errors"] > base.get("errors", 0):
+            failures.append(f"{result['scenario']}: {result['errors']} errors vs baseline {base.get('errors', 0)}")
+    return failures
+
+
+def print_report(results: List[dict]) -> None:
+    print(f"{'scenario':<14}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for r in results:
+        print(
+            f"{r['scenario']:<14}{r['requests']:>9}{r['errors']:>8}{r['throughput']:>9.0f}"
+            f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['max_ms']:>9.2f}"
+        )
+
+
+async def main(args) -> int:
+    async with app.router.lifespan_context(app):
+        if isinstance(sms_dispatcher.gateway, FakeSMSGateway):
+            sms_dispatcher.gateway.echo = args.echo_sms
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            farmer_phone = phone_with_role(models.UserRole.FARMER) or str(OTP_PHONE_START - 2)
+            scenarios = Scenarios(client, await login(client, farmer_phone), await login(client, ensure_admin_phone()))
+            results = []
+            for name in args.scenarios:
+                results.append(await run_scenario(
+                    name, scenarios.get(name), args.requests, args.concurrency, args.warmup
+                ))
+                if isinstance(sms_dispatcher.gateway, FakeSMSGateway):
+                    sms_dispatcher.gateway.sent.clear()
+
+    print_report(results)
+    report = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "scenarios": {r["scenario"]: r for r in results},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["scenarios"]
+        failures = regressions(results, baseline, args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            return 1
+        print(f"No regressions beyond {args.max_regression:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests before each scenario")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against a results file and fail on regressions")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="allowed fractional increase in p95 or drop in throughput")
+    parser.add_argument("--save-baseline", help="write results as the new baseline")
+    parser.add_argument("--echo-sms", action="store_true", help="let the fake SMS gateway print messages")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,212 @@
+"""
+Seed the database configured by DATABASE_URL with synthetic data.
+
+Run from the backend directory:
+
+    python -m benchmarks.seed --users 1000000 --issues-per-user 2 --updates-per-issue 2
+
+Rows are written with bulk executemany inserts in chunks, which bypasses the
+ORM hooks. The derived tables (map tiles, analytics rollups, crop index)
+are therefore rebuilt at the end unless --skip-rebuild is given. Schemes and
+training modules are few and go through the ORM, so they are indexed for
+search as they are added.
+"""
+from datetime import datetime, timedelta
+import argparse
+import random
+import time
+
+from sqlalchemy import insert
+
+from app import models
+from app.analytics import rebuild_issue_rollups
+from app.crops import rebuild_crop_index
+from app.database import SessionLocal, engine, init_db
+from app.geo.clusters import rebuild_tile_counts
+from app.search.index import create_search_tables
+
+LANGUAGES = ["en", "hi", "te", "ta"]
+PLACES = [
+    ("Andhra Pradesh", ["Guntur", "Krishna", "Kurnool", "Anantapur", "Chittoor"]),
+    ("Telangana", ["Warangal", "Karimnagar", "Nalgonda", "Khammam"]),
+    ("Tamil Nadu", ["Madurai", "Thanjavur", "Coimbatore", "Salem"]),
+    ("Uttar Pradesh", ["Varanasi", "Agra", "Meerut", "Gorakhpur"]),
+]
+CROPS = ["paddy", "wheat", "cotton", "chilli", "maize", "sugarcane", "groundnut", "turmeric", "banana", "tomato"]
+CATEGORIES = ["pest", "disease", "water", "soil", "market", "weather", None]
+STATUS_WEIGHTS = [(models.IssueStatus.REPORTED, 5), (models.IssueStatus.IN_PROGRESS, 2),
+                  (models.IssueStatus.RESOLVED, 3), (models.IssueStatus.CLOSED, 1)]
+# Rough bounding box of India
+LAT_RANGE = (8.0, 30.0)
+LON_RANGE = (70.0, 88.0)
+
+
+def _weighted(pairs):
+    values, weights = zip(*pairs)
+    return random.choices(values, weights)[0]
+
+
+def _timestamp(now: datetime, days: int) -> datetime:
+    return (now - timedelta(seconds=random.randrange(days * 86400))).replace(microsecond=0)
+
+
+class Seeder:
+    def __init__(self, chunk_size: int, days: int):
+        self.chunk_size = chunk_size
+        self.days = days
+        self.now = datetime.utcnow()
+        self.counts = {}
+
+    def write(self, db, model, rows: list, force: bool = False) -> None:
+        if rows and (force or len(rows) >= self.chunk_size):
+            db.execute(insert(model), rows)
+            db.commit()
+            self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+            rows.clear()
+
+    def users(self, db, count: int, phone_start: int) -> list:
+        """Insert users and farmer profiles; returns (user id, created_at) of the farmers."""
+        farmers = []
+        users, profiles = [], []
+        for i in range(count):
+            user_id = models.generate_uuid()
+            role = models.UserRole.FARMER
+            roll = random.random()
+            if roll < 0.001:
+                role = models.UserRole.NGO_ADMIN
+            elif roll < 0.01:
+                role = models.UserRole.VLE
+            created_at = _timestamp(self.now, self.days)
+            users.append({
+                "id": user_id,
+                "phone_number": str(phone_start + i),
+                "name": f"Farmer {i}",
+                "role": role,
+                "language": random.choice(LANGUAGES),
+                "is_active": True,
+                "created_at": created_at,
+            })
+            if role == models.UserRole.FARMER:
+                state, districts = random.choice(PLACES)
+                profiles.append({
+                    "id": models.generate_uuid(),
+                    "user_id": user_id,
+                    "village": f"Village {random.randrange(5000)}",
+                    "district": random.choice(districts),
+                    "state": state,
+                    "pincode": str(random.randrange(500000, 640000)),
+                    "land_area": round(random.lognormvariate(0.7, 0.8), 2),
+                    "crops": random.sample(CROPS, random.randint(1, 3)),
+                })
+                farmers.append((user_id, created_at))
+            self.write(db, models.User, users)
+            if not users:
+                self.write(db, models.FarmerProfile, profiles, force=True)
+        self.write(db, models.User, users, force=True)
+        self.write(db, models.FarmerProfile, profiles, force=True)
+        return farmers
+
+    def issues(self, db, farmers: list, per_user: float, updates_per_issue: float) -> None:
+        total = int(len(farmers) * per_user)
+        issues, updates = [], []
+        for _ in range(total):
+            reporter, joined = random.choice(farmers)
+            issue_id = models.generate_uuid()
+            created_at = joined + (self.now - joined) * random.random()
+            created_at = created_at.replace(microsecond=0)
+            location = {
+                "type": "Point",
+                "coordinates": [round(random.uniform(*LON_RANGE), 5), round(random.uniform(*LAT_RANGE), 5)],
+            }
+            issue_status = _weighted(STATUS_WEIGHTS)
+            issues.append({
+                "id": issue_id,
+                "title": f"{random.choice(CROPS).title()} {random.choice(['wilting', 'leaf spots', 'pests', 'low yield'])}",
+                "description": "Synthetic issue generated for benchmarking.",
+                "category": random.choice(CATEGORIES),
+                "status": issue_status,
+                "priority": random.choice(list(models.IssuePriority)),
+                "location": location,
+                "reported_by": reporter,
+                "created_at": created_at,
+                "updated_at": created_at,
+                **models.LocatedMixin.point_columns(location),
+            })
+            n_updates = int(updates_per_issue) + (random.random() < updates_per_issue % 1)
+            at = created_at
+            for k in range(n_updates):
+                at = min(self.now, at + timedelta(hours=random.randint(1, 240)))
+                last = k == n_updates - 1
+                updates.append({
+                    "id": models.generate_uuid(),
+                    "issue_id": issue_id,
+                    "status": issue_status if last else models.IssueStatus.IN_PROGRESS,
+                    "notes": "Synthetic update",
+                    "created_by": reporter,
+                    "created_at": at,
+                })
+            issues[-1].update(updated_at=at, update_count=n_updates, last_update_at=at if n_updates else None)
+            self.write(db, models.Issue, issues)
+            if not issues:
+                self.write(db, models.IssueUpdate, updates, force=True)
+        self.write(db, models.Issue, issues, force=True)
+        self.write(db, models.IssueUpdate, updates, force=True)
+
+    def content(self, db, schemes: int, modules: int) -> None:
+        for i in range(schemes):
+            state, _ = random.choice(PLACES)
+            db.add(models.GovernmentScheme(
+                title=f"{random.choice(CROPS).title()} support scheme {i}",
+                description="Financial assistance and inputs for eligible farmers.",
+                eligibility_criteria={"states": [state], "crops": random.sample(CROPS, 2), "max_land_area": 5},
+                benefits={"amount": random.randrange(1000, 20000, 500)},
+            ))
+        for i in range(modules):
+            db.add(models.TrainingModule(
+                title=f"{random.choice(CROPS).title()} cultivation practices {i}",
+                description="Step by step guidance for better yields.",
+                duration_minutes=random.randrange(10, 90),
+                language=random.choice(LANGUAGES),
+            ))
+        db.commit()
+        self.counts["government_schemes"] = schemes
+        self.counts["training_modules"] = modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--issues-per-user", type=float, default=2.0)
+    parser.add_argument("--updates-per-issue", type=float, default=1.5)
+    parser.add_argument("--schemes", type=int, default=200)
+    parser.add_argument("--training-modules", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365, help="spread creation times over this many days")
+    parser.add_argument("--phone-start", type=int, default=6000000000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-rebuild", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    init_db()
+    with engine.begin() as connection:
+        create_search_tables(connection)
+    seeder = Seeder(args.chunk_size, args.days)
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        farmers = seeder.users(db, args.users, args.phone_start)
+        seeder.issues(db, farmers, args.issues_per_user, args.updates_per_issue)
+        seeder.content(db, args.schemes, args.training_modules)
+        if not args.skip_rebuild:
+            print("Rebuilding derived tables...")
+            rebuild_tile_counts(db)
+            rebuild_issue_rollups(db)
+            rebuild_crop_index(db)
+    elapsed = time.perf_counter() - started
+    for table, count in seeder.counts.items():
+        print(f"{table:<20}{count:>12,}")
+    print(f"Seeded in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
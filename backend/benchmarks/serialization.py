@@ -0,0 +1,112 @@
+"""
+Compare the default Pydantic response path with the orjson fast path.
+
+Run from the backend directory:
+
+    python -m benchmarks.serialization [--sizes 100 1000 10000] [--repeat 5]
+
+Both paths serialize the same pages of unsaved ORM rows exactly as the API
+would. The script checks that their JSON is identical, then reports the best
+time per page and per row.
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app import models, schemas
+from app.serialization import FastJSONResponse, dump_rows
+
+CASES = {
+    "issues": (schemas.IssuePage, schemas.IssueResponse),
+    "users": (schemas.UserPage, schemas.UserResponse),
+}
+
+
+def make_issue(i: int) -> models.Issue:
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)
+    return models.Issue(
+        id=models.generate_uuid(),
+        title=f"Leaf curl on chilli plot {i}",
+        description="Leaves curling upwards, white flies seen under the leaves. " * 3,
+        category=random.choice(["pest", "disease", "water", None]),
+        location={"type": "Point", "coordinates": [80.4 + i * 1e-4, 16.3]},
+        priority=random.choice(list(models.IssuePriority)),
+        status=random.choice(list(models.IssueStatus)),
+        reported_by=models.generate_uuid(),
+        assigned_to=random.choice([None, models.generate_uuid()]),
+        created_at=created,
+        updated_at=created + timedelta(hours=1),
+        update_count=i % 4,
+        last_update_at=created + timedelta(hours=1) if i % 4 else None,
+    )
+
+
+def make_user(i: int) -> models.User:
+    return models.User(
+        id=models.generate_uuid(),
+        phone_number=f"9{i:09d}",
+        name=f"Farmer {i}",
+        role=models.UserRole.FARMER,
+        language=random.choice(["en", "hi", "te", "ta"]),
+        is_active=True,
+        created_at=datetime(2024, 1, 1) + timedelta(seconds=i),
+        updated_at=None,
+    )
+
+
+FACTORIES = {"issues": make_issue, "users": make_user}
+
+
+async def pydantic_body(field, page: dict) -> bytes:
+    """What FastAPI does with a response_model: validate, encode, render."""
+    content = await serialize_response(field=field, response_content=page)
+    return JSONResponse(content).body
+
+
+def fast_body(page: dict, schema) -> bytes:
+    return FastJSONResponse({**page, "items": dump_rows(page["items"], schema)}).body
+
+
+async def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def main(sizes, repeat: int) -> None:
+    print(f"{'case':<8}{'rows':>8}{'pydantic ms':>14}{'fast ms':>10}{'speedup':>9}{'us/row fast':>13}")
+    for name, (page_schema, row_schema) in CASES.items():
+        field = create_response_field(name="response", type_=page_schema)
+        for size in sizes:
+            page = {"items": [FACTORIES[name](i) for i in range(size)], "next_cursor": "abc", "limit": size}
+            slow = await pydantic_body(field, page)
+            fast = fast_body(page, row_schema)
+            if json.loads(slow) != json.loads(fast):
+                raise SystemExit(f"{name}: fast path output differs from the Pydantic path")
+            slow_time = await best_of(repeat, lambda: pydantic_body(field, page))
+            fast_time = await best_of(repeat, lambda: fast_body(page, row_schema))
+            print(
+                f"{name:<8}{size:>8}{slow_time * 1000:>14.2f}{fast_time * 1000:>10.2f}"
+                f"{slow_time / fast_time:>8.1f}x{fast_time / size * 1e6:>13.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    random.seed(0)
+    asyncio.run(main(args.sizes, args.repeat))
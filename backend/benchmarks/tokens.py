@@ -0,0 +1,118 @@
+"""
+Measure access token throughput and the cost of bcrypt on the event loop.
+
+Run from the backend directory:
+
+    python -m benchmarks.tokens [--tokens 20000] [--hashes 16] [--rounds 10]
+
+Tokens: python-jose HS256, the encoder the API used before app.auth.crypto
+(when it is installed; it is no longer a requirement), against the crypto
+module's HS256 and EdDSA signers and a verify served from the auth claims
+cache. Tokens carry the same claims as a login token.
+
+Passwords: hashes the same passwords inline on the event loop and through
+CryptoService, while a 1 ms ticker measures how long the loop stalls. The
+pool only speeds up the hashes themselves when there are several cores.
+"""
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import time
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from app.auth import cache, crypto
+from app.models import generate_uuid
+
+
+def rate(count: int, fn) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return count / (time.perf_counter() - started)
+
+
+def token_rates(count: int) -> list:
+    claims = {"sub": generate_uuid(), "exp": datetime.utcnow() + timedelta(days=1)}
+    rows = []
+    try:
+        from jose import jwt
+    except ImportError:
+        print("python-jose is not installed; skipping the baseline")
+    else:
+        token = jwt.encode(claims, crypto.SECRET_KEY, algorithm="HS256")
+        rows.append(("jose HS256",
+                     rate(count, lambda: jwt.encode(claims, crypto.SECRET_KEY, algorithm="HS256")),
+                     rate(count, lambda: jwt.decode(token, crypto.SECRET_KEY, algorithms=["HS256"]))))
+
+    eddsa = crypto.TokenSigner([crypto.Ed25519Key(Ed25519PrivateKey.generate())])
+    for name, signer in (("HS256", crypto.load_signer("HS256")), ("EdDSA", eddsa)):
+        token = signer.encode(claims)
+        rows.append((name, rate(count, lambda: signer.encode(claims)), rate(count, lambda: signer.decode(token))))
+
+    token = crypto.token_signer.encode(claims)
+    cache.cache_claims(token, crypto.token_signer.decode(token))
+    rows.append(("cached", None, rate(count, lambda: cache.get_cached_claims(token))))
+    return rows
+
+
+async def loop_stall(work) -> tuple:
+    """Run work() while ticking every millisecond; returns (seconds, longest gap between ticks)."""
+    longest = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal longest
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - started
+    done = True
+    await task
+    return elapsed, longest
+
+
+async def hashing(count: int, rounds: int) -> None:
+    crypto.BCRYPT_ROUNDS = rounds
+    passwords = [f"password-{i}" for i in range(count)]
+
+    async def inline():
+        for password in passwords:
+            crypto.hash_password_sync(password)
+
+    service = crypto.CryptoService()
+
+    async def pooled():
+        await asyncio.gather(*(service.hash_password(password) for password in passwords))
+
+    print(f"\n{count} bcrypt hashes, {rounds} rounds, {service.workers} workers")
+    print(f"{'path':<10}{'seconds':>10}{'max stall ms':>14}")
+    for name, work in (("inline", inline), ("pool", pooled)):
+        elapsed, longest = await loop_stall(work)
+        print(f"{name:<10}{elapsed:>10.2f}{longest * 1000:>14.1f}")
+    service.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--hashes", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'signer':<12}{'sign/s':>10}{'verify/s':>12}")
+    for name, sign, verify in token_rates(args.tokens):
+        print(f"{name:<12}{'-' if sign is None else f'{sign:.0f}':>10}{verify:>12.0f}")
+    asyncio.run(hashing(args.hashes, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
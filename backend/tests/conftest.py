@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Point every store the app opens at a scratch directory before app modules are imported
+_scratch = tempfile.mkdtemp(prefix="agriconnect-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch}/test.db")
+os.environ.setdefault("INBOUND_QUEUE_PATH", os.path.join(_scratch, "inbound_queue.db"))
+os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(_scratch, "image_store"))
+os.environ.setdefault("REPORT_CACHE_DIR", os.path.join(_scratch, "report_cache"))
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Create the schema the way the app's startup does."""
+    from app.database import engine, init_db
+    from app.search.index import create_search_tables
+
+    init_db()
+    with engine.begin() as connection:
+        create_search_tables(connection)
@@ -0,0 +1,70 @@
+import pytest
+
+from app.auth.admission import AdmissionRejected, OTPAdmission, TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_burst_then_refill():
+    clock = Clock()
+    limiter = TokenBucketLimiter(burst=3, per_minute=6, timer=clock)
+    assert [limiter.acquire("9876543210") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("9876543210") == pytest.approx(10)
+    assert limiter.acquire("9123456780") == 0  # buckets are per key
+
+    clock.now += 5
+    assert limiter.acquire("9876543210") == pytest.approx(5)
+    clock.now += 5
+    assert limiter.acquire("9876543210") == 0
+    # A long idle spell refills no more than the burst
+    clock.now += 3600
+    assert [limiter.acquire("9876543210") for _ in range(4)][-1] == pytest.approx(10)
+
+
+def test_retry_after_rounds_up_to_whole_seconds():
+    clock = Clock()
+    limiter = TokenBucketLimiter(burst=1, per_minute=1, timer=clock)
+    limiter.acquire("10.0.0.1")
+    clock.now += 0.5
+    wait = limiter.acquire("10.0.0.1")
+    assert wait == pytest.approx(59.5)
+    assert AdmissionRejected(429, "slow down", wait).headers == {"Retry-After": "60"}
+    assert AdmissionRejected(503, "busy", 0.2).headers == {"Retry-After": "1"}
+
+
+def test_least_recently_used_key_is_evicted():
+    limiter = TokenBucketLimiter(burst=1, per_minute=1, max_keys=2, timer=Clock())
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("a")  # now "b" is the least recently used
+    limiter.acquire("c")
+    assert len(limiter) == 2
+    assert limiter.acquire("a") > 0
+    # "b" was evicted, so it starts again with a full bucket
+    assert limiter.acquire("b") == 0
+
+
+def test_rate_limits_get_429_and_the_concurrency_cap_503():
+    admission = OTPAdmission(max_concurrent=1)
+    admission.phone["send"] = TokenBucketLimiter(burst=1, per_minute=1, timer=Clock())
+    admission.enter("send", "10.0.0.1", "9876543210")
+
+    with pytest.raises(AdmissionRejected) as busy:
+        admission.enter("send", "10.0.0.1", "9123456780")
+    assert busy.value.status_code == 503
+    admission.leave()
+    assert admission.stats()["in_flight"] == 0
+
+    with pytest.raises(AdmissionRejected) as limited:
+        admission.enter("send", "10.0.0.1", "9876543210")
+    assert limited.value.status_code == 429
+    # A rejected request takes no slot
+    admission.enter("send", "10.0.0.1", "9123456780")
+    assert admission.stats()["in_flight"] == 1
+    assert admission.stats()["shed"] == {"concurrency": 1, "ip": 0, "phone_send": 1, "phone_verify": 0}
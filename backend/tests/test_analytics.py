@@ -0,0 +1,46 @@
+from sqlalchemy import func, select
+
+from app import models
+from app.analytics import rebuild_issue_rollups
+from app.database import SessionLocal
+
+Status = models.IssueStatus
+
+
+def district_counts(db, category: str) -> dict:
+    table = models.IssueDailyCount
+    rows = db.execute(
+        select(table.district, table.status, func.sum(table.count))
+        .where(table.category == category)
+        .group_by(table.district, table.status)
+    )
+    return {(district, status): count for district, status, count in rows if count}
+
+
+def test_issue_stays_counted_under_its_district_when_the_profile_changes():
+    with SessionLocal() as db:
+        user = models.User(id=models.generate_uuid(), phone_number=models.generate_uuid()[:15],
+                           role=models.UserRole.FARMER)
+        issue = models.Issue(id=models.generate_uuid(), title="Leaf curl", reported_by=user.id,
+                             status=Status.REPORTED, category="leaf-curl")
+        db.add_all([user, issue])
+        db.commit()
+        assert district_counts(db, "leaf-curl") == {("", Status.REPORTED): 1}
+
+        # The reporter had no profile when the issue was created
+        db.add(models.FarmerProfile(user_id=user.id, state="Maharashtra", district="Nashik", land_area=1.0))
+        db.commit()
+        issue.status = Status.IN_PROGRESS
+        db.commit()
+        assert district_counts(db, "leaf-curl") == {("", Status.IN_PROGRESS): 1}
+
+        rebuild_issue_rollups(db)
+        assert district_counts(db, "leaf-curl") == {("", Status.IN_PROGRESS): 1}
+
+        second = models.Issue(id=models.generate_uuid(), title="Leaf curl again", reported_by=user.id,
+                              status=Status.REPORTED, category="leaf-curl")
+        db.add(second)
+        db.commit()
+        db.delete(issue)
+        db.commit()
+        assert district_counts(db, "leaf-curl") == {("nashik", Status.REPORTED): 1}
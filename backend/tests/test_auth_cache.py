@@ -0,0 +1,17 @@
+import time
+
+from app.auth.cache import cache_claims, get_cached_claims
+
+
+def test_claims_are_cached_until_the_token_expires(monkeypatch):
+    # East of UTC, a naive utcnow() taken as local time is hours in the past
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    try:
+        cache_claims("fresh", {"sub": "u1", "exp": time.time() + 30})
+        cache_claims("expired", {"sub": "u1", "exp": time.time() - 1})
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert get_cached_claims("fresh")["sub"] == "u1"
+    assert get_cached_claims("expired") is None
@@ -0,0 +1,19 @@
+import io
+import random
+
+from app.csv_io import import_farmers
+
+
+def test_unparseable_rows_end_the_import_with_their_line():
+    phones = [str(random.randrange(6_000_000_000, 10_000_000_000)) for _ in range(3)]
+    body = "phone_number,name,district,state,land_area\n"
+    body += "".join(f"{phone},Farmer,Nashik,Maharashtra,1.5\n" for phone in phones[:2])
+    body += f'{phones[2]},"Unterminated,Nashik,Maharashtra,1.5\n'
+    report = import_farmers(io.BytesIO(body.encode()), chunk_size=2)
+    assert report["imported"] == 2
+    assert [error["line"] for error in report["errors"]] == [4]
+
+
+def test_empty_upload_is_reported():
+    report = import_farmers(io.BytesIO(b""))
+    assert report == {"imported": 0, "failed": 1, "errors": [{"line": 1, "detail": "file: no CSV header"}]}
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from app import models
+from app.database import SessionLocal, init_db
+from app.eligibility import EligibilityEngine
+
+
+def add_farmer(district: str) -> str:
+    with SessionLocal() as db:
+        user = models.User(id=models.generate_uuid(), phone_number=models.generate_uuid()[:15],
+                           role=models.UserRole.FARMER)
+        db.add(user)
+        db.add(models.FarmerProfile(user_id=user.id, state="Maharashtra", district=district, land_area=2.0,
+                                    crops=["onion"]))
+        db.commit()
+        return user.id
+
+
+def add_scheme(district: str) -> str:
+    with SessionLocal() as db:
+        scheme = models.GovernmentScheme(title=f"{district} onion support",
+                                         eligibility_criteria={"district": district, "crops": ["onion"]})
+        db.add(scheme)
+        db.commit()
+        return scheme.id
+
+
+class GatedSessions:
+    """Session factory whose sessions wait for the gate before they are handed out."""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self):
+        self.entered.set()
+        self.gate.wait(10)
+        return SessionLocal()
+
+
+def test_reload_does_not_block_queries_and_keeps_concurrent_updates():
+    init_db()
+    scheme_id = add_scheme("lasalgaon")
+    farmer = add_farmer("lasalgaon")
+    sessions = GatedSessions()
+    sessions.gate.set()
+    engine = EligibilityEngine(session_factory=sessions, reload_seconds=0)
+    engine.ensure_loaded()
+    assert engine.schemes_for(farmer) == [scheme_id]
+
+    sessions.gate.clear()
+    sessions.entered.clear()
+    reload = threading.Thread(target=engine.load)
+    reload.start()
+    assert sessions.entered.wait(10)
+    # The reload is reading the database: queries answer from the current index meanwhile
+    started = time.monotonic()
+    assert engine.schemes_for(farmer) == [scheme_id]
+    assert time.monotonic() - started < 1
+    # A commit the reload's snapshot may miss
+    engine.update_profiles([{"user_id": "late", "state": "maharashtra", "district": "lasalgaon",
+                             "land_area": 1.0, "crops": ["onion"]}])
+    sessions.gate.set()
+    reload.join(10)
+    assert engine.schemes_for("late") == [scheme_id]
+    assert engine.schemes_for(farmer) == [scheme_id]
+
+
+def test_stale_index_is_reloaded_in_the_background():
+    init_db()
+    scheme_id = add_scheme("niphad")
+    engine = EligibilityEngine(reload_seconds=0.05)
+    engine.ensure_loaded()
+    # Committed without going through this engine, as by another worker process
+    farmer = add_farmer("niphad")
+    engine.remove_profiles([farmer])
+    assert engine.schemes_for(farmer) == []
+
+    time.sleep(0.1)
+    engine.ensure_loaded()
+    deadline = time.monotonic() + 10
+    while not engine.schemes_for(farmer) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert engine.schemes_for(farmer) == [scheme_id]
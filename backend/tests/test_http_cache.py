@@ -0,0 +1,30 @@
+import asyncio
+
+import httpx
+
+from app import models
+from app.database import SessionLocal
+from app.main import app
+
+
+def test_edits_within_one_second_change_the_etag():
+    with SessionLocal() as db:
+        scheme = models.GovernmentScheme(title="Drip irrigation subsidy")
+        db.add(scheme)
+        db.commit()
+        scheme_id = scheme.id
+
+    async def fetch_twice():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            before = await client.get(f"/api/schemes/{scheme_id}")
+            with SessionLocal() as db:
+                db.get(models.GovernmentScheme, scheme_id).title = "Drip irrigation subsidy (extended)"
+                db.commit()
+            after = await client.get(f"/api/schemes/{scheme_id}", headers={"If-None-Match": before.headers["etag"]})
+        return before, after
+
+    before, after = asyncio.run(fetch_twice())
+    assert before.status_code == 200
+    assert after.status_code == 200
+    assert after.json()["title"].endswith("(extended)")
+    assert after.headers["etag"] != before.headers["etag"]
@@ -0,0 +1,133 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from app import models
+from app.auth.utils import create_access_token
+from app.database import AsyncSessionLocal, init_db
+from app.images.metadata import ORIENTATION, strip_metadata
+from app.images.store import image_store
+from app.main import app
+
+GPS_INFO = 0x8825
+MAKE = 0x010F
+
+
+def photo(image_format: str, seed: int = 0) -> bytes:
+    image = Image.new("RGB", (64, 48), (seed % 256, 120, 40))
+    exif = Image.Exif()
+    exif[MAKE] = "FieldPhone"
+    exif[ORIENTATION] = 6
+    exif.get_ifd(GPS_INFO).update({1: "N", 2: (19.0, 59.0, 51.0), 3: "E", 4: (73.0, 47.0, 22.0)})
+    out = io.BytesIO()
+    image.save(out, image_format, exif=exif, **({"lossless": True} if image_format == "WEBP" else {}))
+    return out.getvalue()
+
+
+async def token() -> str:
+    init_db()
+    async with AsyncSessionLocal() as db:
+        user = models.User(id=models.generate_uuid(), phone_number=models.generate_uuid()[:15],
+                           role=models.UserRole.FARMER)
+        db.add(user)
+        await db.commit()
+    return create_access_token({"sub": user.id})
+
+
+async def post(content, headers):
+    headers = {"Authorization": f"Bearer {await token()}", **headers}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/images", content=content, headers=headers)
+        original = await client.get(f"/api/images/{response.json()['id']}") if response.is_success else None
+    return response, original
+
+
+def multipart(field: str, data: bytes, boundary: str = "b0undary") -> bytes:
+    return (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nfrom the field\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"a.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+
+
+async def chunked(body: bytes):
+    # A generator body is sent without a Content-Length
+    for start in range(0, len(body), 1000):
+        yield body[start:start + 1000]
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG", "WEBP"])
+def test_strip_metadata_keeps_only_the_orientation(tmp_path, image_format):
+    path = tmp_path / "original"
+    path.write_bytes(photo(image_format))
+    before = Image.open(path).convert("RGB").tobytes()
+    assert strip_metadata(str(path)) == path.stat().st_size
+    with Image.open(path) as image:
+        assert image.format == image_format
+        assert dict(image.getexif()) == {ORIENTATION: 6}
+        assert image.convert("RGB").tobytes() == before
+        assert b"FieldPhone" not in path.read_bytes()
+
+
+def test_chunked_multipart_upload_serves_original_without_gps():
+    body = multipart("file", photo("JPEG", seed=1))
+    headers = {"Content-Type": "multipart/form-data; boundary=b0undary"}
+    response, original = asyncio.run(post(chunked(body), headers))
+    assert response.status_code == 201, response.text
+    with Image.open(io.BytesIO(original.content)) as image:
+        assert GPS_INFO not in image.getexif()
+    assert int(original.headers["content-length"]) == response.json()["size"]
+
+
+def test_chunked_multipart_upload_is_cut_off_at_the_limit(monkeypatch):
+    monkeypatch.setattr(image_store, "max_bytes", 10_000)
+    body = multipart("note2", b"x" * 200_000)
+    headers = {"Content-Type": "multipart/form-data; boundary=b0undary"}
+    response, _ = asyncio.run(post(chunked(body), headers))
+    assert response.status_code == 413
+
+
+def test_multipart_without_file_field_is_400():
+    body = multipart("photo", photo("JPEG", seed=2))
+    headers = {"Content-Type": "multipart/form-data; boundary=b0undary"}
+    response, _ = asyncio.run(post(body, headers))
+    assert response.status_code == 400
+
+
+def test_featured_stories_link_thumbnails():
+    async def featured():
+        async with AsyncSessionLocal() as db:
+            user = models.User(id=models.generate_uuid(), phone_number=models.generate_uuid()[:15],
+                               role=models.UserRole.FARMER)
+            db.add(user)
+            await db.flush()
+            url = f"/api/images/{'a' * 64}"
+            db.add(models.SuccessStory(title="Doubled onion yield", description="Drip irrigation", farmer_id=user.id,
+                                       before_images=[url], after_images=["https://example.org/after.jpg"],
+                                       is_featured=True))
+            await db.commit()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/api/success-stories/featured")
+
+    response = asyncio.run(featured())
+    assert response.status_code == 200, response.text
+    [story] = [story for story in response.json() if story["title"] == "Doubled onion yield"]
+    assert story["before_thumbnails"] == [f"/api/images/{'a' * 64}/320"]
+    assert story["after_thumbnails"] == ["https://example.org/after.jpg"]
+
+
+def test_negotiated_variant_fallback_varies_on_accept(monkeypatch):
+    monkeypatch.setattr(image_store, "variant_path", lambda image_id, name: "/nonexistent")
+
+    async def fallback():
+        response, _ = await post(photo("JPEG", seed=3), {"Content-Type": "image/jpeg"})
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(f"/api/images/{response.json()['id']}/320", headers={"Accept": "image/webp"})
+
+    response = asyncio.run(fallback())
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.headers["vary"] == "Accept"
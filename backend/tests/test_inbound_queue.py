@@ -0,0 +1,39 @@
+import asyncio
+
+from app.inbound.processor import InboundProcessor
+from app.inbound.queue import InboundQueue
+
+
+def queue_with(tmp_path, count: int) -> InboundQueue:
+    queue = InboundQueue(str(tmp_path / "inbound_queue.db"))
+    payload = '{"From": "whatsapp:+919876543210", "Body": "Leaf rust"}'
+    queue._insert([(f"SM{i}", "whatsapp", payload, 0.0) for i in range(count)])
+    return queue
+
+
+def test_failed_message_waits_for_its_backoff(tmp_path):
+    queue = queue_with(tmp_path, 1)
+    [message] = queue.claim(10, max_attempts=5)
+    queue.complete([], {message.seq: "database is down"}, {}, max_attempts=5, retry_seconds=60)
+    assert queue.claim(10, max_attempts=5) == []
+    assert queue.backlog() == 1
+
+    queue._connection().execute("UPDATE inbound_messages SET lease_until = 0")
+    [retried] = queue.claim(10, max_attempts=5)
+    assert retried.seq == message.seq and retried.attempts == 2
+    queue.close()
+
+
+def test_drain_stops_when_a_whole_batch_fails(tmp_path):
+    queue = queue_with(tmp_path, 3)
+    processor = InboundProcessor(queue, batch_size=1)
+
+    async def database_down(reports):
+        raise ConnectionError("database is down")
+
+    processor._apply = database_down
+    assert asyncio.run(processor.drain()) == 1
+    assert processor.stalled
+    assert processor.counters["failed"] == 1
+    assert queue.counts()["pending"] == 3
+    queue.close()
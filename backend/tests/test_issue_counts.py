@@ -0,0 +1,48 @@
+from sqlalchemy import func, select
+
+from app import models
+from app.database import SessionLocal
+from app.geo.clusters import TILE_MAX_ZOOM
+
+Status = models.IssueStatus
+
+
+def tile_counts(db, latitude: float) -> dict:
+    table = models.IssueTileCount
+    rows = db.execute(
+        select(table.status, func.sum(table.count))
+        .where(table.zoom == TILE_MAX_ZOOM, table.lat_sum / func.nullif(table.count, 0) == latitude)
+        .group_by(table.status)
+    )
+    return {status: count for status, count in rows if count}
+
+
+def daily_counts(db, category: str) -> dict:
+    table = models.IssueDailyCount
+    rows = db.execute(select(table.status, func.sum(table.count)).where(table.category == category).group_by(table.status))
+    return {status: count for status, count in rows if count}
+
+
+def test_counts_follow_changes_to_expired_issues():
+    with SessionLocal() as db:
+        user = models.User(id=models.generate_uuid(), phone_number=models.generate_uuid()[:15],
+                           role=models.UserRole.FARMER)
+        issue = models.Issue(id=models.generate_uuid(), title="Stem borer", reported_by=user.id,
+                             status=Status.REPORTED, category="stem-borer", latitude=20.0113, longitude=73.7902)
+        db.add_all([user, issue])
+        db.commit()
+        # The commit expired the issue: these assignments have no old value in their history
+        issue.status = Status.IN_PROGRESS
+        db.commit()
+        assert tile_counts(db, 20.0113) == {Status.IN_PROGRESS: 1}
+        assert daily_counts(db, "stem-borer") == {Status.IN_PROGRESS: 1}
+
+        issue.status = Status.RESOLVED
+        issue.category = "pest"
+        db.commit()
+        assert daily_counts(db, "stem-borer") == {}
+
+        db.delete(issue)
+        db.commit()
+        assert tile_counts(db, 20.0113) == {}
+        assert daily_counts(db, "pest") == {}
@@ -0,0 +1,12 @@
+from app.metrics import COUNT_BUCKETS, REGISTRY, Histogram
+
+
+def test_histogram_bucket_labels():
+    histogram = Histogram("test_queries", "Queries.", ("route",), COUNT_BUCKETS)
+    REGISTRY.remove(histogram)
+    histogram.observe(3, route="/a")
+    lines = histogram.render()
+    assert 'test_queries_bucket{route="/a",le="0.0"} 0' in lines
+    assert 'test_queries_bucket{route="/a",le="5.0"} 1' in lines
+    assert 'test_queries_bucket{route="/a",le="+Inf"} 1' in lines
+    assert not any('le="inf"' in line for line in lines)
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from app.auth.otp_store import InMemoryOTPStore, OTPStatus, OTPStore, SQLiteOTPStore
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda tmp_path: InMemoryOTPStore(),
+    lambda tmp_path: SQLiteOTPStore(path=str(tmp_path / "otp.db")),
+])
+def test_otp_is_consumed_once(tmp_path, make_store):
+    store = make_store(tmp_path)
+
+    async def scenario():
+        await store.save("9876543210", "123456")
+        wrong = await store.verify("9876543210", "000000")
+        right = await store.verify("9876543210", "123456")
+        again = await store.verify("9876543210", "123456")
+        await store.close()
+        return wrong, right, again
+
+    wrong, right, again = asyncio.run(scenario())
+    assert wrong == OTPStatus.INVALID
+    assert right == OTPStatus.VALID
+    assert again != OTPStatus.VALID
+
+
+def test_store_without_verify_cannot_be_built():
+    class Incomplete(OTPStore):
+        async def save(self, phone_number, otp):
+            pass
+
+        async def discard(self, phone_number):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
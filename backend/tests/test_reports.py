@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+
+from app.database import AsyncSessionLocal, init_db
+from app.reports import jobs
+from app.reports.jobs import ReportService, district_report_data
+
+
+def submitted_key(monkeypatch, today: datetime) -> str:
+    class FixedDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return today
+
+    monkeypatch.setattr(jobs, "datetime", FixedDatetime)
+    service = ReportService()
+    monkeypatch.setattr(service, "_submit", lambda kind, params, key: key)
+
+    async def submit():
+        init_db()
+        async with AsyncSessionLocal() as db:
+            return await service.submit_district(db, "Nashik", "Maharashtra")
+
+    return asyncio.run(submit())
+
+
+def test_report_key_changes_with_the_report_date(monkeypatch):
+    monday = submitted_key(monkeypatch, datetime(2024, 3, 4, 9))
+    assert submitted_key(monkeypatch, datetime(2024, 3, 4, 18)) == monday
+    assert submitted_key(monkeypatch, datetime(2024, 3, 5, 9)) != monday
+
+
+def test_report_weeks_end_at_the_report_date():
+    async def data():
+        init_db()
+        async with AsyncSessionLocal() as db:
+            return await district_report_data(db, "nashik", "maharashtra", as_of="2024-03-06")
+
+    weeks = [week for week, _ in asyncio.run(data())["issues_by_week"]]
+    assert len(weeks) == jobs.REPORT_WEEKS
+    assert weeks[-1] == "04 Mar"
@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+from app.sms.gateway import FakeSMSGateway, SMSGateway, SMSMessage
+
+
+def test_fake_gateway_keeps_only_recent_messages():
+    gateway = FakeSMSGateway(echo=False, max_sent=3)
+    messages = [SMSMessage(to=f"98765{i:05d}", body="OTP") for i in range(5)]
+    results = asyncio.run(gateway.send_batch(messages))
+    assert all(result.ok for result in results)
+    assert list(gateway.sent) == messages[2:]
+
+
+def test_gateway_without_send_batch_cannot_be_built():
+    class Incomplete(SMSGateway):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+
+from app import models
+from app.auth.utils import create_access_token
+from app.database import AsyncSessionLocal, init_db
+from app.main import app
+from app.routers import sync as sync_router
+
+
+async def make_user() -> str:
+    async with AsyncSessionLocal() as db:
+        user = models.User(id=models.generate_uuid(), phone_number=models.generate_uuid()[:15],
+                           role=models.UserRole.FARMER)
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+async def commit_issue(user_id: str, client_id: str) -> str:
+    """Commit an issue from another session, as a concurrent request would."""
+    async with AsyncSessionLocal() as db:
+        issue = models.Issue(id=models.generate_uuid(), title="concurrent", reported_by=user_id,
+                             status=models.IssueStatus.REPORTED, client_id=client_id)
+        db.add(issue)
+        await db.commit()
+        return issue.id
+
+
+def run_sync(monkeypatch, conflicting_client_ids):
+    """POST a sync of issues a and b, committing one of them concurrently on each pass."""
+    async def scenario():
+        init_db()
+        user_id = await make_user()
+        concurrent = {}
+        real = sync_router.upsert_issue_updates
+        passes = iter(conflicting_client_ids)
+
+        async def racing(db, *args, **kwargs):
+            # Runs after the request looked for existing issues and before it commits
+            client_id = next(passes, None)
+            if client_id:
+                concurrent[client_id] = await commit_issue(user_id, client_id)
+            return await real(db, *args, **kwargs)
+
+        monkeypatch.setattr(sync_router, "upsert_issue_updates", racing)
+        body = {"issues": [{"client_id": "a", "title": "pest"}, {"client_id": "b", "title": "water"}]}
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/sync", json=body, headers=headers)
+        return response, concurrent
+
+    return asyncio.run(scenario())
+
+
+def test_sync_retries_after_concurrent_commit(monkeypatch):
+    response, concurrent = run_sync(monkeypatch, ["a"])
+    assert response.status_code == 200, response.text
+    issue_ids = response.json()["issue_ids"]
+    assert issue_ids["a"] == concurrent["a"]
+    assert issue_ids["b"] != concurrent["a"]
+
+
+def test_sync_conflicting_twice_is_409(monkeypatch):
+    response, _ = run_sync(monkeypatch, ["a", "b"])
+    assert response.status_code == 409, response.text
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from app.auth import crypto
+from app.auth.crypto import Ed25519Key, HMACKey, InvalidTokenError, TokenSigner
+from app.main import app
+
+# RFC 7515 appendix A.1: an HS256 JWS and its key
+RFC7515_KEY = jwt.utils.base64url_decode(
+    "AyM1SysPpbyDfgZld3umj1qzKObwVMkoqQ-EstJQLr_T-1qS0gZH75aKtMN3Yj0iPS4hcgUuTwjAzZr1Z9CAow"
+)
+RFC7515_TOKEN = (
+    "eyJ0eXAiOiJKV1QiLA0KICJhbGciOiJIUzI1NiJ9"
+    ".eyJpc3MiOiJqb2UiLA0KICJleHAiOjEzMDA4MTkzODAsDQogImh0dHA6Ly9leGFtcGxlLmNvbS9pc19yb290Ijp0cnVlfQ"
+    ".dBjftJeZ4CVP-mB92K27uhbUJU1p1r_wW1gFWFOEjXk"
+)
+
+
+def test_rfc7515_vector():
+    # Claims are only checked once the signature is, so "expired" means it verified
+    with pytest.raises(InvalidTokenError, match="expired"):
+        TokenSigner([HMACKey(RFC7515_KEY)]).decode(RFC7515_TOKEN)
+    with pytest.raises(InvalidTokenError, match="Signature"):
+        TokenSigner([HMACKey(RFC7515_KEY[:-1])]).decode(RFC7515_TOKEN)
+
+
+def test_rotated_keys_still_verify():
+    old, new = HMACKey("old-secret"), HMACKey("new-secret")
+    token = TokenSigner([old]).encode({"sub": "u1"})
+    assert TokenSigner([new, old]).decode(token) == {"sub": "u1"}
+    with pytest.raises(InvalidTokenError):
+        TokenSigner([new]).decode(token)
+
+
+def test_eddsa_token_is_not_accepted_as_hmac():
+    ed = Ed25519Key(Ed25519PrivateKey.generate())
+    hmac_signer = TokenSigner([HMACKey("secret")])
+    with pytest.raises(InvalidTokenError):
+        hmac_signer.decode(TokenSigner([ed]).encode({"sub": "u1"}))
+    assert TokenSigner([ed]).decode(TokenSigner([ed]).encode({"sub": "u1"})) == {"sub": "u1"}
+
+
+@pytest.mark.parametrize("claims", [{"nbf": time.time() + 3600}, {"iat": "yesterday"}])
+def test_not_yet_valid_or_malformed_times_are_rejected(claims):
+    signer = TokenSigner([HMACKey("secret")])
+    with pytest.raises(InvalidTokenError):
+        signer.decode(signer.encode({"sub": "u1", **claims}))
+
+
+def test_critical_extensions_are_rejected():
+    key = HMACKey("secret")
+    token = jwt.encode({"sub": "u1"}, key.signing_key, headers={"kid": key.kid, "crit": ["exp"]})
+    with pytest.raises(InvalidTokenError, match="critical"):
+        TokenSigner([key]).decode(token)
+
+
+def test_full_hashing_pool_is_503(monkeypatch):
+    async def busy(*args):
+        raise crypto.CryptoBusyError("Too many password operations in progress")
+
+    monkeypatch.setattr(crypto.crypto_service, "hash_password", busy)
+
+    async def hash_something():
+        return await crypto.crypto_service.hash_password("pw")
+
+    async def get():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/test-crypto-busy")
+
+    app.add_api_route("/test-crypto-busy", hash_something)
+    try:
+        response = asyncio.run(get())
+    finally:
+        app.router.routes.pop()
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"